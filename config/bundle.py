@@ -0,0 +1,151 @@
+import os
+import json
+import mmap
+import zlib
+import pickle
+import struct
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_MAGIC = b"RCPBNDL\0"
+BUNDLE_VERSION = 1
+_HEADER_SIZE = struct.Struct("<Q")
+
+def ids_fingerprint(ids: Iterable[str]) -> str:
+    """
+    Хэш множества идентификаторов рецептов (не зависит от порядка).
+    """
+    h = hashlib.sha256()
+    for id_ in sorted(ids):
+        h.update(id_.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def write_bundle(path: str, sections: Dict[str, Any], meta: Optional[Dict[str, Any]] = None,
+                 fingerprints: Optional[Dict[str, str]] = None) -> None:
+    """
+    Записывает секции в один файл бандла.
+
+    Формат: магическая строка, длина заголовка, JSON-заголовок со смещениями,
+    длинами и контрольными суммами секций, затем сами секции (pickle).
+
+    Файл пишется во временный и атомарно подменяется, поэтому читатели
+    никогда не видят частично записанный бандл.
+
+    Args:
+        path: Путь к файлу бандла.
+        sections: {имя: объект}.
+        meta: Дополнительные сведения для заголовка.
+        fingerprints: {имя секции: ids_fingerprint рецептов, на которых она построена}.
+    """
+    payloads = {}
+    entries = {}
+    for name, value in sections.items():
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        entries[name] = {'kind': 'pickle', 'length': len(data), 'crc32': zlib.crc32(data)}
+        if fingerprints and name in fingerprints:
+            entries[name]['fingerprint'] = fingerprints[name]
+        payloads[name] = data
+
+    # Смещения зависят от длины заголовка, а она — от смещений: повторяем, пока длина не устоится
+    header = b""
+    while True:
+        offset = len(BUNDLE_MAGIC) + _HEADER_SIZE.size + len(header)
+        for name, data in payloads.items():
+            entries[name]['offset'] = offset
+            offset += len(data)
+        new_header = json.dumps(
+            {'version': BUNDLE_VERSION, 'meta': meta or {}, 'sections': entries}, ensure_ascii=False
+        ).encode("utf-8")
+        if len(new_header) == len(header):
+            header = new_header
+            break
+        header = new_header
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(BUNDLE_MAGIC)
+        f.write(_HEADER_SIZE.pack(len(header)))
+        f.write(header)
+        for data in payloads.values():
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    logger.info(f"Bundle saved to {path}: {', '.join(payloads)}")
+
+class Bundle:
+    def __init__(self, path: str, verify: bool = True):
+        """
+        Открывает бандл для чтения: читается только заголовок, секции загружаются по запросу.
+
+        Args:
+            path: Путь к файлу бандла.
+            verify: Проверять ли контрольные суммы секций при загрузке.
+
+        Raises:
+            ValueError: Если файл не является бандлом, версия не поддерживается
+                или секции построены на разных наборах рецептов.
+        """
+        self.path = path
+        self.verify = verify
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(BUNDLE_MAGIC)] != BUNDLE_MAGIC:
+            raise ValueError(f"{path} is not a project bundle")
+        start = len(BUNDLE_MAGIC)
+        (header_len,) = _HEADER_SIZE.unpack_from(self._mm, start)
+        start += _HEADER_SIZE.size
+        header = json.loads(self._mm[start:start + header_len].decode("utf-8"))
+        if header['version'] > BUNDLE_VERSION:
+            raise ValueError(f"Bundle version {header['version']} is not supported (max {BUNDLE_VERSION})")
+        self.version = header['version']
+        self.meta = header['meta']
+        self.sections = header['sections']
+        self.check_consistency()
+
+    def check_consistency(self) -> None:
+        """
+        Проверяет по заголовку, что все секции построены на одном наборе рецептов.
+        """
+        fingerprints = {name: s['fingerprint'] for name, s in self.sections.items() if 'fingerprint' in s}
+        if len(set(fingerprints.values())) > 1:
+            raise ValueError(f"Bundle {self.path} sections are built on different recipes: {sorted(fingerprints)}")
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sections
+
+    def load(self, name: str) -> Any:
+        """
+        Загружает секцию.
+
+        Читаются только страницы файла этой секции (через mmap).
+
+        Args:
+            name: Имя секции.
+
+        Returns:
+            Объект секции.
+        """
+        section = self.sections[name]
+        offset, length = section['offset'], section['length']
+        view = memoryview(self._mm)[offset:offset + length]
+        if self.verify and zlib.crc32(view) != section['crc32']:
+            raise ValueError(f"Bundle {self.path}: section {name} is corrupted")
+        if section['kind'] != 'pickle':
+            view.release()
+            raise ValueError(f"Bundle {self.path}: section {name} has unsupported kind {section['kind']}")
+        res = pickle.loads(view)
+        view.release()
+        logger.debug(f"Loaded section {name} from {self.path}")
+        return res
+
+    def close(self) -> None:
+        """
+        Закрывает файл.
+        """
+        self._mm.close()
+        self._file.close()
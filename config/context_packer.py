@@ -0,0 +1,254 @@
+import logging
+import functools
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = 2048
+# Доли бюджета (после запроса) на рецепты и историю чата
+RECIPES_SHARE = 0.7
+# Сколько токенов отводится на сводку старых ходов
+SUMMARY_MAX_TOKENS = 96
+# Сколько символов каждого старого вопроса попадает в сводку
+SUMMARY_QUESTION_CHARS = 60
+# Грубая оценка для русского текста без токенизатора
+CHARS_PER_TOKEN = 3
+# Токенизатор модели Ollama 'mistral' (Mistral 7B Instruct) для подсчёта токенов промпта
+PACKER_TOKENIZER = "mistralai/Mistral-7B-Instruct-v0.3"
+# Поля рецепта, которые получают все рецепты до того, как бюджет тратится на остальные
+PRIORITY_FIELDS = ('name', 'ingridients')
+
+def approx_token_count(text: str) -> int:
+    """
+    Приблизительно оценивает число токенов, если токенизатор модели недоступен.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def load_tokenizer(name: str = PACKER_TOKENIZER) -> Optional[Any]:
+    """
+    Загружает токенизатор модели для подсчёта токенов промпта.
+
+    Args:
+        name: Имя токенизатора на Hugging Face Hub или путь к локальной копии.
+
+    Returns:
+        Токенизатор или None, если его не удалось загрузить (тогда ContextPacker
+        считает токены приблизительно, по CHARS_PER_TOKEN символов на токен).
+    """
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(name)
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer {name}, falling back to ~{CHARS_PER_TOKEN} chars per token: {e}")
+        return None
+    logger.info(f"Loaded prompt tokenizer: {name}")
+    return tokenizer
+
+@functools.lru_cache(maxsize=None)
+def default_packer(tokenizer_name: str = PACKER_TOKENIZER) -> 'ContextPacker':
+    """
+    Упаковщик с токенизатором модели; создаётся при первом вызове, один на процесс.
+    """
+    return ContextPacker(tokenizer=load_tokenizer(tokenizer_name))
+
+class ContextPacker:
+    def __init__(self, tokenizer: Optional[Any] = None, budget: int = CONTEXT_TOKEN_BUDGET,
+                 recipes_share: float = RECIPES_SHARE, summary_max_tokens: int = SUMMARY_MAX_TOKENS):
+        """
+        Инициализирует упаковщик контекста RAG-промпта в бюджет токенов.
+
+        Args:
+            tokenizer: Токенизатор модели (объект с методом encode); без него используется оценка по символам.
+            budget: Общий бюджет токенов на запрос, рецепты и историю.
+            recipes_share: Доля оставшегося после запроса бюджета на рецепты.
+            summary_max_tokens: Бюджет сводки старых ходов.
+        """
+        self.tokenizer = tokenizer
+        self.budget = budget
+        self.recipes_share = recipes_share
+        self.summary_max_tokens = summary_max_tokens
+
+    def count(self, text: str) -> int:
+        """
+        Считает токены текста токенизатором модели.
+        """
+        if not text:
+            return 0
+        if self.tokenizer is None:
+            return approx_token_count(text)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Обрезает текст до max_tokens токенов.
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is None:
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        ids = self.tokenizer.encode(text, add_special_tokens=False)
+        if len(ids) <= max_tokens:
+            return text
+        return self.tokenizer.decode(ids[:max_tokens]).strip()
+
+    @staticmethod
+    def recipe_fields(recipe: Any) -> List[Tuple[str, str, List[str]]]:
+        """
+        Разбивает рецепт на поля в порядке важности для ответа.
+
+        Args:
+            recipe: Объект Recipe.
+
+        Returns:
+            Список (ключ, заголовок, строки поля): название ('name'), ингредиенты ('ingridients'),
+            шаги ('steps'), время и калории ('extra'); пустые поля пропускаются.
+        """
+        fields = [('name', '', [recipe.name or ''])]
+        if recipe.ingridients:
+            fields.append(('ingridients', recipe.keys_dict['ingridients'], [
+                f"- {ing[0]}: {ing[1]}" if len(ing) > 1 and ing[1] else f"- {ing[0]}"
+                for ing in recipe.ingridients
+            ]))
+        if recipe.steps:
+            fields.append(('steps', recipe.keys_dict['steps'],
+                           [f"{n + 1}. {step}" for n, step in enumerate(recipe.steps)]))
+        extra = []
+        if getattr(recipe, 'standard_time', None):
+            extra.append(f"{recipe.keys_dict['time']}: {recipe.standard_time} мин")
+        if getattr(recipe, 'calories', None):
+            extra.append(f"{recipe.keys_dict['calories']}: {recipe.calories}")
+        if extra:
+            fields.append(('extra', '', extra))
+        return fields
+
+    def pack_recipes(self, recipes: Sequence[Any], budget: int) -> Tuple[str, int]:
+        """
+        Упаковывает рецепты в бюджет.
+
+        Сначала во все рецепты попадают поля PRIORITY_FIELDS — название и ингредиенты
+        (в порядке релевантности), затем оставшийся бюджет заполняется шагами и прочими полями.
+        Поле, не влезающее целиком, обрезается построчно.
+
+        Args:
+            recipes: Рецепты в порядке убывания релевантности.
+            budget: Бюджет токенов.
+
+        Returns:
+            Кортеж (текст, число токенов).
+        """
+        parts = [[] for _ in recipes]
+        used = 0
+        all_fields = [self.recipe_fields(recipe) for recipe in recipes]
+        # Первый проход — название и ингредиенты, второй — остальные поля
+        for priority in (True, False):
+            for n, fields in enumerate(all_fields):
+                for key, title, lines in fields:
+                    if (key in PRIORITY_FIELDS) != priority:
+                        continue
+                    if title:
+                        cost = self.count(title) + 1
+                        if used + cost > budget:
+                            break
+                        parts[n].append(title)
+                        used += cost
+                    for line in lines:
+                        cost = self.count(line) + 1
+                        if used + cost > budget:
+                            break
+                        parts[n].append(line)
+                        used += cost
+        text = "\n\n".join("\n".join(p) for p in parts if p)
+        return text, used
+
+    def pack_history(self, messages: Sequence[Tuple[str, str]], budget: int) -> Tuple[str, str, int, int]:
+        """
+        Оставляет последние ходы в пределах бюджета, старые сворачивает в сводку.
+
+        Args:
+            messages: Сообщения [(роль 'user'|'assistant', текст)] от старых к новым.
+            budget: Бюджет токенов на историю вместе со сводкой.
+
+        Returns:
+            Кортеж (сводка, последние ходы, токены сводки, токены ходов).
+        """
+        # Группируем сообщения в ходы: вопрос пользователя и ответы на него
+        turns = []
+        for role, content in messages:
+            line = f"{'User' if role == 'user' else 'Assistant'}: {content}"
+            if role == 'user' or not turns:
+                turns.append([])
+            turns[-1].append((role, line))
+
+        recent = []
+        used = 0
+        cut = len(turns)
+        summary_reserve = min(self.summary_max_tokens, budget // 4)
+        for i in range(len(turns) - 1, -1, -1):
+            lines = [line for _, line in turns[i]]
+            cost = sum(self.count(line) + 1 for line in lines)
+            if used + cost > budget - (summary_reserve if i > 0 else 0):
+                break
+            recent = lines + recent
+            used += cost
+            cut = i
+
+        summary = ""
+        summary_tokens = 0
+        older_questions = [line[len('User: '):] for turn in turns[:cut] for role, line in turn if role == 'user']
+        if older_questions:
+            summary = "Ранее пользователь спрашивал: " + "; ".join(
+                q[:SUMMARY_QUESTION_CHARS] for q in older_questions
+            )
+            summary = self.truncate(summary, min(summary_reserve, budget - used))
+            summary_tokens = self.count(summary)
+        return summary, "\n".join(recent), summary_tokens, used
+
+    @timed('prompt_format')
+    def pack(self, query: str, recipes: Sequence[Any],
+             messages: Sequence[Tuple[str, str]] = ()) -> Dict[str, Any]:
+        """
+        Упаковывает запрос, рецепты и историю чата в общий бюджет.
+
+        Args:
+            query: Запрос пользователя.
+            recipes: Рецепты в порядке убывания релевантности.
+            messages: История чата [(роль, текст)] от старых к новым.
+
+        Returns:
+            Словарь с текстами 'retrieved_recipes' и 'chat_history' для шаблона промпта
+            и отчётом 'tokens' по секциям.
+        """
+        query_tokens = self.count(query)
+        rest = max(self.budget - query_tokens, 0)
+        history_budget = int(rest * (1 - self.recipes_share)) if messages else 0
+        summary, recent, summary_tokens, history_tokens = self.pack_history(messages, history_budget)
+        # Неизрасходованный историей бюджет отдаём рецептам
+        recipes_text, recipes_tokens = self.pack_recipes(recipes, rest - summary_tokens - history_tokens)
+        chat_history = "\n".join(s for s in (summary, recent) if s)
+        tokens = {
+            'query': query_tokens,
+            'recipes': recipes_tokens,
+            'history': history_tokens,
+            'summary': summary_tokens,
+            'total': query_tokens + recipes_tokens + history_tokens + summary_tokens,
+            'budget': self.budget,
+        }
+        logger.debug(f"Packed context: {tokens}")
+        return {'retrieved_recipes': recipes_text, 'chat_history': chat_history, 'tokens': tokens}
+
+def history_messages(chat_history: Any) -> List[Tuple[str, str]]:
+    """
+    Преобразует ChatMessageHistory в список (роль, текст) для ContextPacker.
+
+    Args:
+        chat_history: История чата LangChain.
+
+    Returns:
+        Список сообщений от старых к новым.
+    """
+    return [
+        ('user' if getattr(msg, 'type', '') == 'human' else 'assistant', msg.content)
+        for msg in chat_history.messages
+    ]
@@ -0,0 +1,168 @@
+import re
+import zlib
+import logging
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Слов в шингле
+SHINGLE_SIZE = 3
+# Число хэш-функций MinHash = DEDUP_BANDS * строк в полосе
+MINHASH_PERMUTATIONS = 128
+DEDUP_BANDS = 16
+# Порог оценки сходства Жаккара, начиная с которого рецепты считаются дубликатами
+DEDUP_THRESHOLD = 0.8
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    """
+    Хэши (crc32) словесных k-шинглов текста.
+
+    Args:
+        text: Текст рецепта (Recipe.make_str_recipe_db).
+        k: Слов в шингле.
+
+    Returns:
+        Массив uint64 уникальных хэшей.
+    """
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < k:
+        items = [' '.join(words)] if words else []
+    else:
+        items = (' '.join(words[i:i + k]) for i in range(len(words) - k + 1))
+    res = {zlib.crc32(item.encode('utf-8')) for item in items}
+    return np.fromiter(res, dtype=np.uint64, count=len(res))
+
+class MinHasher:
+    def __init__(self, num_perm: int = MINHASH_PERMUTATIONS, seed: int = 1):
+        """
+        Семейство хэш-функций h(x) = (a * x + b) mod (2^61 - 1) для подписей MinHash.
+
+        Args:
+            num_perm: Число хэш-функций (длина подписи).
+            seed: Зерно генератора коэффициентов; подписи сравнимы только при одном зерне.
+        """
+        rng = np.random.RandomState(seed)
+        # a < 2^31 и x < 2^32: произведение помещается в uint64 без переполнения
+        self.a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.uint64)[:, None]
+        self.num_perm = num_perm
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Подпись MinHash множества хэшей шинглов (минимум каждой хэш-функции).
+
+        У пустого множества подпись из одних _MAX_HASH: она одинакова для всех
+        пустых текстов, поэтому lsh_clusters такие подписи пропускает.
+        """
+        if len(hashes) == 0:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        values = (self.a * hashes[None, :] + self.b) % np.uint64(_MERSENNE_PRIME)
+        return (values & np.uint64(_MAX_HASH)).min(axis=1).astype(np.uint32)
+
+def minhash_signatures(texts: Sequence[str], num_perm: int = MINHASH_PERMUTATIONS, k: int = SHINGLE_SIZE,
+                       seed: int = 1) -> np.ndarray:
+    """
+    Подписи MinHash текстов.
+
+    Returns:
+        Матрица uint32 размера (len(texts), num_perm).
+    """
+    hasher = MinHasher(num_perm, seed)
+    res = np.empty((len(texts), num_perm), dtype=np.uint32)
+    for n, text in enumerate(texts):
+        res[n] = hasher.signature(shingles(text, k))
+    return res
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def lsh_clusters(signatures: np.ndarray, bands: int = DEDUP_BANDS,
+                 threshold: float = DEDUP_THRESHOLD) -> List[List[int]]:
+    """
+    Группирует почти одинаковые подписи с помощью LSH по полосам.
+
+    Подпись делится на bands полос; элементы, совпавшие хотя бы в одной полосе,
+    становятся кандидатами. Подписи пустых текстов (все значения _MAX_HASH)
+    в полосы не попадают и ни с чем не группируются. Кандидат сравнивается только с первым элементом корзины
+    (по доле совпавших хэшей), поэтому работа почти линейна по числу элементов.
+
+    Args:
+        signatures: Матрица подписей (n, num_perm); num_perm должно делиться на bands.
+        bands: Число полос.
+        threshold: Минимальная оценка сходства Жаккара.
+
+    Returns:
+        Группы индексов (только группы из двух и более элементов).
+    """
+    n, num_perm = signatures.shape
+    if num_perm % bands:
+        raise ValueError(f"Signature length {num_perm} is not divisible by {bands} bands")
+    rows = num_perm // bands
+    parent = list(range(n))
+    empty = (signatures == _MAX_HASH).all(axis=1)
+    for band in range(bands):
+        buckets = {}
+        chunk = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for i in range(n):
+            if empty[i]:
+                continue
+            key = chunk[i].tobytes()
+            first = buckets.setdefault(key, i)
+            if first == i:
+                continue
+            root_first, root_i = _find(parent, first), _find(parent, i)
+            if root_first == root_i:
+                continue
+            if np.count_nonzero(signatures[first] == signatures[i]) >= threshold * num_perm:
+                parent[root_i] = root_first
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(_find(parent, i), []).append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+def _rating_key(recipe: Any) -> Tuple[float, float]:
+    return (getattr(recipe, 'ratingValue', 0.0) or 0.0, getattr(recipe, 'ratingCount', 0) or 0)
+
+def dedup_recipes(recipes: Sequence[Any], threshold: float = DEDUP_THRESHOLD, num_perm: int = MINHASH_PERMUTATIONS,
+                  bands: int = DEDUP_BANDS, k: int = SHINGLE_SIZE,
+                  seed: int = 1) -> Tuple[List[Any], List[Dict[str, Any]]]:
+    """
+    Удаляет почти одинаковые рецепты (MinHash по шинглам make_str_recipe_db + LSH).
+
+    Из каждой группы дубликатов остаётся рецепт с лучшей оценкой (при равенстве —
+    с большим числом оценок, затем первый по порядку); порядок рецептов сохраняется.
+
+    Args:
+        recipes: Список объектов Recipe (после make_recipes).
+        threshold: Минимальная оценка сходства Жаккара.
+        num_perm: Длина подписи MinHash.
+        bands: Число полос LSH.
+        k: Слов в шингле.
+        seed: Зерно хэш-функций.
+
+    Returns:
+        Кортеж (оставшиеся рецепты, группы {'kept': id, 'duplicates': [id, ...]}).
+    """
+    signatures = minhash_signatures([recipe.make_str_recipe_db() for recipe in recipes], num_perm, k, seed)
+    groups = lsh_clusters(signatures, bands, threshold)
+
+    dropped = set()
+    clusters = []
+    for members in groups:
+        best = max(members, key=lambda i: (_rating_key(recipes[i]), -i))
+        dropped.update(i for i in members if i != best)
+        clusters.append({
+            'kept': recipes[best].id,
+            'duplicates': [recipes[i].id for i in members if i != best],
+        })
+    kept = [recipe for i, recipe in enumerate(recipes) if i not in dropped]
+    logger.info(f"Dedup: {len(recipes)} -> {len(kept)} recipes, {len(clusters)} duplicate groups")
+    return kept, clusters
@@ -1,13 +1,59 @@
 import re
+import time
 import uuid
-from typing import List, Optional, Dict, Any, Tuple
+import threading
+from array import array
+from typing import List, Optional, Dict, Any, Tuple, Union
 from langchain_core.documents import Document
-from config.food_graph import query_graph, ATTRIBUTES_ORDER, enreach_query_with_relative_tags
+from config.food_graph import query_graph, ATTRIBUTES_ORDER, enreach_query_with_relative_tags, lemmatize_sentance
+from config.metrics import span, inc
+from config.profiling import profile_block
+from config.bundle import Bundle, write_bundle, ids_fingerprint
+from config.tag_vocab import VOCAB, TagListAttribute, IngredientsAttribute
+from config.query_constraints import ConstraintIndex, parse_constraints, describe_constraints
+from config.pantry import PantryIndex, PANTRY_RE
 import logging
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
+# Бюджет токенов документа для эмбеддера по умолчанию и лимит на один шаг рецепта
+DOCUMENT_MAX_TOKENS = 256
+STEP_MAX_TOKENS = 48
+
+# Секции бандла проекта, загружаемые при первом обращении к одноимённому атрибуту
+BUNDLE_SECTIONS = ('recipes', 'knowledgeGraph', 'tags', 'oneWordTags')
+BUNDLE_DEFAULTS = {'recipes': list, 'knowledgeGraph': lambda: None, 'tags': list, 'oneWordTags': list}
+
+# Подписи атрибутов рецепта; один словарь на все рецепты
+RECIPE_KEYS = {
+    'name': 'Название',
+    'description': 'Описание',
+    'recipeYield': 'Количество порций',
+    'ingridients': 'Ингридиенты',
+    'steps': 'Способ приготовления',
+    'calories': 'Калории',
+    'proteinContent': 'Белки',
+    'fatContent': 'Жиры',
+    'carbohydrateContent': 'Углеводы',
+    'time': 'Время приготовления',
+    'meal': 'Тип блюда',
+    'occasions': 'Назначение',
+    'diet': 'Диета',
+    'mainIngridients': 'Основные ингредиенты',
+    'geography': 'География кухни',
+    'ratingValue': 'Средняя оценка',
+    'ratingCount': 'Количество оценок',
+    'standard_time': 'standard_time'
+}
+
+RECIPE_KEYS_ORDER = [
+    'name', 'description', 'recipeYield', 'ingridients', 'steps',
+    'calories', 'proteinContent', 'fatContent', 'carbohydrateContent',
+    'time', 'meal', 'occasions', 'diet', 'mainIngridients', 'geography',
+    'ratingValue', 'ratingCount'
+]
+
 def make_str(obj: Any) -> str:
     """
     Преобразует объект в строку, объединяя элементы списка через запятые.
@@ -30,6 +76,14 @@ def make_str(obj: Any) -> str:
     return res
 
 class Recipe:
+    # Теги хранятся как массивы id общего словаря VOCAB (см. config.tag_vocab)
+    meal = TagListAttribute()
+    occasions = TagListAttribute()
+    diet = TagListAttribute()
+    mainIngridients = TagListAttribute()
+    geography = TagListAttribute()
+    ingridients = IngredientsAttribute()
+
     def __init__(self, recipe: Optional[Dict] = None):
         """
         Инициализирует объект Recipe.
@@ -46,13 +100,17 @@ class Recipe:
             self.add_tags()
             self.standardize_time()
 
-    def make_document(self) -> None:
+    def make_document(self, tokenizer: Optional[Any] = None, max_tokens: Optional[int] = None) -> None:
         """
         Создаёт атрибуты display и document для рецепта.
+
+        Args:
+            tokenizer: Токенизатор эмбеддера; если задан, документ собирается в пределах бюджета токенов.
+            max_tokens: Бюджет токенов документа (по умолчанию из токенизатора).
         """
         self.display = self.make_str_recipe()
         self.document = Document(
-            page_content=self.make_str_recipe_db(),
+            page_content=self.make_str_recipe_db(tokenizer=tokenizer, max_tokens=max_tokens),
             metadata={'id': self.id, 'name': self.name}
         )
         logger.debug(f"Document created for recipe: {self.name}")
@@ -61,53 +119,39 @@ class Recipe:
         """
         Выводит все атрибуты рецепта.
         """
-        for attr in self.__dict__.keys():
-            print(f"{attr}: {getattr(self, attr)}")
+        for attr, value in self.__getstate__().items():
+            print(f"{attr}: {value}")
 
     def clean_tags(self) -> None:
         """
         Очищает теги, удаляя ненужные слова (например, 'кухня', 'рецепты').
+
+        Очистка выполняется один раз на тег словаря, а не на каждый рецепт.
         """
         for attr in ATTRIBUTES_ORDER:
-            if attr in self.__dict__ and getattr(self, attr) is not None:
-                tags = getattr(self, attr)
-                if attr == 'ingridients':
-                    new_tags = [
-                        (
-                            tag[0].replace('кухня', '').replace('рецепты', '')
-                            .replace('питание', '').replace('для', '')
-                            .replace('блюда', '').strip(),
-                            tag[1]
-                        )
-                        for tag in tags
-                    ]
-                else:
-                    new_tags = [
-                        tag.replace('кухня', '').replace('рецепты', '')
-                        .replace('питание', '').replace('для', '')
-                        .replace('блюда', '').strip()
-                        for tag in tags
-                    ]
-                setattr(self, attr, new_tags)
+            key = f"_{attr}_ids"
+            ids = self.__dict__.get(key)
+            if ids is not None:
+                self.__dict__[key] = array('I', map(VOCAB.normalized, ids))
                 logger.debug(f"Cleaned tags for attribute {attr}")
 
     def add_tags(self) -> None:
         """
         Добавляет дополнительные теги на основе существующих (например, 'детский' для 'для детей').
         """
+        extra = VOCAB.extra()
         for attr in ATTRIBUTES_ORDER:
             if attr == 'ingridients':
                 continue
-            if attr in self.__dict__ and getattr(self, attr) is not None:
-                tags = getattr(self, attr)
-                new_tags = tags.copy()
-                if 'для детей' in set(tags):
-                    new_tags.append('детский')
-                if 'пп' in set(tags):
-                    new_tags.extend(['полезный', 'здоровый'])
-                if 'на скорую руку' in set(tags):
-                    new_tags.append('быстрый')
-                setattr(self, attr, new_tags)
+            key = f"_{attr}_ids"
+            ids = self.__dict__.get(key)
+            if ids is not None:
+                present = set(ids)
+                new_ids = ids[:]
+                for tag_id, extra_ids in extra.items():
+                    if tag_id in present:
+                        new_ids.extend(extra_ids)
+                self.__dict__[key] = new_ids
                 logger.debug(f"Added tags for attribute {attr}")
 
     def standardize_time(self) -> None:
@@ -119,7 +163,7 @@ class Recipe:
             return
 
         s = self.time.replace('ч.', 'ч')
-        days = hours = minutes = 0
+        days = hours = minutes = ''
         if "дн." in s:
             days, right = s.split("дн.", 1)
         else:
@@ -163,21 +207,52 @@ class Recipe:
                 res += self.keys_dict[key] + ": " + make_str(getattr(self, key)) + ".\n"
         return res
 
-    def make_str_recipe_db(self) -> str:
+    def make_str_recipe_db(self, tokenizer: Optional[Any] = None, max_tokens: Optional[int] = None) -> str:
         """
         Формирует строковое представление рецепта для базы данных.
 
+        Без токенизатора возвращает название, ингредиенты и шаги целиком. С токенизатором
+        эмбеддера документ укладывается в бюджет токенов: сначала название и ингредиенты,
+        затем шаги, каждый из которых обрезается до STEP_MAX_TOKENS, пока хватает бюджета.
+        Так не тратится время на токенизацию текста, который эмбеддер всё равно отрежет.
+
+        Args:
+            tokenizer: Токенизатор эмбеддера (например, из build_chroma_db).
+            max_tokens: Бюджет токенов (по умолчанию максимальная длина последовательности
+                токенизатора, но не больше DOCUMENT_MAX_TOKENS).
+
         Returns:
             Строковое представление рецепта (название, ингредиенты, шаги).
         """
-        res = ""
+        head = []
         if self.name is not None:
-            res += self.name + " "
-        if self.ingridients is not None:
-            res += ", ".join([ing[0] for ing in self.ingridients])
-        if self.steps is not None:
-            res += ", ".join(self.steps)
-        return res.strip()
+            head.append(self.name)
+        if self.ingridients:
+            head.append(", ".join([ing[0] for ing in self.ingridients]))
+        steps = self.steps if self.steps is not None else []
+        if tokenizer is None:
+            return ". ".join(head + [", ".join(steps)] if steps else head).strip()
+
+        if max_tokens is None:
+            max_tokens = min(tokenizer.model_max_length, DOCUMENT_MAX_TOKENS)
+            max_tokens -= tokenizer.num_special_tokens_to_add()
+
+        parts = []
+        used = 0
+        for n, text in enumerate(head + steps):
+            limit = max_tokens - used
+            if n >= len(head):
+                limit = min(limit, STEP_MAX_TOKENS)
+            if limit <= 0:
+                break
+            ids = tokenizer.encode(text, add_special_tokens=False)
+            if len(ids) > limit:
+                text = tokenizer.decode(ids[:limit]).strip()
+                ids = ids[:limit]
+            parts.append(text)
+            # +1 на разделитель между частями
+            used += len(ids) + 1
+        return ". ".join(parts).strip()
 
     def add_features(self, recipe: Dict) -> None:
         """
@@ -198,13 +273,14 @@ class Recipe:
             self.description = [recipe['description'][0], recipe['description'][1].split(":")[1].strip()]
 
         # Ингредиенты
-        self.ingridients = [None] * len(recipe.get('ingridients', []))
+        ingridients = [None] * len(recipe.get('ingridients', []))
         for n, ing_set in enumerate(recipe.get('ingridients', [])):
             if '       ' in ing_set[1]:
                 ing_set_1 = [d.strip() for d in ing_set[1].split('       ') if d]
-                self.ingridients[n] = (ing_set[0].lower(), ing_set_1[0].lower(), ing_set_1[1].lower() if len(ing_set_1) > 1 else None)
+                ingridients[n] = (ing_set[0].lower(), ing_set_1[0].lower(), ing_set_1[1].lower() if len(ing_set_1) > 1 else None)
             else:
-                self.ingridients[n] = (ing_set[0].lower(), ing_set_1[0].lower(), None)
+                ingridients[n] = (ing_set[0].lower(), ing_set_1[0].lower(), None)
+        self.ingridients = ingridients
 
         # Маппинг атрибутов
         attr_name = {
@@ -262,33 +338,29 @@ class Recipe:
         """
         Создаёт словари keys_dict и keys_dict_order для атрибутов рецепта.
         """
-        self.keys_dict = {
-            'name': 'Название',
-            'description': 'Описание',
-            'recipeYield': 'Количество порций',
-            'ingridients': 'Ингридиенты',
-            'steps': 'Способ приготовления',
-            'calories': 'Калории',
-            'proteinContent': 'Белки',
-            'fatContent': 'Жиры',
-            'carbohydrateContent': 'Углеводы',
-            'time': 'Время приготовления',
-            'meal': 'Тип блюда',
-            'occasions': 'Назначение',
-            'diet': 'Диета',
-            'mainIngridients': 'Основные ингредиенты',
-            'geography': 'География кухни',
-            'ratingValue': 'Средняя оценка',
-            'ratingCount': 'Количество оценок',
-            'standard_time': 'standard_time'
-        }
+        self.keys_dict = RECIPE_KEYS
+        self.keys_dict_order = RECIPE_KEYS_ORDER
 
-        self.keys_dict_order = [
-            'name', 'description', 'recipeYield', 'ingridients', 'steps',
-            'calories', 'proteinContent', 'fatContent', 'carbohydrateContent',
-            'time', 'meal', 'occasions', 'diet', 'mainIngridients', 'geography',
-            'ratingValue', 'ratingCount'
-        ]
+    def __getstate__(self) -> Dict[str, Any]:
+        # id тегов действительны только в этом процессе: в pickle пишутся строки
+        # (одинаковые строки разных рецептов pickle сохраняет один раз)
+        state = {}
+        for key, value in self.__dict__.items():
+            if key in ('keys_dict', 'keys_dict_order') or key.endswith('_rest'):
+                continue
+            if key.startswith('_') and key.endswith('_ids'):
+                attr = key[1:-4]
+                state[attr] = getattr(self, attr)
+            else:
+                state[key] = value
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        # Подходит и для рецептов, сохранённых до появления словаря тегов
+        self.make_keys_dict()
+        for key, value in state.items():
+            if key not in ('keys_dict', 'keys_dict_order'):
+                setattr(self, key, value)
 
 class RecipesProject:
     def __init__(self, recipes: Optional[List[Recipe]] = None, knowledgeGraph: Optional[Any] = None,
@@ -311,8 +383,83 @@ class RecipesProject:
         self.oneWordTags = oneWordTags if oneWordTags is not None else []
         self.model = None
         self.tokenizer = None
+        self._recipes_by_id = None
+        self._constraint_index = None
+        self._pantry_index = None
         logger.info("RecipesProject initialized")
 
+    def get_recipe(self, recipe_id: str) -> Optional[Recipe]:
+        """
+        Возвращает рецепт по идентификатору.
+
+        Args:
+            recipe_id: Идентификатор рецепта.
+
+        Returns:
+            Объект Recipe или None.
+        """
+        if self._recipes_by_id is None or len(self._recipes_by_id) != len(self.recipes):
+            self._recipes_by_id = {recipe.id: recipe for recipe in self.recipes}
+        return self._recipes_by_id.get(recipe_id)
+
+    def filter_recipes(self, constraints: Dict[str, Tuple[Optional[float], Optional[float]]]) -> Optional[set]:
+        """
+        Отбирает рецепты по числовым ограничениям (время, калории, порции, рейтинг).
+
+        Индекс по полям строится при первом вызове и перестраивается при смене рецептов.
+
+        Args:
+            constraints: Ограничения из config.query_constraints.parse_constraints.
+
+        Returns:
+            Множество идентификаторов рецептов или None, если ограничений нет.
+        """
+        if not constraints:
+            return None
+        index = self._constraint_index
+        if index is None or len(index) != len(self.recipes):
+            index = self._constraint_index = ConstraintIndex(self.recipes)
+        return index.select(constraints)
+
+    def _narrowing(self, ids: Optional[set]) -> Optional[set]:
+        """
+        Возвращает ids, только если они сужают поиск; множество всех рецептов проекта
+        заменяется на None, чтобы векторный поиск шёл по коллекции без фильтра по id.
+        """
+        if ids is None or len(ids) >= len(self.recipes):
+            return None
+        return ids
+
+    def search_by_ingredients(self, ingredients: Union[str, List[str]], n: int = 3,
+                              constraints: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+                              verbose: bool = False) -> List[Dict[str, Any]]:
+        """
+        Ищет рецепты, которые можно приготовить из имеющихся продуктов.
+
+        Рецепты ранжируются по числу недостающих ингредиентов и покрытию продуктами
+        пользователя (см. config.pantry.PantryIndex); индекс строится при первом вызове.
+
+        Args:
+            ingredients: Список продуктов или запрос («Что приготовить из картошки и сыра?»).
+            n: Количество рецептов.
+            constraints: Числовые ограничения запроса (config.query_constraints).
+            verbose: Если True, выводит распознанные продукты.
+
+        Returns:
+            Список {'id', 'covered', 'missing', 'total', 'used', 'missing_ingridients'}.
+        """
+        index = self._pantry_index
+        if index is None or len(index.rows) != len(self.recipes):
+            with span('pantry_index'):
+                index = self._pantry_index = PantryIndex(self.recipes, self.tags, lemmatize_sentance)
+        with span('pantry'):
+            items = index.items_from_query(ingredients) if isinstance(ingredients, str) else list(ingredients)
+            if verbose:
+                print(f"Ingredients: {', '.join(items) if items else 'not found'}")
+            res = index.search(items, n=n, candidates=self.filter_recipes(constraints))
+        logger.debug(f"Pantry search for {items}: {[r['id'] for r in res]}")
+        return res
+
     def add_recipes_list(self, recipes: List[Recipe]) -> None:
         """
         Добавляет список рецептов в проект.
@@ -324,6 +471,9 @@ class RecipesProject:
             logger.error("Recipes must be a list")
             raise ValueError("Recipes must be a list")
         self.recipes = recipes
+        self._recipes_by_id = None
+        self._constraint_index = None
+        self._pantry_index = None
         logger.info(f"Added {len(recipes)} recipes to RecipesProject")
 
     def add_knowledge_graph(self, knowledgeGraph: Any) -> None:
@@ -383,7 +533,8 @@ class RecipesProject:
         Returns:
             Обогащённый запрос.
         """
-        new_tags = enreach_query_with_relative_tags(query, self.oneWordTags)
+        with span('enrich'):
+            new_tags = enreach_query_with_relative_tags(query, self.oneWordTags)
         new_tags_str = " ".join(new_tags)
         if verbose:
             if new_tags_str:
@@ -394,18 +545,190 @@ class RecipesProject:
         logger.debug(f"Enriched query: {res}")
         return res
 
-    def invoke(self, query: str, verbose: bool = False) -> str:
+    def invoke(self, query: str, verbose: bool = False, request_id: Optional[str] = None,
+               constraints: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None) -> str:
         """
         Обрабатывает запрос, используя граф знаний и теги.
 
+        Числовые ограничения запроса ('за 30 минут', 'до 300 ккал') применяются
+        первыми: граф знаний ищет только среди рецептов, прошедших фильтр.
+
         Args:
             query: Текстовый запрос.
             verbose: Если True, выводит дополнительную информацию.
+            request_id: Идентификатор запроса для файлов профиля (см. config.profiling).
+            constraints: Уже разобранные ограничения; по умолчанию извлекаются из запроса.
 
         Returns:
             Ответ на запрос.
         """
-        enriched_query = self.enrich_query_with_tags(query, verbose=verbose)
-        answer = query_graph(enriched_query, self.knowledgeGraph, self.tags, verbose=verbose)
-        logger.info(f"Processed query: {query}, Answer: {answer}")
-        return answer
\ No newline at end of file
+        inc('queries')
+        with profile_block('invoke', request_id), span('invoke'):
+            with span('constraints'):
+                if constraints is None:
+                    constraints, query = parse_constraints(query)
+                candidates = self.filter_recipes(constraints)
+            if verbose and constraints:
+                print(f"Constraints are applied: {', '.join(describe_constraints(constraints))}. "
+                      f"Selected {len(candidates)} recipes")
+            enriched_query = self.enrich_query_with_tags(query, verbose=verbose)
+            with span('query_graph'):
+                answer = query_graph(enriched_query, self.knowledgeGraph, self.tags, verbose=verbose,
+                                     candidates=candidates)
+        logger.info(f"Processed query: {query}, selected {len(answer[0])} of {len(answer[1])} recipes")
+        logger.debug(f"Answer: {answer}")
+        return answer
+
+    def search(self, query: str, n: int = 3, verbose: bool = False) -> List[str]:
+        """
+        Гибридный поиск: кандидаты из графа знаний ранжируются векторным поиском.
+
+        Запросы вида «что приготовить из картошки и сыра» обрабатываются поиском
+        по покрытию ингредиентов (search_by_ingredients).
+
+        Векторный поиск ведётся только среди рецептов, отобранных графом знаний;
+        если их не хватает, список дополняется результатами поиска по всей коллекции
+        (или по рецептам, прошедшим числовые ограничения запроса, если они есть).
+
+        Args:
+            query: Текстовый запрос.
+            n: Количество рецептов.
+            verbose: Если True, выводит дополнительную информацию.
+
+        Returns:
+            Список идентификаторов рецептов.
+        """
+        constraints, query_text = parse_constraints(query)
+        if PANTRY_RE.search(query_text.lower()):
+            found = self.search_by_ingredients(query_text, n=n, constraints=constraints, verbose=verbose)
+            if found:
+                return [r['id'] for r in found]
+        query_clean = query_text.lower().replace("рецепт", "").replace("кухня", "")
+        selected, fallback = self.invoke(query_clean, verbose=verbose, constraints=constraints)
+        candidates = selected if selected else fallback
+        if self.vectorStore is None:
+            return sorted(candidates)[:n]
+
+        # Векторное хранилище (chromadb, модель эмбеддингов) нужно только здесь
+        from config.vector_db import request_chroma_db
+
+        docs = request_chroma_db(self.vectorStore, query, self.tokenizer, top_k=n,
+                                 allowed_ids=self._narrowing(candidates))
+        res = [doc.metadata['id'] for doc in docs]
+        if len(res) < n:
+            allowed = self._narrowing(self.filter_recipes(constraints))
+            for doc in request_chroma_db(self.vectorStore, query, self.tokenizer, top_k=n, allowed_ids=allowed):
+                if doc.metadata['id'] not in res:
+                    res.append(doc.metadata['id'])
+        return res[:n]
+
+    def save(self, path: str, persist_directory: Optional[str] = None, model_name: Optional[str] = None) -> None:
+        """
+        Сохраняет проект в один версионированный файл-бандл.
+
+        Рецепты, граф знаний, теги и однословные теги пишутся отдельными секциями;
+        векторное хранилище остаётся в папке ChromaDB, а в заголовок записываются
+        его папка, коллекция и модель эмбеддингов.
+
+        Args:
+            path: Путь к файлу бандла.
+            persist_directory: Папка ChromaDB (по умолчанию папка открытого хранилища).
+            model_name: Модель эмбеддингов (по умолчанию модель открытого хранилища).
+
+        Raises:
+            ValueError: Если граф знаний построен на другом наборе рецептов.
+        """
+        from config.vector_db import PERSIST_DIRECTORY
+
+        sections = {name: getattr(self, name) for name in BUNDLE_SECTIONS if getattr(self, name) is not None}
+        fingerprints = {'recipes': ids_fingerprint(recipe.id for recipe in self.recipes)}
+        if self.knowledgeGraph is not None:
+            fingerprints['knowledgeGraph'] = ids_fingerprint(
+                n for n, node_type in self.knowledgeGraph.nodes(data='node_type') if node_type == 'recipe'
+            )
+        if len(set(fingerprints.values())) > 1:
+            logger.error("Knowledge graph is built on a different set of recipes")
+            raise ValueError("Knowledge graph is built on a different set of recipes; the bundle would not open")
+        meta = {'recipes': len(self.recipes), 'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        if self.vectorStore is not None:
+            collection = self.vectorStore._collection
+            meta['vector_store'] = {
+                'persist_directory': persist_directory or getattr(self.vectorStore, '_persist_directory', None)
+                                     or PERSIST_DIRECTORY,
+                'collection_name': collection.name,
+                'model_name': model_name or getattr(self.vectorStore.embeddings, 'model_name', None),
+                'count': collection.count(),
+            }
+        write_bundle(path, sections, meta=meta, fingerprints=fingerprints)
+        logger.info(f"RecipesProject saved to {path}")
+
+    @classmethod
+    def open(cls, path: str, persist_directory: Optional[str] = None, verify: bool = True) -> 'RecipesProject':
+        """
+        Открывает проект из бандла, сохранённого методом save.
+
+        Читается только заголовок; каждая секция загружается при первом обращении
+        к атрибуту (например, воркер, который только ищет по графу, не загружает
+        векторное хранилище). Согласованность секций проверяется по заголовку
+        сразу, а содержимое секции — при её загрузке.
+
+        Args:
+            path: Путь к файлу бандла.
+            persist_directory: Папка ChromaDB вместо записанной в бандле.
+            verify: Проверять ли контрольные суммы и отпечатки секций.
+
+        Returns:
+            Объект RecipesProject.
+        """
+        project = cls()
+        for name in BUNDLE_SECTIONS + ('vectorStore',):
+            del project.__dict__[name]
+        project._bundle = Bundle(path, verify=verify)
+        project._bundle_lock = threading.Lock()
+        project._persist_directory = persist_directory
+        logger.info(f"RecipesProject opened from {path} ({project._bundle.meta.get('recipes')} recipes)")
+        return project
+
+    def _load_section(self, name: str) -> Any:
+        """
+        Загружает секцию бандла или открывает векторное хранилище, записанное в заголовке.
+        """
+        bundle = self._bundle
+        if name == 'vectorStore':
+            info = bundle.meta.get('vector_store')
+            if info is None:
+                return None
+            from config.vector_db import open_chroma_db
+            vector_store = open_chroma_db(
+                model_name=info['model_name'],
+                persist_directory=self._persist_directory or info['persist_directory'],
+                collection_name=info['collection_name']
+            )
+            count = vector_store._collection.count()
+            if count != info['count']:
+                logger.warning(f"Vector store has {count} documents, bundle expects {info['count']}")
+            return vector_store
+        if name not in bundle:
+            return BUNDLE_DEFAULTS[name]()
+
+        value = bundle.load(name)
+        expected = bundle.sections[name].get('fingerprint')
+        if bundle.verify and expected is not None:
+            if name == 'recipes':
+                actual = ids_fingerprint(recipe.id for recipe in value)
+            else:
+                actual = ids_fingerprint(n for n, node_type in value.nodes(data='node_type') if node_type == 'recipe')
+            if actual != expected:
+                raise ValueError(f"Bundle section {name} does not match its recipes")
+        logger.info(f"Loaded {name} from bundle")
+        return value
+
+    def __getattr__(self, name: str) -> Any:
+        # Вызывается только для отсутствующих атрибутов, то есть для ещё не загруженных секций
+        bundle = self.__dict__.get('_bundle')
+        if bundle is None or name not in BUNDLE_SECTIONS + ('vectorStore',):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        with self.__dict__['_bundle_lock']:
+            if name not in self.__dict__:
+                self.__dict__[name] = self._load_section(name)
+        return self.__dict__[name]
@@ -0,0 +1,331 @@
+import json
+import time
+import hashlib
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from config.bundle import ids_fingerprint
+from config.llm_cache import LLMCache, generation_settings
+from config.llm_scheduler import LLMScheduler, percentile
+from config.model_loader import llm_invoke
+from config.prompt_builder import build_prompt
+from config.server import warm_up
+
+logger = logging.getLogger(__name__)
+
+EVAL_CACHE_PATH = "./eval_cache.sqlite"
+EVAL_CACHE_MAX_ENTRIES = 1000000
+EVAL_CONCURRENCY = 2
+METRICS_BATCH_SIZE = 32
+# Системы, которые сравнивались в ai_chef_chat.ipynb
+SYSTEMS = ('llm_prompt', 'llm_question')
+METRICS = ('bertscore', 'rouge')
+
+def hash_key(*parts: Any) -> str:
+    """
+    Строит ключ кэша по входным данным этапа.
+    """
+    data = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def retrieval_fingerprint(project: Any) -> str:
+    """
+    Отпечаток данных, от которых зависит поиск: рецепты, граф знаний, теги и векторное хранилище.
+
+    Пересборка графа, тегов или индекса меняет отпечаток, поэтому закэшированные
+    результаты поиска по старым данным не используются.
+    """
+    graph = project.knowledgeGraph
+    parts = {
+        'recipes': ids_fingerprint(recipe.id for recipe in project.recipes),
+        # Рёбра без учёта направления: пересобранный граф с теми же размерами, но другими связями меняет отпечаток
+        'graph': ids_fingerprint(
+            "\t".join(sorted((str(u), str(v)))) for u, v in graph.edges()
+        ) if graph is not None else None,
+        'tags': hash_key(list(project.tags), list(project.oneWordTags)),
+    }
+    if project.vectorStore is not None:
+        # Синхронизация хранилища создаёт новую коллекцию, поэтому имя меняется вместе с содержимым
+        collection = project.vectorStore._collection
+        parts['vector_store'] = [collection.name, collection.count()]
+    return hash_key(parts)
+
+def load_eval_set(path: str) -> List[Dict[str, str]]:
+    """
+    Читает набор запросов с эталонными ответами.
+
+    Поддерживаются JSON-список и JSONL с полями 'query' и 'reference'.
+
+    Args:
+        path: Путь к файлу.
+
+    Returns:
+        Список словарей {'query', 'reference'}.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        items = json.loads(text)
+    else:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    logger.info(f"Loaded {len(items)} evaluation items from {path}")
+    return items
+
+@functools.lru_cache(maxsize=None)
+def load_metric(name: str) -> Any:
+    """
+    Загружает метрику evaluate один раз на процесс (BERTScore при загрузке поднимает модель).
+    """
+    from evaluate import load
+    logger.info(f"Loading metric {name}")
+    return load(name)
+
+def compute_metric(name: str, predictions: List[str], references: List[str]) -> List[Dict[str, float]]:
+    """
+    Считает метрику для пакета пар (ответ, эталон).
+
+    Args:
+        name: 'bertscore' или 'rouge'.
+        predictions: Ответы системы.
+        references: Эталонные ответы.
+
+    Returns:
+        Список словарей со значениями метрики для каждой пары.
+    """
+    metric = load_metric(name)
+    if name == 'bertscore':
+        res = metric.compute(predictions=predictions, references=references, lang="ru")
+        return [
+            {'bertscore_precision': p, 'bertscore_recall': r, 'bertscore_f1': f}
+            for p, r, f in zip(res['precision'], res['recall'], res['f1'])
+        ]
+    res = metric.compute(predictions=predictions, references=references, use_aggregator=False)
+    keys = [key for key in res if key.startswith('rouge')]
+    return [{key: res[key][i] for key in keys} for i in range(len(predictions))]
+
+class EvaluationRunner:
+    def __init__(self, project: Any, model: Any, cache_path: str = EVAL_CACHE_PATH,
+                 concurrency: int = EVAL_CONCURRENCY, batch_size: int = METRICS_BATCH_SIZE,
+                 n_recipes: int = 3, retrieval_version: str = "v1",
+                 metric_fn: Callable[[str, List[str], List[str]], List[Dict[str, float]]] = compute_metric):
+        """
+        Инициализирует офлайн-оценку качества и задержек ассистента.
+
+        Каждый этап кэшируется по хэшу своих входов: поиск — по запросу и
+        отпечатку данных проекта (retrieval_fingerprint), генерация — по параметрам модели и полному промпту,
+        метрики — по имени метрики, ответу и эталону. Поэтому после изменения
+        одного компонента пересчитывается только то, что от него зависит.
+
+        Args:
+            project: RecipesProject с графом знаний и векторным хранилищем.
+            model: Модель OllamaLLM.
+            cache_path: Путь к файлу кэша.
+            concurrency: Число одновременных поисков и генераций.
+            batch_size: Размер пакета при подсчёте метрик.
+            n_recipes: Сколько рецептов передавать в промпт.
+            retrieval_version: Дополнительная метка версии поиска (например, после изменения
+                кода поиска); смена данных проекта учитывается автоматически.
+            metric_fn: Функция подсчёта метрик по пакету.
+        """
+        self.project = project
+        self.model = model
+        self.cache = LLMCache(cache_path, max_entries=EVAL_CACHE_MAX_ENTRIES, ttl=None)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.n_recipes = n_recipes
+        self.retrieval_version = retrieval_version
+        self.retrieval_fingerprint = retrieval_fingerprint(project)
+        self.metric_fn = metric_fn
+        self.recomputed = {'retrieval': 0, 'generation': 0, 'metrics': 0}
+        self._recomputed_lock = threading.Lock()
+
+    def _cached(self, key: str) -> Optional[Any]:
+        value = self.cache.get(key)
+        return json.loads(value) if value is not None else None
+
+    def retrieve(self, query: str) -> Dict[str, Any]:
+        """
+        Выполняет гибридный поиск рецептов для запроса (с кэшем).
+        """
+        key = hash_key('retrieval', self.retrieval_fingerprint, self.retrieval_version, self.n_recipes, query)
+        res = self._cached(key)
+        if res is None:
+            start = time.perf_counter()
+            ids = self.project.search(query, n=self.n_recipes)
+            res = {'ids': ids, 'latency': time.perf_counter() - start}
+            self.cache.set(key, json.dumps(res, ensure_ascii=False))
+            with self._recomputed_lock:
+                self.recomputed['retrieval'] += 1
+        return res
+
+    def retrieve_all(self, queries: Sequence[str]) -> Dict[int, Dict[str, Any]]:
+        """
+        Выполняет поиск для всех запросов с тем же ограничением параллелизма, что и генерация.
+
+        Ленивые индексы проекта (словарь рецептов, ограничения, поиск по продуктам)
+        строятся заранее (config.server.warm_up), чтобы потоки не строили их одновременно.
+        Задержка поиска измеряется для каждого запроса отдельно, но под параллельной нагрузкой.
+
+        Returns:
+            {номер запроса: {'ids', 'latency'}}.
+        """
+        if not queries:
+            return {}
+        warm_up(self.project)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return dict(enumerate(executor.map(self.retrieve, queries)))
+
+    def make_requests(self, query: str, ids: Sequence[str]) -> Dict[str, str]:
+        """
+        Формирует запросы к LLM для каждой оцениваемой системы.
+        """
+        recipes = [self.project.get_recipe(id_) for id_ in ids]
+        displays = [recipe.make_str_recipe() for recipe in recipes if recipe is not None]
+        return {
+            'llm_prompt': build_prompt(query, "\n".join(displays)),
+            'llm_question': query,
+        }
+
+    def _generate(self, request_str: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        response = llm_invoke(self.model, request_str)
+        return {'response': response, 'latency': time.perf_counter() - start}
+
+    def generate(self, requests: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Генерирует ответы с ограниченным параллелизмом, пропуская закэшированные.
+
+        Args:
+            requests: {id элемента: {система: запрос к LLM}}.
+
+        Returns:
+            {id элемента: {система: {'response', 'latency'}}}.
+        """
+        settings = generation_settings(self.model)
+        results = {item_id: {} for item_id in requests}
+        pending = []
+        for item_id, by_system in requests.items():
+            for system, request_str in by_system.items():
+                key = hash_key('generation', settings, request_str)
+                cached = self._cached(key)
+                if cached is not None:
+                    results[item_id][system] = cached
+                else:
+                    pending.append((item_id, system, key, request_str))
+
+        if pending:
+            scheduler = LLMScheduler(
+                self.model, workers=self.concurrency, max_queue=len(pending),
+                invoke=lambda model, request_str: self._generate(request_str)
+            )
+            try:
+                futures = [(item_id, system, key, scheduler.submit(request_str))
+                           for item_id, system, key, request_str in pending]
+                # Сохраняем все успешные ответы, чтобы повторный запуск после сбоя их не пересчитывал
+                error = None
+                for item_id, system, key, future in futures:
+                    try:
+                        res = future.result()
+                    except Exception as e:
+                        error = error or e
+                        continue
+                    results[item_id][system] = res
+                    self.cache.set(key, json.dumps(res, ensure_ascii=False))
+                    self.recomputed['generation'] += 1
+            finally:
+                scheduler.shutdown()
+            if error is not None:
+                raise error
+        return results
+
+    def score(self, pairs: List[Dict[str, str]]) -> List[Dict[str, float]]:
+        """
+        Считает метрики пакетами, пропуская закэшированные пары.
+
+        Args:
+            pairs: Список {'prediction', 'reference'}.
+
+        Returns:
+            Список словарей метрик в том же порядке.
+        """
+        scores = [{} for _ in pairs]
+        for name in METRICS:
+            pending = []
+            for i, pair in enumerate(pairs):
+                key = hash_key('metric', name, pair['prediction'], pair['reference'])
+                cached = self._cached(key)
+                if cached is not None:
+                    scores[i].update(cached)
+                else:
+                    pending.append((i, key))
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                values = self.metric_fn(
+                    name,
+                    [pairs[i]['prediction'] for i, _ in batch],
+                    [pairs[i]['reference'] for i, _ in batch]
+                )
+                for (i, key), value in zip(batch, values):
+                    scores[i].update(value)
+                    self.cache.set(key, json.dumps(value))
+                self.recomputed['metrics'] += len(batch)
+        return scores
+
+    def run(self, items: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Запускает оценку на наборе запросов.
+
+        Args:
+            items: Список {'query', 'reference'}.
+
+        Returns:
+            Отчёт: построчные результаты, средние метрики по системам,
+            распределения задержек и число пересчитанных этапов.
+        """
+        retrieved = self.retrieve_all([item['query'] for item in items])
+        requests = {i: self.make_requests(item['query'], retrieved[i]['ids']) for i, item in enumerate(items)}
+        generated = self.generate(requests)
+
+        rows = []
+        pairs = []
+        for i, item in enumerate(items):
+            for system in SYSTEMS:
+                rows.append({
+                    'query': item['query'],
+                    'system': system,
+                    'recipes': retrieved[i]['ids'],
+                    'response': generated[i][system]['response'],
+                    'retrieval_latency': retrieved[i]['latency'],
+                    'generation_latency': generated[i][system]['latency'],
+                })
+                pairs.append({'prediction': generated[i][system]['response'], 'reference': item['reference']})
+        for row, score in zip(rows, self.score(pairs)):
+            row.update(score)
+
+        summary = {}
+        for system in SYSTEMS:
+            system_rows = [row for row in rows if row['system'] == system]
+            metric_keys = sorted({key for row in system_rows for key in row if key.startswith(('bertscore', 'rouge'))})
+            latencies = [row['generation_latency'] for row in system_rows]
+            summary[system] = {
+                **{key: sum(row.get(key, 0.0) for row in system_rows) / max(len(system_rows), 1) for key in metric_keys},
+                'generation_latency_p50': percentile(latencies, 50),
+                'generation_latency_p95': percentile(latencies, 95),
+                'generation_latency_p99': percentile(latencies, 99),
+            }
+        retrieval_latencies = [r['latency'] for r in retrieved.values()]
+        report = {
+            'rows': rows,
+            'summary': summary,
+            'retrieval_latency': {
+                'p50': percentile(retrieval_latencies, 50),
+                'p95': percentile(retrieval_latencies, 95),
+                'p99': percentile(retrieval_latencies, 99),
+            },
+            'recomputed': dict(self.recomputed),
+        }
+        logger.info(f"Evaluation finished, recomputed: {self.recomputed}")
+        return report
@@ -1,4 +1,4 @@
-from collections import defaultdict
+from collections import defaultdict, Counter
 import spacy
 from tqdm import tqdm
 import re
@@ -11,6 +11,9 @@ import nltk
 
 from fuzzywuzzy import process
 
+from config.metrics import span
+from config.tag_vocab import VOCAB, TagTable, tag_ids
+
 
 nltk.download('stopwords')
 
@@ -24,6 +27,8 @@ ATTRIBUTES_ORDER = [
     'occasions',
     'geography',
 ]
+# Тег запроса применяется, пока после него остаётся не меньше стольких рецептов
+QUERY_MIN_NUMBER = 5
 
 PATTERNS = "[A-Za-z0-9!#$%&'()*+,./:;<=>?@[\]^_`{|}~—\"\-]+"
 stopwords_ru = stopwords.words("russian")
@@ -41,25 +46,16 @@ def lemmatize(doc):
     return tokens
 
 def make_tags_list(recipes_list, min_count=10):
-    
-    tags = defaultdict(int)
-    
+    # Частоты считаются по id словаря тегов в порядке первой встречи тега,
+    # строки тегов не копируются
+    counts = Counter()
     for attribute in ATTRIBUTES_ORDER:
         for recipe in recipes_list:
-            tags_list = getattr(recipe, attribute)
-            if tags_list is not None:
-                for tag in tags_list:
-                    if attribute == 'ingridients':
-                        tags[tag[0].lower()] += 1
-                    else:
-                        tags[tag.lower()] += 1
-            
-    tags_list = list(tags.keys()) 
-    for tag in tags_list:
-        if tags[tag] < min_count:
-            del tags[tag]
-        
-    return tags
+            ids = tag_ids(recipe, attribute)
+            if ids is not None:
+                counts.update(map(VOCAB.lowered, ids))
+
+    return TagTable.from_counts(counts, min_count)
 
 
 def make_one_word_tags_list(tags):
@@ -81,11 +77,12 @@ def levenstein_similarity_normalized(text1: str, text2: str) -> float:
 
 def enreach_query_with_relative_tags(query, one_word_tags):
     query = re.sub(PATTERNS, ' ', query.lower())
+    choices = list(one_word_tags.keys())
     new_tags = []
     for token in query.split():
         if token and token not in stopwords_ru:
             token = token.strip()
-            close_token = process.extractOne(token, [key for key in one_word_tags.keys()])
+            close_token = process.extractOne(token, choices)
             if levenstein_similarity_normalized(token, close_token[0]) >= LEVENSTEIN_SIMILARITY_MIN:
                 new_tags.append(close_token[0])
     return new_tags
@@ -98,6 +95,9 @@ def lemmatize_sentance(text):
     
 
 def lemmatize_tags(tags):
+    if isinstance(tags, TagTable):
+        tags.lemmatize(lemmatize_sentance)
+        return
     nlp = spacy.load("ru_core_news_sm")
     for tag in tags:
         if "(" in tag:
@@ -118,11 +118,23 @@ def add_recipes_to_graph(G, recipes_list):
     
 
 def add_tags_to_graph(G, tags):
+    if isinstance(tags, TagTable):
+        # Узел тега — id группы лемм таблицы
+        G.add_nodes_from(range(len(tags.groups)), node_type="tag")
+        return
     for tag in tags:
         G.add_node(tags[tag]['lemma'], node_type="tag")
 
 
 def add_edges_to_graph(G, recipes_list, tags):
+    if isinstance(tags, TagTable):
+        group = tags.group
+        for attribute in ATTRIBUTES_ORDER:
+            for recipe in recipes_list:
+                ids = tag_ids(recipe, attribute)
+                if ids is not None:
+                    G.add_edges_from((recipe.id, group[tag_id]) for tag_id in ids if tag_id in group)
+        return
     for attribute in ATTRIBUTES_ORDER:
         for recipe in recipes_list:
             recipe_tags_list = getattr(recipe, attribute)
@@ -148,33 +160,72 @@ def build_knowledge_graph(recipes_list, tags):
     add_recipes_to_graph(G, recipes_list)
     add_tags_to_graph(G, tags)
     add_edges_to_graph(G, recipes_list, tags)
+    recipe_nodes(G)
     
     return G
     
 
 
-def query_graph(query, graph, tags, min_number=5, verbose=False):
-    query_lemms = lemmatize_sentance(query)
-    
-    
-    answer = set()
-    answer_new = set()
-    
-    for n in graph.nodes():
-        if graph.nodes[n]['node_type'] == 'recipe':
-            answer.add(n)
+def recipe_nodes(graph):
+    # Множество рецептов графа считается один раз и хранится в атрибутах графа
+    nodes = graph.graph.get('recipe_nodes')
+    if nodes is None:
+        nodes = frozenset(n for n, node_type in graph.nodes(data='node_type') if node_type == 'recipe')
+        graph.graph['recipe_nodes'] = nodes
+    return nodes
+
+
+def query_graph_steps(query, graph, tags, verbose=False, candidates=None):
+    # Множества рецептов до применения тегов и после каждого подходящего тега запроса по очереди
+    with span('lemmatize'):
+        query_lemms = lemmatize_sentance(query)
+
+    answer = recipe_nodes(graph)
+    if candidates is not None:
+        # Предварительный фильтр (например, по ограничениям запроса) сужает множество до пересечений с тегами
+        answer = answer.intersection(candidates)
+    yield answer
+
+    if isinstance(tags, TagTable):
+        # Подходящие группы находятся по индексу слов лемм, без перебора всех тегов
+        for group in tags.match(query_lemms):
+            answer = answer.intersection(graph[group])
+            if verbose:
+                print(f" Tag ({tags.tags_of_group(group)}, {tags.groups[group]}) is applied. Selected {len(answer)} recipes")
+            yield answer
+        return
+
     for tag in tags:
         if len(set(query_lemms).intersection(set(tags[tag]['lemma'])))\
                 == len(set(tags[tag]['lemma'])):
             current_subgraph = set()
             for n in graph.neighbors(tags[tag]['lemma']):
                 current_subgraph.add(n)
-            answer_new = answer.intersection(current_subgraph)
+            answer = answer.intersection(current_subgraph)
             if verbose:
-                print(f" Tag ({tag, tags[tag]}) is applied. Selected {len(answer_new)} recipes")
-            if len(answer_new) < min_number:
-                return answer_new, answer
-            answer = answer_new
+                print(f" Tag ({tag, tags[tag]}) is applied. Selected {len(answer)} recipes")
+            yield answer
+
+
+def query_graph_stop(sizes, min_number=QUERY_MIN_NUMBER):
+    # Номера шагов query_graph_steps (отобранные, запасные) по размерам множеств на шагах:
+    # теги применяются, пока отобрано не меньше min_number рецептов; None — ни один тег не подошёл
+    for step in range(1, len(sizes)):
+        if sizes[step] < min_number:
+            return step, step - 1
+    if len(sizes) > 1:
+        return len(sizes) - 1, len(sizes) - 1
+    return None, 0
+
+
+def query_graph(query, graph, tags, min_number=QUERY_MIN_NUMBER, verbose=False, candidates=None):
+    steps = query_graph_steps(query, graph, tags, verbose=verbose, candidates=candidates)
+    answer = next(steps)
+    answer_new = set()
+    for answer_new in steps:
+        if len(answer_new) < min_number:
+            return answer_new, answer
+        answer = answer_new
     return answer_new, answer
 
 def save_graph(graph, file_name):
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = "./llm_cache.sqlite"
+CACHE_MAX_ENTRIES = 10000
+CACHE_TTL = 7 * 24 * 3600  # секунд
+
+# Параметры генерации OllamaLLM, влияющие на ответ
+GENERATION_PARAMS = (
+    'model', 'temperature', 'top_k', 'top_p', 'repeat_last_n', 'repeat_penalty',
+    'num_predict', 'num_ctx', 'seed', 'stop', 'format', 'mirostat',
+    'mirostat_eta', 'mirostat_tau', 'tfs_z',
+)
+
+def generation_settings(model: Any) -> Dict[str, Any]:
+    """
+    Извлекает из модели параметры генерации, которые входят в ключ кэша.
+
+    Args:
+        model: Модель OllamaLLM.
+
+    Returns:
+        Словарь параметров генерации.
+    """
+    return {name: getattr(model, name, None) for name in GENERATION_PARAMS}
+
+def make_cache_key(settings: Dict[str, Any], messages: List[Any]) -> str:
+    """
+    Строит ключ кэша по параметрам генерации и полностью отформатированным сообщениям.
+
+    Args:
+        settings: Параметры генерации (см. generation_settings).
+        messages: Сообщения после ChatPromptTemplate.format_messages().
+
+    Returns:
+        Шестнадцатеричный SHA-256 ключ.
+    """
+    payload = {
+        'settings': settings,
+        'messages': [[getattr(m, 'type', ''), getattr(m, 'content', str(m))] for m in messages],
+    }
+    data = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+class LLMCache:
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 ttl: Optional[float] = CACHE_TTL):
+        """
+        Инициализирует дисковый кэш ответов LLM на SQLite.
+
+        Args:
+            path: Путь к файлу базы SQLite.
+            max_entries: Максимальное число записей; при превышении удаляются давно не читанные.
+            ttl: Время жизни записи в секундах (None — без ограничения).
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+        logger.info(f"LLM cache opened: {path}")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Возвращает сохранённый ответ или None, если его нет или он устарел.
+
+        Args:
+            key: Ключ кэша.
+
+        Returns:
+            Текст ответа или None.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def set(self, key: str, response: str) -> None:
+        """
+        Сохраняет ответ и при необходимости вытесняет старые записи.
+
+        Args:
+            key: Ключ кэша.
+            response: Текст ответа.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """
+        Удаляет просроченные записи и самые давно не читанные сверх max_entries.
+        """
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            logger.debug(f"Evicted {count - self.max_entries} entries from LLM cache")
+
+    def clear(self) -> None:
+        """
+        Удаляет все записи кэша.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Закрывает соединение с базой.
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,231 @@
+import math
+import time
+import heapq
+import itertools
+import threading
+import logging
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+from config.model_loader import llm_invoke
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_WORKERS = 2
+SCHEDULER_MAX_QUEUE = 64
+# Сколько последних ожиданий в очереди хранить для перцентилей
+WAIT_TIMES_WINDOW = 1000
+
+class QueueFullError(RuntimeError):
+    """Очередь переполнена, запрос отклонён (load shedding)."""
+
+class DeadlineExceededError(TimeoutError):
+    """Дедлайн запроса истёк до начала генерации."""
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Вычисляет перцентиль методом ближайшего ранга.
+
+    Args:
+        values: Значения.
+        q: Перцентиль от 0 до 100.
+
+    Returns:
+        Значение перцентиля (0.0 для пустого списка).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+class LLMScheduler:
+    def __init__(self, model: Any, workers: int = SCHEDULER_WORKERS, max_queue: int = SCHEDULER_MAX_QUEUE,
+                 invoke: Callable[..., Any] = llm_invoke):
+        """
+        Инициализирует планировщик запросов к LLM с ограниченным параллелизмом.
+
+        Одновременно выполняется не больше workers генераций, остальные запросы ждут
+        в очереди с приоритетами. Когда в очереди max_queue запросов, новые сразу
+        отклоняются, а запросы с истёкшим дедлайном снимаются без обращения к Ollama.
+
+        Args:
+            model: Модель, передаваемая в invoke (например, из build_model).
+            workers: Число одновременных генераций.
+            max_queue: Максимальная длина очереди ожидания.
+            invoke: Функция генерации invoke(model, request_str, **kwargs).
+        """
+        self.model = model
+        self.workers = workers
+        self.max_queue = max_queue
+        self.invoke_fn = invoke
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._active = 0
+        self._wait_times = deque(maxlen=WAIT_TIMES_WINDOW)
+        self._counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'expired': 0}
+        self._max_depth = 0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"llm-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"LLMScheduler started with {workers} workers, queue size {max_queue}")
+
+    def submit(self, request_str: str, priority: int = 0, deadline: Optional[float] = None, **kwargs) -> Future:
+        """
+        Ставит запрос в очередь.
+
+        Args:
+            request_str: Текст запроса к LLM.
+            priority: Приоритет (меньше — раньше).
+            deadline: Сколько секунд запрос может ждать начала генерации (None — без ограничения).
+            **kwargs: Дополнительные аргументы для invoke (например, cache).
+
+        Returns:
+            Future с ответом модели.
+
+        Raises:
+            QueueFullError: Если очередь заполнена (запросы с истёкшим дедлайном не считаются).
+        """
+        future = Future()
+        now = time.monotonic()
+        expires_at = now + deadline if deadline is not None else None
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("LLMScheduler is shut down")
+            if len(self._heap) >= self.max_queue:
+                self._purge_expired(now)
+            if len(self._heap) >= self.max_queue:
+                self._counters['rejected'] += 1
+                logger.warning(f"LLM queue is full ({self.max_queue}), request rejected")
+                raise QueueFullError(f"LLM queue is full ({self.max_queue})")
+            heapq.heappush(self._heap, (priority, next(self._seq), now, expires_at, future, request_str, kwargs))
+            self._counters['submitted'] += 1
+            self._max_depth = max(self._max_depth, len(self._heap))
+            self._cond.notify()
+        return future
+
+    def invoke(self, request_str: str, priority: int = 0, deadline: Optional[float] = None, **kwargs) -> Any:
+        """
+        Ставит запрос в очередь и ждёт ответа.
+
+        Args:
+            request_str: Текст запроса к LLM.
+            priority: Приоритет (меньше — раньше).
+            deadline: Сколько секунд ждать ответа; столько же запрос может ждать начала генерации.
+            **kwargs: Дополнительные аргументы для invoke.
+
+        Returns:
+            Ответ модели.
+
+        Raises:
+            DeadlineExceededError: Если ответ не получен за deadline секунд от постановки
+                в очередь (генерация, уже начатая моделью, не прерывается).
+        """
+        future = self.submit(request_str, priority=priority, deadline=deadline, **kwargs)
+        try:
+            return future.result(timeout=deadline)
+        except FutureTimeoutError:
+            future.cancel()
+            raise DeadlineExceededError(f"No answer within the {deadline} s deadline")
+
+    def _purge_expired(self, now: float) -> None:
+        """
+        Снимает из очереди запросы с истёкшим дедлайном (вызывается под self._cond).
+        """
+        alive = []
+        for item in self._heap:
+            expires_at, future = item[3], item[4]
+            if expires_at is not None and now > expires_at:
+                self._counters['expired'] += 1
+                self._wait_times.append(now - item[2])
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(DeadlineExceededError("Deadline exceeded while queued"))
+            else:
+                alive.append(item)
+        if len(alive) != len(self._heap):
+            heapq.heapify(alive)
+            self._heap = alive
+
+    def _worker(self) -> None:
+        """
+        Цикл рабочего потока: берёт запрос с наивысшим приоритетом и выполняет его.
+        """
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, _, enqueued_at, expires_at, future, request_str, kwargs = heapq.heappop(self._heap)
+                now = time.monotonic()
+                self._wait_times.append(now - enqueued_at)
+                if expires_at is not None and now > expires_at:
+                    self._counters['expired'] += 1
+                    # Вызывающий мог уже отменить запрос (invoke по дедлайну)
+                    if future.set_running_or_notify_cancel():
+                        future.set_exception(DeadlineExceededError("Deadline exceeded while queued"))
+                    continue
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._active += 1
+
+            try:
+                result = self.invoke_fn(self.model, request_str, **kwargs)
+                future.set_result(result)
+                counter = 'completed'
+            except Exception as e:
+                logger.error(f"LLM request failed: {e}")
+                future.set_exception(e)
+                counter = 'failed'
+            with self._cond:
+                self._active -= 1
+                self._counters[counter] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики очереди.
+
+        Returns:
+            Словарь с текущей и максимальной глубиной очереди, числом активных генераций,
+            счётчиками запросов и перцентилями времени ожидания в очереди (секунды).
+        """
+        with self._cond:
+            waits = list(self._wait_times)
+            res = {
+                'queue_depth': len(self._heap),
+                'max_queue_depth': self._max_depth,
+                'active': self._active,
+                **self._counters,
+            }
+        res.update({
+            'wait_p50': percentile(waits, 50),
+            'wait_p95': percentile(waits, 95),
+            'wait_p99': percentile(waits, 99),
+        })
+        return res
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False) -> None:
+        """
+        Останавливает планировщик.
+
+        Args:
+            wait: Ждать ли завершения рабочих потоков.
+            cancel_pending: Отменить ли запросы, ещё не взятые в работу.
+        """
+        with self._cond:
+            self._closed = True
+            if cancel_pending:
+                for item in self._heap:
+                    item[4].cancel()
+                self._heap.clear()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        logger.info("LLMScheduler stopped")
@@ -0,0 +1,315 @@
+import json
+import time
+import random
+import pickle
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence
+
+from config import metrics
+from config.llm_scheduler import percentile
+from config.prompt_builder import build_prompt
+
+logger = logging.getLogger(__name__)
+
+# Задержка ответа LLM по умолчанию (медиана time_prompt в log.pickle), секунды
+MOCK_LLM_LATENCY = 20.0
+# Сколько запросов одновременно обслуживает один сервер Ollama
+MOCK_LLM_SLOTS = 1
+# Уровень считается насыщенным, если пропускная способность ниже доли от подаваемой нагрузки
+SATURATION_THROUGHPUT_RATIO = 0.9
+# ... или если прирост пропускной способности при росте числа пользователей меньше этой доли
+SATURATION_GAIN = 0.1
+STAGES = ('retrieval', 'prompt', 'queue', 'llm', 'total')
+
+def load_sessions(path: str, requests: Optional[List[List[str]]] = None) -> List[List[Dict[str, Any]]]:
+    """
+    Загружает поток запросов для воспроизведения.
+
+    Поддерживаются JSON/JSONL со списками запросов (как requests в ai_chef_chat.ipynb:
+    список диалогов, каждый — список вопросов, или плоский список вопросов) и журнал
+    log.pickle. В журнале нет текста вопросов, поэтому к нему передаётся requests,
+    а из журнала берутся записанные задержки LLM (time_prompt).
+
+    Args:
+        path: Путь к файлу.
+        requests: Список диалогов, по индексу совпадающий с журналом.
+
+    Returns:
+        Список диалогов; каждый вопрос — словарь {'query', 'llm_latency'}.
+    """
+    if path.endswith('.pickle') or path.endswith('.pkl'):
+        with open(path, 'rb') as f:
+            log = pickle.load(f)
+        if requests is None:
+            raise ValueError("requests are required to replay a log without query texts")
+        sessions = []
+        for dialog, entries in zip(requests, log):
+            sessions.append([
+                {'query': query, 'llm_latency': entry.get('time_prompt') if entry else None}
+                for query, entry in zip(dialog, list(entries) + [None] * (len(dialog) - len(entries)))
+            ])
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        if text.lstrip().startswith('['):
+            items = json.loads(text)
+        else:
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        sessions = []
+        for item in items:
+            dialog = item if isinstance(item, list) else [item]
+            sessions.append([
+                {'query': q, 'llm_latency': None} if isinstance(q, str) else
+                {'query': q['query'], 'llm_latency': q.get('llm_latency')}
+                for q in dialog
+            ])
+    logger.info(f"Loaded {len(sessions)} sessions, {sum(len(s) for s in sessions)} queries from {path}")
+    return sessions
+
+class MockLLM:
+    def __init__(self, latency: float = MOCK_LLM_LATENCY, slots: int = MOCK_LLM_SLOTS,
+                 time_scale: float = 1.0, jitter: float = 0.1, seed: int = 0):
+        """
+        Инициализирует заглушку LLM для нагрузочного тестирования без Ollama.
+
+        Заглушка моделирует сервер с ограниченным числом одновременно обслуживаемых
+        запросов: сверх slots запросы ждут в очереди, как в Ollama с OLLAMA_NUM_PARALLEL.
+
+        Args:
+            latency: Время генерации по умолчанию, секунды.
+            slots: Число одновременно обслуживаемых запросов.
+            time_scale: Множитель задержек (например, 0.01 — ускорить прогон в 100 раз).
+            jitter: Относительный разброс задержки.
+            seed: Зерно генератора.
+        """
+        self.latency = latency
+        self.time_scale = time_scale
+        self.jitter = jitter
+        self._slots = threading.BoundedSemaphore(slots)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def invoke(self, prompt: str, latency: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Имитирует генерацию ответа.
+
+        Args:
+            prompt: Текст запроса.
+            latency: Записанная задержка этого запроса (по умолчанию self.latency).
+
+        Returns:
+            Словарь {'response', 'queue', 'llm'} со временем ожидания слота и генерации.
+        """
+        with self._rng_lock:
+            factor = 1 + self._rng.uniform(-self.jitter, self.jitter)
+        duration = (latency if latency is not None else self.latency) * factor * self.time_scale
+        start = time.perf_counter()
+        with self._slots:
+            acquired = time.perf_counter()
+            time.sleep(duration)
+        return {
+            'response': f"mock answer ({len(prompt)} chars)",
+            'queue': acquired - start,
+            'llm': time.perf_counter() - acquired,
+        }
+
+class LoadGenerator:
+    def __init__(self, project: Any, llm: MockLLM, n_recipes: int = 3):
+        """
+        Инициализирует генератор нагрузки на RecipesProject.
+
+        Каждый запрос проходит тот же путь, что и в ai_chef_chat.ipynb: поиск рецептов
+        (граф знаний + векторный поиск), сборка промпта и вызов LLM (заглушки).
+
+        Args:
+            project: RecipesProject.
+            llm: Заглушка LLM.
+            n_recipes: Сколько рецептов передавать в промпт.
+        """
+        self.project = project
+        self.llm = llm
+        self.n_recipes = n_recipes
+
+    def handle(self, item: Dict[str, Any], chat_history: str = "") -> Dict[str, float]:
+        """
+        Обрабатывает один запрос и замеряет этапы.
+
+        Args:
+            item: Словарь {'query', 'llm_latency'}.
+            chat_history: История диалога.
+
+        Returns:
+            Длительности этапов в секундах.
+        """
+        start = time.perf_counter()
+        ids = self.project.search(item['query'], n=self.n_recipes)
+        retrieved = time.perf_counter()
+        recipes = [self.project.get_recipe(id_) for id_ in ids]
+        prompt = build_prompt(
+            item['query'],
+            "\n".join(recipe.make_str_recipe() for recipe in recipes if recipe is not None),
+            chat_history
+        )
+        prompted = time.perf_counter()
+        res = self.llm.invoke(prompt, item.get('llm_latency'))
+        return {
+            'retrieval': retrieved - start,
+            'prompt': prompted - retrieved,
+            'queue': res['queue'],
+            'llm': res['llm'],
+        }
+
+    def _summarize(self, samples: List[Dict[str, float]], errors: int, elapsed: float, **params) -> Dict[str, Any]:
+        stages = {}
+        for stage in STAGES:
+            values = [s[stage] for s in samples]
+            stages[stage] = {'p50': percentile(values, 50), 'p99': percentile(values, 99)}
+        inner = metrics.snapshot()['stages']
+        for stage, value in inner.items():
+            stages.setdefault(stage, {'p50': value['p50'], 'p99': value['p99']})
+        return {
+            **params,
+            'completed': len(samples),
+            'errors': errors,
+            'elapsed': elapsed,
+            'throughput': len(samples) / elapsed if elapsed > 0 else 0.0,
+            'stages': stages,
+        }
+
+    def run_open_loop(self, queries: Sequence[Dict[str, Any]], rate: float, duration: float,
+                      seed: int = 0) -> Dict[str, Any]:
+        """
+        Открытая модель нагрузки: запросы приходят пуассоновским потоком независимо от ответов.
+
+        Задержка считается от запланированного момента прихода запроса, поэтому
+        отставание генератора не скрывает очередь (coordinated omission).
+
+        Args:
+            queries: Вопросы для воспроизведения (по кругу).
+            rate: Интенсивность, запросов в секунду.
+            duration: Длительность прогона, секунды.
+            seed: Зерно генератора интервалов.
+
+        Returns:
+            Сводка уровня нагрузки.
+        """
+        rng = random.Random(seed)
+        samples = []
+        errors = [0]
+        lock = threading.Lock()
+
+        def task(item, scheduled):
+            try:
+                res = self.handle(item)
+            except Exception as e:
+                logger.error(f"Request failed: {e}")
+                with lock:
+                    errors[0] += 1
+                return
+            res['total'] = time.perf_counter() - scheduled
+            with lock:
+                samples.append(res)
+
+        metrics.reset()
+        futures = []
+        start = time.perf_counter()
+        # Потоков хватает на всю подаваемую нагрузку, чтобы пул не ограничивал её сам
+        with ThreadPoolExecutor(max_workers=max(4, int(rate * duration) + 1)) as pool:
+            next_at = start
+            i = 0
+            while next_at - start < duration:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(task, queries[i % len(queries)], next_at))
+                i += 1
+                next_at += rng.expovariate(rate)
+            wait(futures)
+        elapsed = time.perf_counter() - start
+        res = self._summarize(samples, errors[0], elapsed, mode='open', rate=rate, offered=i, duration=duration)
+        logger.info(f"Open loop {rate:.2f} rps: {res['throughput']:.2f} rps, "
+                    f"p99 total {res['stages']['total']['p99']:.3f} s")
+        return res
+
+    def run_closed_loop(self, sessions: Sequence[List[Dict[str, Any]]], users: int, duration: float,
+                        think_time: float = 0.0) -> Dict[str, Any]:
+        """
+        Закрытая модель нагрузки: users пользователей ведут диалоги, отправляя
+        следующий вопрос после ответа на предыдущий и паузы think_time.
+
+        Args:
+            sessions: Диалоги для воспроизведения (по кругу).
+            users: Число одновременных пользователей.
+            duration: Длительность прогона, секунды.
+            think_time: Пауза пользователя между вопросами, секунды.
+
+        Returns:
+            Сводка уровня нагрузки.
+        """
+        samples = []
+        errors = [0]
+        lock = threading.Lock()
+        start = time.perf_counter()
+        deadline = start + duration
+
+        def user(idx):
+            n = idx
+            while time.perf_counter() < deadline:
+                history = []
+                for item in sessions[n % len(sessions)]:
+                    if time.perf_counter() >= deadline:
+                        return
+                    sent = time.perf_counter()
+                    try:
+                        res = self.handle(item, "\n".join(history))
+                    except Exception as e:
+                        logger.error(f"Request failed: {e}")
+                        with lock:
+                            errors[0] += 1
+                        continue
+                    res['total'] = time.perf_counter() - sent
+                    with lock:
+                        samples.append(res)
+                    history.append(f"User: {item['query']}")
+                    if think_time:
+                        time.sleep(think_time)
+                n += users
+
+        metrics.reset()
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            wait([pool.submit(user, idx) for idx in range(users)])
+        elapsed = time.perf_counter() - start
+        res = self._summarize(samples, errors[0], elapsed, mode='closed', users=users, duration=duration)
+        logger.info(f"Closed loop {users} users: {res['throughput']:.2f} rps, "
+                    f"p99 total {res['stages']['total']['p99']:.3f} s")
+        return res
+
+def saturation_point(levels: List[Dict[str, Any]], slo: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Находит первый уровень нагрузки, на котором система насыщена.
+
+    Для открытой модели — когда пропускная способность отстаёт от подаваемой нагрузки
+    или p99 превышает slo; для закрытой — когда рост числа пользователей почти
+    не увеличивает пропускную способность или p99 превышает slo.
+
+    Args:
+        levels: Сводки уровней в порядке роста нагрузки.
+        slo: Допустимый p99 полной задержки, секунды.
+
+    Returns:
+        Сводка уровня насыщения или None, если насыщение не достигнуто.
+    """
+    prev = None
+    for level in levels:
+        p99 = level['stages']['total']['p99']
+        if slo is not None and p99 > slo:
+            return level
+        if level['mode'] == 'open':
+            if level['throughput'] < level['offered'] / level['duration'] * SATURATION_THROUGHPUT_RATIO:
+                return level
+        elif prev is not None and level['throughput'] < prev['throughput'] * (1 + SATURATION_GAIN):
+            return level
+        prev = level
+    return None
@@ -0,0 +1,194 @@
+import os
+import time
+import bisect
+import threading
+import logging
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Включается переменной окружения RECIPES_METRICS=1 или функцией enable()
+ENABLED = os.environ.get("RECIPES_METRICS", "0") == "1"
+
+# Границы корзин гистограмм в секундах (от 0.1 мс до 2 мин, шаг ~x2)
+LATENCY_BUCKETS = [0.0001 * 2 ** i for i in range(21)]
+
+_NOOP = nullcontext()
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+class Histogram:
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        """
+        Инициализирует гистограмму с фиксированными корзинами.
+
+        Args:
+            buckets: Верхние границы корзин по возрастанию.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Добавляет наблюдение.
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Оценивает квантиль линейной интерполяцией внутри корзины.
+
+        Args:
+            q: Квантиль от 0 до 1.
+
+        Returns:
+            Оценка квантиля (0.0 для пустой гистограммы).
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+def enable() -> None:
+    """
+    Включает сбор метрик.
+    """
+    global ENABLED
+    ENABLED = True
+
+def disable() -> None:
+    """
+    Выключает сбор метрик.
+    """
+    global ENABLED
+    ENABLED = False
+
+def observe(name: str, value: float) -> None:
+    """
+    Добавляет значение в гистограмму name.
+    """
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(value)
+
+def inc(name: str, value: float = 1) -> None:
+    """
+    Увеличивает счётчик name (ничего не делает, если метрики выключены).
+    """
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+@contextmanager
+def _span(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+def span(name: str) -> Any:
+    """
+    Возвращает контекстный менеджер, замеряющий длительность этапа name.
+
+    Когда метрики выключены, возвращается общий пустой контекст без замеров.
+
+    Args:
+        name: Имя этапа (например, 'query_graph').
+    """
+    if not ENABLED:
+        return _NOOP
+    return _span(name)
+
+def timed(name: str) -> Callable:
+    """
+    Декоратор, замеряющий длительность каждого вызова функции как этап name.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def snapshot() -> Dict[str, Any]:
+    """
+    Возвращает снимок метрик для выдачи в JSON.
+
+    Returns:
+        Словарь {'stages': {этап: count, sum, p50, p95, p99, max}, 'counters': {...}}.
+    """
+    with _lock:
+        stages = {
+            name: {
+                'count': h.count,
+                'sum': h.sum,
+                'p50': h.quantile(0.5),
+                'p95': h.quantile(0.95),
+                'p99': h.quantile(0.99),
+                'max': h.max,
+            }
+            for name, h in _histograms.items()
+        }
+        counters = dict(_counters)
+    return {'stages': stages, 'counters': counters}
+
+def prometheus_text(prefix: str = "recipes") -> str:
+    """
+    Возвращает метрики в текстовом формате Prometheus.
+
+    Args:
+        prefix: Префикс имён метрик.
+
+    Returns:
+        Текст для эндпоинта /metrics.
+    """
+    lines = [
+        f"# HELP {prefix}_stage_seconds Stage latency in seconds",
+        f"# TYPE {prefix}_stage_seconds histogram",
+    ]
+    with _lock:
+        for name, h in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(h.buckets, h.counts):
+                cumulative += bucket_count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {h.sum}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {h.count}')
+        if _counters:
+            lines.append(f"# TYPE {prefix}_events_total counter")
+        for name, value in sorted(_counters.items()):
+            lines.append(f'{prefix}_events_total{{name="{name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def reset() -> None:
+    """
+    Очищает все гистограммы и счётчики.
+    """
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -1,18 +1,30 @@
+import time
+import logging
 from langchain_ollama import OllamaLLM
 from langchain_core.prompts import ChatPromptTemplate
+from config.llm_cache import LLMCache, make_cache_key, generation_settings
+from config.metrics import span, inc
+
+logger = logging.getLogger(__name__)
 
 MODEL_NAME = "mistral"  # Change to "phi3" or "gemma:2b" if needed
 
+# Sampling options shared by every Ollama call
+GENERATION_OPTIONS = {
+    "repeat_last_n": 0,
+    "top_k": 40,
+    "top_p": 0.6,
+    "temperature": 0.5,
+}
+
 # Initialize Ollama LLM
 
-def build_model(model=MODEL_NAME):
+def build_model(model=MODEL_NAME, base_url=None):
     llm = OllamaLLM(
-        model=MODEL_NAME,
+        model=model,
+        base_url=base_url,  # None means the default local Ollama server
         keep_alive=-1,
-        repeat_last_n=0,
-        top_k=40,
-        top_p=0.6,
-        temperature=0.5,
+        **GENERATION_OPTIONS,
         # format="json",
     )
     return llm
@@ -23,19 +35,82 @@ SYSTEM_PROMPT = """Ты — кулинарный помощник, которы
             "Опиши рецепт кратко: укажи название, основные ингредиенты и способ приготовления. "
             "Отвечай только на русском языке."""
 
-def llm_invoke(model, request_str):
-    
-    # Create a properly formatted prompt
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", SYSTEM_PROMPT),
-        ("human", request_str)
-    ])
-    
+# Compiled once: the static system prompt always comes first, the request is
+# passed as a variable so braces in it are not treated as template fields
+CHAT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT),
+    ("human", "{request}")
+])
+
+def build_messages(request_str):
     # Format the final prompt before passing it to `llm.invoke()`
-    formatted_prompt = prompt.format_messages()
+    return CHAT_PROMPT.format_messages(request=request_str)
+
+def llm_invoke(model, request_str, cache: LLMCache = None, bypass_cache=False):
+    """
+    Sends the request to the LLM with the system prompt.
+
+    If `cache` is given, the answer is looked up by a hash of the generation
+    settings and the fully formatted messages; `bypass_cache=True` forces a new
+    generation (the fresh answer still replaces the cached one).
+    """
+    formatted_prompt = build_messages(request_str)
     
+    key = None
+    if cache is not None:
+        key = make_cache_key(generation_settings(model), formatted_prompt)
+        if not bypass_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                inc('llm_cache_hits')
+                return cached
+
     # Get response from LLM
-    response = model.invoke(formatted_prompt)
+    with span('llm'):
+        response = model.invoke(formatted_prompt)
+    if cache is not None:
+        cache.set(key, response)
     
     # Print the response
-    return response 
+    return response
+
+def llm_stream(model, request_str, cancel_event=None, metrics=None):
+    """
+    Streams the answer chunk by chunk as Ollama produces it.
+
+    Generation stops when `cancel_event` (a threading.Event) is set or when the
+    caller closes the generator. If a `metrics` dict is passed it is filled with
+    time_to_first_token, tokens (streamed chunks, one token each for Ollama),
+    tokens_per_sec, total_latency (seconds) and cancelled.
+    """
+    formatted_prompt = build_messages(request_str)
+    if metrics is None:
+        metrics = {}
+    metrics.update(time_to_first_token=None, tokens=0, tokens_per_sec=0.0,
+                   total_latency=None, cancelled=False)
+
+    start = time.perf_counter()
+    stream = model.stream(formatted_prompt)
+    try:
+        for chunk in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                metrics["cancelled"] = True
+                break
+            # The final "done" message from Ollama carries no text
+            if not chunk:
+                continue
+            if metrics["time_to_first_token"] is None:
+                metrics["time_to_first_token"] = time.perf_counter() - start
+            metrics["tokens"] += 1
+            yield chunk
+    except GeneratorExit:
+        metrics["cancelled"] = True
+        raise
+    finally:
+        # Closing the stream drops the HTTP connection, so Ollama stops generating
+        stream.close()
+        metrics["total_latency"] = time.perf_counter() - start
+        generation_time = metrics["total_latency"] - (metrics["time_to_first_token"] or 0.0)
+        if metrics["tokens"] > 1 and generation_time > 0:
+            metrics["tokens_per_sec"] = (metrics["tokens"] - 1) / generation_time
+        logger.debug(f"Stream finished: {metrics}")
@@ -0,0 +1,190 @@
+import time
+import threading
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from config.model_loader import build_model, llm_invoke
+from config.llm_scheduler import percentile
+
+logger = logging.getLogger(__name__)
+
+# Модели от маленькой к большой
+ROUTER_MODELS = ("gemma:2b", "phi3", "mistral")
+# Бюджеты задержки (секунды, p95) по умолчанию
+ROUTER_LATENCY_BUDGET = {"gemma:2b": 10.0, "phi3": 20.0, "mistral": 60.0}
+LATENCY_WINDOW = 50
+# Каждый N-й запрос к модели вне бюджета всё равно отправляется ей, чтобы обновить статистику
+PROBE_EVERY = 20
+# Порог простого запроса для complexity_policy
+SIMPLE_MAX_CHARS = 400
+SIMPLE_MAX_RECIPES = 1
+# Маркер рецепта в промпте: заголовок списка ингредиентов из Recipe.make_str_recipe
+RECIPE_MARKER = "Ингридиенты\n"
+
+def complexity_policy(request_str: str, models: Sequence[str], max_chars: int = SIMPLE_MAX_CHARS,
+                      max_recipes: int = SIMPLE_MAX_RECIPES) -> str:
+    """
+    Выбирает модель по сложности запроса.
+
+    Короткие запросы без рецептов (или с одним рецептом) идут в самую маленькую
+    модель, длинные промпты с несколькими рецептами — в самую большую.
+
+    Args:
+        request_str: Текст запроса к LLM.
+        models: Имена моделей от маленькой к большой.
+        max_chars: Максимальная длина простого запроса.
+        max_recipes: Максимальное число рецептов в простом запросе.
+
+    Returns:
+        Имя выбранной модели.
+    """
+    n_recipes = request_str.count(RECIPE_MARKER)
+    if len(request_str) <= max_chars and n_recipes <= max_recipes:
+        return models[0]
+    return models[-1]
+
+class ModelRouter:
+    def __init__(self, models: Dict[str, Any], latency_budget: Optional[Dict[str, float]] = None,
+                 policy: Callable[[str, Sequence[str]], str] = complexity_policy,
+                 window: int = LATENCY_WINDOW, invoke: Callable[..., Any] = llm_invoke):
+        """
+        Инициализирует маршрутизатор запросов между несколькими моделями Ollama.
+
+        Args:
+            models: Словарь {имя: модель}, упорядоченный от маленькой модели к большой.
+            latency_budget: Бюджет задержки p95 в секундах для каждой модели.
+            policy: Функция policy(request_str, names) -> имя модели.
+            window: Сколько последних задержек хранить на модель.
+            invoke: Функция генерации invoke(model, request_str, **kwargs).
+        """
+        if not models:
+            logger.error("ModelRouter needs at least one model")
+            raise ValueError("ModelRouter needs at least one model")
+        self.models = models
+        self.names = list(models.keys())
+        self.latency_budget = latency_budget if latency_budget is not None else {}
+        self.policy = policy
+        self.invoke_fn = invoke
+        self._latencies = {name: deque(maxlen=window) for name in self.names}
+        self._counts = {name: 0 for name in self.names}
+        self._skipped = {name: 0 for name in self.names}
+        self._lock = threading.Lock()
+        logger.info(f"ModelRouter initialized with models: {self.names}")
+
+    def p95(self, name: str) -> float:
+        """
+        Возвращает скользящий p95 задержки модели.
+
+        Args:
+            name: Имя модели.
+
+        Returns:
+            p95 в секундах (0.0, если вызовов ещё не было).
+        """
+        with self._lock:
+            return percentile(list(self._latencies[name]), 95)
+
+    def within_budget(self, name: str) -> bool:
+        """
+        Проверяет, укладывается ли модель в свой бюджет задержки.
+        """
+        budget = self.latency_budget.get(name)
+        return budget is None or self.p95(name) <= budget
+
+    def candidates(self, request_str: str) -> List[str]:
+        """
+        Возвращает порядок моделей для запроса: выбранная политикой, затем запасные.
+
+        Модели, превысившие бюджет задержки, переносятся в конец списка; запасные
+        упорядочены по близости к выбранной модели. Каждый PROBE_EVERY-й запрос
+        к модели вне бюджета всё же отправляется ей, чтобы она могла вернуться в бюджет.
+
+        Args:
+            request_str: Текст запроса к LLM.
+
+        Returns:
+            Список имён моделей.
+        """
+        chosen = self.policy(request_str, self.names)
+        idx = self.names.index(chosen)
+        order = sorted(self.names, key=lambda name: abs(self.names.index(name) - idx))
+        fast = [name for name in order if self.within_budget(name)]
+        slow = sorted((name for name in order if name not in fast), key=self.p95)
+        if chosen not in fast:
+            with self._lock:
+                self._skipped[chosen] += 1
+                probe = self._skipped[chosen] >= PROBE_EVERY
+                if probe:
+                    self._skipped[chosen] = 0
+            if probe:
+                return [chosen] + [name for name in fast + slow if name != chosen]
+            logger.info(f"Model {chosen} is over its latency budget (p95={self.p95(chosen):.2f}s)")
+        return fast + slow
+
+    def invoke(self, request_str: str, **kwargs) -> Any:
+        """
+        Отправляет запрос подходящей модели, при ошибке — следующей по списку.
+
+        Args:
+            request_str: Текст запроса к LLM.
+            **kwargs: Дополнительные аргументы для invoke (например, cache).
+
+        Returns:
+            Ответ модели.
+        """
+        last_error = None
+        for name in self.candidates(request_str):
+            start = time.perf_counter()
+            try:
+                response = self.invoke_fn(self.models[name], request_str, **kwargs)
+            except Exception as e:
+                logger.error(f"Model {name} failed: {e}")
+                last_error = e
+                continue
+            latency = time.perf_counter() - start
+            with self._lock:
+                self._latencies[name].append(latency)
+                self._counts[name] += 1
+            logger.debug(f"Routed request to {name} ({latency:.2f}s)")
+            return response
+        raise last_error
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Возвращает статистику по моделям.
+
+        Returns:
+            Словарь {имя: {'requests', 'p50', 'p95', 'budget'}}.
+        """
+        with self._lock:
+            snapshot = {name: list(values) for name, values in self._latencies.items()}
+            counts = dict(self._counts)
+        return {
+            name: {
+                'requests': counts[name],
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'budget': self.latency_budget.get(name),
+            }
+            for name, values in snapshot.items()
+        }
+
+def build_router(model_names: Sequence[str] = ROUTER_MODELS, latency_budget: Optional[Dict[str, float]] = None,
+                 base_url: Optional[str] = None, **kwargs) -> ModelRouter:
+    """
+    Создаёт маршрутизатор с моделями Ollama.
+
+    Args:
+        model_names: Имена моделей от маленькой к большой.
+        latency_budget: Бюджеты задержки (по умолчанию ROUTER_LATENCY_BUDGET).
+        base_url: Адрес сервера Ollama.
+        **kwargs: Дополнительные аргументы ModelRouter.
+
+    Returns:
+        Объект ModelRouter.
+    """
+    models = {name: build_model(name, base_url=base_url) for name in model_names}
+    if latency_budget is None:
+        latency_budget = ROUTER_LATENCY_BUDGET
+    return ModelRouter(models, latency_budget=latency_budget, **kwargs)
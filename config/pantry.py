@@ -0,0 +1,220 @@
+import re
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from config.tag_vocab import VOCAB, TagTable, tag_ids
+
+logger = logging.getLogger(__name__)
+
+# Запросы вида «что приготовить из картошки и сыра», «у меня есть курица и рис»
+PANTRY_RE = re.compile(
+    r'(?:приготовить|сделать|испечь|сварить|пожарить|запечь)\s+из\b'
+    r'|у меня (?:есть|осталось|остались|остался|осталась)'
+    r'|из того,? что есть|в холодильнике'
+)
+# Считаются имеющимися у любого пользователя
+PANTRY_STAPLES = ('соль', 'вода', 'сахар', 'перец черный молотый', 'масло растительное')
+# Леммы разговорных названий -> леммы, под которыми ингредиент встречается в рецептах
+PANTRY_SYNONYMS = {
+    'картошка': ('картофель',),
+    'картофелина': ('картофель',),
+    'помидор': ('томат',),
+    'томат': ('помидор',),
+    'курочка': ('курица',),
+    'яичко': ('яйцо',),
+    'макарошка': ('макароны',),
+}
+PANTRY_TOP_K = 3
+
+def popcount(bits: np.ndarray) -> np.ndarray:
+    """
+    Число единичных битов в каждой строке матрицы uint64.
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bits).sum(axis=-1, dtype=np.int64)
+    table = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    return table[bits.view(np.uint8)].reshape(*bits.shape[:-1], -1).sum(axis=-1, dtype=np.int64)
+
+class PantryIndex:
+    def __init__(self, recipes: Sequence[Any], tags: Any, lemmatize_fn: Callable[[str], List[str]]):
+        """
+        Строит битовый индекс ингредиентов рецептов для поиска «что приготовить из того, что есть».
+
+        Столбец индекса — группа лемм ингредиента из таблицы тегов (как узел тега графа),
+        строка — битовая маска ингредиентов рецепта в словах uint64. Ингредиенты, не
+        попавшие в таблицу тегов (редкие), учитываются только в числе недостающих.
+
+        Args:
+            recipes: Список объектов Recipe.
+            tags: Таблица тегов TagTable (или словарь тегов старого формата).
+            lemmatize_fn: Лемматизатор (тот же, что для тегов).
+        """
+        if not isinstance(tags, TagTable):
+            tags = TagTable.from_dict(tags)
+        self.recipes = recipes
+        self.tags = tags
+        self.lemmatize_fn = lemmatize_fn
+        self.rows = {recipe.id: n for n, recipe in enumerate(recipes)}
+
+        self.columns = {}       # группа лемм -> столбец
+        self.word_index = {}    # слово леммы ингредиента -> столбцы
+        rows, cols = [], []
+        rare = np.zeros(len(recipes), dtype=np.int64)
+        for n, recipe in enumerate(recipes):
+            ids = tag_ids(recipe, 'ingridients')
+            if ids is None:
+                continue
+            seen = set()
+            rare_ids = set()
+            for tag_id in ids:
+                group = tags.group.get(VOCAB.lowered(tag_id))
+                if group is None:
+                    rare_ids.add(tag_id)
+                    continue
+                col = self.columns.get(group)
+                if col is None:
+                    col = self.columns[group] = len(self.columns)
+                    for word in set(tags.groups[group]):
+                        self.word_index.setdefault(word, []).append(col)
+                if col not in seen:
+                    seen.add(col)
+                    rows.append(n)
+                    cols.append(col)
+            rare[n] = len(rare_ids)
+
+        self.column_groups = [0] * len(self.columns)
+        for group, col in self.columns.items():
+            self.column_groups[col] = group
+        self.n_words = max(1, (len(self.columns) + 63) // 64)
+        self.bits = np.zeros((len(recipes), self.n_words), dtype=np.uint64)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        np.bitwise_or.at(self.bits, (rows, cols >> 6), np.left_shift(np.uint64(1), (cols & 63).astype(np.uint64)))
+        self.total = popcount(self.bits) + rare
+        self.staples = self.mask(PANTRY_STAPLES)
+        logger.info(f"PantryIndex built: {len(recipes)} recipes, {len(self.columns)} ingredients, "
+                    f"{self.bits.nbytes / 2 ** 20:.1f} MB")
+
+    def _lemmas(self, text: str) -> List[str]:
+        return [word for word in self.lemmatize_fn(text) if word]
+
+    def _columns(self, item: str) -> set:
+        """
+        Столбцы ингредиентов, подходящих продукту: все слова его леммы (или синонима) есть в лемме ингредиента.
+        """
+        words = self._lemmas(item)
+        if not words:
+            return set()
+        res = set()
+        for first in (words[0],) + PANTRY_SYNONYMS.get(words[0], ()):
+            variant = [first] + words[1:]
+            for col in self.word_index.get(first, ()):
+                if set(self.tags.groups[self.column_groups[col]]).issuperset(variant):
+                    res.add(col)
+        return res
+
+    def mask(self, items: Iterable[str]) -> np.ndarray:
+        """
+        Битовая маска ингредиентов, подходящих хотя бы одному из продуктов.
+        """
+        res = np.zeros(self.n_words, dtype=np.uint64)
+        for item in items:
+            for col in self._columns(item):
+                res[col >> 6] |= np.uint64(1) << np.uint64(col & 63)
+        return res
+
+    def items_from_query(self, query: str) -> List[str]:
+        """
+        Извлекает из запроса продукты: леммы, которые встречаются в названиях ингредиентов.
+
+        Args:
+            query: Текстовый запрос («Что можно приготовить из картошки и сыра?»).
+
+        Returns:
+            Список продуктов (лемм) в порядке упоминания.
+        """
+        res = []
+        for word in self._lemmas(query):
+            variants = (word,) + PANTRY_SYNONYMS.get(word, ())
+            if word not in res and any(variant in self.word_index for variant in variants):
+                res.append(word)
+        return res
+
+    def search(self, items: Sequence[str], n: int = PANTRY_TOP_K, candidates: Optional[Iterable[str]] = None,
+               staples: bool = True, min_used: int = 1) -> List[Dict[str, Any]]:
+        """
+        Ранжирует рецепты по покрытию ингредиентов продуктами пользователя.
+
+        Порядок: меньше недостающих ингредиентов, затем больше использованных
+        продуктов пользователя, затем большая доля покрытых ингредиентов.
+        Все рецепты считаются сразу операциями над битовой матрицей.
+
+        Args:
+            items: Продукты пользователя.
+            n: Количество рецептов.
+            candidates: Идентификаторы рецептов, среди которых искать (например, после ограничений запроса).
+            staples: Считать ли имеющимися соль, воду, сахар, перец и растительное масло.
+            min_used: Сколько продуктов пользователя рецепт должен использовать.
+
+        Returns:
+            Список {'id', 'covered', 'missing', 'total', 'used', 'missing_ingridients'}.
+        """
+        item_masks = [self.mask([item]) for item in items]
+        item_masks = [m for m in item_masks if m.any()]
+        if not item_masks:
+            return []
+        have = np.bitwise_or.reduce(item_masks + ([self.staples] if staples else []))
+        covered = popcount(self.bits & have)
+        missing = self.total - covered
+        used = np.zeros(len(self.recipes), dtype=np.int64)
+        for item_mask in item_masks:
+            used += (self.bits & item_mask).any(axis=1)
+
+        selected = used >= min_used
+        if candidates is not None:
+            allowed = np.zeros(len(self.recipes), dtype=bool)
+            allowed[[self.rows[id_] for id_ in candidates if id_ in self.rows]] = True
+            selected &= allowed
+        rows = np.flatnonzero(selected)
+        if len(rows) == 0:
+            return []
+
+        # Составной ключ сортировки: недостающие, затем -использованные, затем -доля покрытия (в тысячных),
+        # затем позиция в каталоге — ключи различны, и top-k не зависит от выбора argpartition среди равных
+        coverage = np.round(1000 * covered[rows] / np.maximum(self.total[rows], 1)).astype(np.int64)
+        key = ((missing[rows] * (len(items) + 1) - used[rows]) * 1001 - coverage) * len(self.recipes) + rows
+        k = min(n, len(rows))
+        idx = np.argpartition(key, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = rows[idx[np.argsort(key[idx])]]
+
+        res = []
+        for row in top:
+            recipe = self.recipes[row]
+            res.append({
+                'id': recipe.id,
+                'covered': int(covered[row]),
+                'missing': int(missing[row]),
+                'total': int(self.total[row]),
+                'used': int(used[row]),
+                'missing_ingridients': self.missing_ingridients(row, have),
+            })
+        return res
+
+    def missing_ingridients(self, row: int, have: np.ndarray) -> List[str]:
+        """
+        Названия ингредиентов рецепта, которых нет среди продуктов пользователя.
+        """
+        ids = tag_ids(self.recipes[row], 'ingridients')
+        if ids is None:
+            return []
+        res = []
+        for tag_id in ids:
+            group = self.tags.group.get(VOCAB.lowered(tag_id))
+            col = self.columns.get(group) if group is not None else None
+            if col is None or not int(have[col >> 6]) >> (col & 63) & 1:
+                name = VOCAB[tag_id]
+                if name not in res:
+                    res.append(name)
+        return res
@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import hashlib
+import inspect
+import importlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from config.helpers import read_pkl, save_pkl
+
+logger = logging.getLogger(__name__)
+
+DAG_CACHE_DIR = "./.pipeline_cache"
+DAG_WORKERS = 4
+
+def file_fingerprint(paths: Iterable[str]) -> Dict[str, Any]:
+    """
+    Отпечаток входных файлов (размер и время изменения) для параметров этапа.
+    """
+    res = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+            res[path] = [st.st_size, st.st_mtime_ns]
+        except OSError:
+            res[path] = None
+    return res
+
+def artifact_stamp(path: str) -> str:
+    """
+    Путь к файлу-отметке рядом с артефактом: в нём записан отпечаток этапа, создавшего артефакт.
+    """
+    return f"{path.rstrip(os.sep)}.stage"
+
+def read_artifact_stamp(path: str) -> Optional[str]:
+    """
+    Отпечаток этапа, создавшего артефакт, или None, если отметки нет.
+    """
+    try:
+        with open(artifact_stamp(path), 'r', encoding='utf-8') as f:
+            return json.load(f).get('fingerprint')
+    except (OSError, ValueError):
+        return None
+
+def write_artifact_stamp(path: str, stage: str, fingerprint: str) -> None:
+    with open(artifact_stamp(path), 'w', encoding='utf-8') as f:
+        json.dump({'stage': stage, 'fingerprint': fingerprint}, f)
+
+def _source_fingerprint(fn: Any) -> str:
+    try:
+        return inspect.getsource(fn)
+    except (OSError, TypeError):
+        return getattr(fn, '__qualname__', repr(fn))
+
+def code_fingerprint(code: Iterable[Any]) -> Dict[str, str]:
+    """
+    Хэши исходного кода модулей и функций, от которых зависит результат этапа.
+
+    Args:
+        code: Модули, их имена ('config.food_graph') или функции.
+
+    Returns:
+        Словарь {имя: sha256 исходного кода}.
+    """
+    res = {}
+    for obj in code:
+        if isinstance(obj, str):
+            obj = importlib.import_module(obj)
+        name = getattr(obj, '__qualname__', None) or getattr(obj, '__name__', repr(obj))
+        if not inspect.ismodule(obj):
+            name = f"{obj.__module__}.{name}"
+        res[name] = hashlib.sha256(_source_fingerprint(obj).encode('utf-8')).hexdigest()
+    return res
+
+class Stage:
+    def __init__(self, name: str, fn: Callable, inputs: Sequence[str] = (), params: Optional[Dict[str, Any]] = None,
+                 version: str = "1", artifacts: Sequence[str] = (), dump: Optional[Callable] = None,
+                 load: Optional[Callable] = None, code: Sequence[Any] = ()):
+        """
+        Описывает этап пайплайна.
+
+        Этап вызывается как fn(*выходы_inputs, **params). Его отпечаток складывается из
+        имени, версии, исходного кода fn и модулей из code, параметров и отпечатков
+        входных этапов, поэтому изменение параметра или кода, выполняющего этап,
+        инвалидирует только этот этап и зависящие от него.
+
+        Args:
+            name: Имя этапа.
+            fn: Функция этапа.
+            inputs: Имена этапов, выходы которых передаются в fn.
+            params: Параметры (должны сериализоваться в JSON).
+            version: Версия этапа; её нужно увеличить, если поменялась логика вне fn и code
+                (например, в модуле, который не указан в code).
+            artifacts: Файлы и папки, которые этап создаёт сам; кэш действителен, только пока они есть
+                и созданы этапом с тем же отпечатком (см. artifact_stamp).
+            dump: Сохранение выхода dump(value, path) (по умолчанию pickle).
+            load: Загрузка выхода load(path) (по умолчанию pickle).
+            code: Модули (или их имена) и функции, которые выполняют работу этапа; их исходный
+                код входит в отпечаток, так что правка, например, build_knowledge_graph
+                перезапускает этап вместо использования устаревшего кэша.
+        """
+        self.name = name
+        self.fn = fn
+        self.inputs = list(inputs)
+        self.params = params or {}
+        self.version = version
+        self.artifacts = list(artifacts)
+        self.dump = dump or save_pkl
+        self.load = load or read_pkl
+        self.code = list(code)
+
+class PipelineDAG:
+    def __init__(self, cache_dir: str = DAG_CACHE_DIR, workers: int = DAG_WORKERS,
+                 wrap: Optional[Callable[[str], Any]] = None):
+        """
+        Инициализирует DAG этапов с кэшированием выходов по отпечаткам.
+
+        Args:
+            cache_dir: Папка кэша выходов этапов.
+            workers: Сколько этапов выполнять одновременно.
+            wrap: Фабрика контекстного менеджера вокруг этапа (например, профилирование).
+        """
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.wrap = wrap
+        self.stages = {}
+
+    def add(self, stage: Stage) -> Stage:
+        """
+        Добавляет этап; его входы должны быть добавлены раньше.
+        """
+        if stage.name in self.stages:
+            raise ValueError(f"Stage {stage.name} is already defined")
+        for name in stage.inputs:
+            if name not in self.stages:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {name}")
+        self.stages[stage.name] = stage
+        return stage
+
+    def fingerprints(self) -> Dict[str, str]:
+        """
+        Считает отпечатки всех этапов (этапы добавлены в топологическом порядке).
+        """
+        res = {}
+        for name, stage in self.stages.items():
+            data = json.dumps({
+                'name': name,
+                'version': stage.version,
+                'source': _source_fingerprint(stage.fn),
+                'code': code_fingerprint(stage.code),
+                'params': stage.params,
+                'inputs': [res[i] for i in stage.inputs],
+            }, ensure_ascii=False, sort_keys=True, default=str)
+            res[name] = hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+        return res
+
+    def _path(self, name: str, fingerprint: str) -> str:
+        return os.path.join(self.cache_dir, name, f"{fingerprint}.pickle")
+
+    def is_cached(self, name: str, fingerprint: str) -> bool:
+        """
+        Есть ли действительный кэш выхода этапа с данным отпечатком.
+
+        Артефакты лежат по постоянным путям, поэтому их перезаписывает запуск с другими
+        параметрами; кэш действителен, только если отметка артефакта хранит этот отпечаток.
+        """
+        path = self._path(name, fingerprint)
+        if not os.path.exists(f"{path}.done"):
+            return False
+        return all(os.path.exists(a) and read_artifact_stamp(a) == fingerprint for a in self.stages[name].artifacts)
+
+    def _descendants(self, names: Iterable[str]) -> set:
+        res = set(names)
+        for name, stage in self.stages.items():
+            if res.intersection(stage.inputs):
+                res.add(name)
+        return res
+
+    def plan(self, outputs: Sequence[str] = (), force: Sequence[str] = ()) -> Dict[str, List[str]]:
+        """
+        Определяет, какие этапы выполнить, а какие выходы достать из кэша.
+
+        Args:
+            outputs: Этапы, выходы которых нужно вернуть.
+            force: Этапы, которые нужно выполнить заново (вместе с зависящими от них).
+
+        Returns:
+            {'run': [...], 'load': [...], 'fingerprints': {...}}.
+        """
+        fingerprints = self.fingerprints()
+        forced = self._descendants(force)
+        run = [name for name in self.stages if name in forced or not self.is_cached(name, fingerprints[name])]
+        needed = set(outputs)
+        for name in run:
+            needed.update(self.stages[name].inputs)
+        load = [name for name in self.stages if name in needed and name not in run]
+        return {'run': run, 'load': load, 'fingerprints': fingerprints}
+
+    def _execute(self, name: str, fingerprint: str, values: Dict[str, Any], run: bool) -> Any:
+        stage = self.stages[name]
+        path = self._path(name, fingerprint)
+        if not run:
+            logger.info(f"Stage {name}: cached ({fingerprint})")
+            return stage.load(path)
+
+        logger.info(f"Stage {name}: running ({fingerprint})")
+        start = time.perf_counter()
+        if self.wrap is not None:
+            with self.wrap(name):
+                value = stage.fn(*[values[i] for i in stage.inputs], **stage.params)
+        else:
+            value = stage.fn(*[values[i] for i in stage.inputs], **stage.params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        stage.dump(value, path)
+        for artifact in stage.artifacts:
+            write_artifact_stamp(artifact, name, fingerprint)
+        # Маркер пишется последним: прерванный этап не оставляет «готовый» кэш
+        with open(f"{path}.done", 'w') as f:
+            f.write(time.strftime('%Y-%m-%dT%H:%M:%S'))
+        logger.info(f"Stage {name}: done in {time.perf_counter() - start:.1f} s")
+        return value
+
+    def run(self, outputs: Sequence[str] = (), force: Sequence[str] = ()) -> Dict[str, Any]:
+        """
+        Выполняет устаревшие этапы; независимые этапы выполняются параллельно.
+
+        Args:
+            outputs: Этапы, выходы которых нужно вернуть.
+            force: Этапы, которые нужно выполнить заново (вместе с зависящими от них).
+
+        Returns:
+            Словарь {этап: выход} для выполненных и загруженных этапов.
+        """
+        plan = self.plan(outputs, force)
+        fingerprints = plan['fingerprints']
+        run = set(plan['run'])
+        pending = [name for name in self.stages if name in run or name in plan['load']]
+        logger.info(f"Pipeline plan: run {plan['run'] or 'nothing'}, load {plan['load'] or 'nothing'}")
+
+        values = {}
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while pending or futures:
+                for name in list(pending):
+                    deps = self.stages[name].inputs if name in run else []
+                    if all(dep in values for dep in deps):
+                        pending.remove(name)
+                        futures[pool.submit(self._execute, name, fingerprints[name], values, name in run)] = name
+                if not futures:
+                    raise RuntimeError(f"Stages {pending} cannot be scheduled")
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures.pop(future)
+                    try:
+                        values[name] = future.result()
+                    except Exception:
+                        for other in futures:
+                            other.cancel()
+                        logger.error(f"Stage {name} failed")
+                        raise
+        return values
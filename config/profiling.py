@@ -0,0 +1,143 @@
+import io
+import os
+import uuid
+import random
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import logging
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Режим профилирования: '' (выключено), 'cpu', 'memory' или 'cpu,memory'
+PROFILE_MODE = os.environ.get("RECIPES_PROFILE", "")
+# Доля профилируемых запросов (1.0 — каждый)
+PROFILE_RATE = float(os.environ.get("RECIPES_PROFILE_RATE", "1.0"))
+PROFILE_DIR = os.environ.get("RECIPES_PROFILE_DIR", "./profiles")
+TOP_N = 25
+TRACEMALLOC_FRAMES = 10
+
+# cProfile и tracemalloc глобальны для процесса, поэтому одновременно профилируется один блок
+_active = threading.Lock()
+
+def configure(mode: str = "cpu", rate: float = 1.0, directory: Optional[str] = None) -> None:
+    """
+    Включает профилирование из кода (аналог переменных окружения).
+
+    Args:
+        mode: 'cpu', 'memory', 'cpu,memory' или '' для выключения.
+        rate: Доля профилируемых запросов.
+        directory: Папка для профилей.
+    """
+    global PROFILE_MODE, PROFILE_RATE, PROFILE_DIR
+    PROFILE_MODE = mode
+    PROFILE_RATE = rate
+    if directory is not None:
+        PROFILE_DIR = directory
+
+def cpu_hotspots(path: str, top_n: int = TOP_N, sort: str = "cumulative") -> str:
+    """
+    Возвращает текстовую сводку горячих функций из файла cProfile.
+
+    Args:
+        path: Путь к файлу .prof.
+        top_n: Сколько функций показать.
+        sort: Ключ сортировки pstats.
+
+    Returns:
+        Таблица pstats.
+    """
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats(sort).print_stats(top_n)
+    return out.getvalue()
+
+def memory_hotspots(path: str, top_n: int = TOP_N) -> str:
+    """
+    Возвращает текстовую сводку мест с наибольшими выделениями памяти из снимка tracemalloc.
+
+    Args:
+        path: Путь к файлу снимка .tracemalloc.
+        top_n: Сколько мест показать.
+
+    Returns:
+        Строки вида 'файл:строка: size=..., count=...'.
+    """
+    snapshot = tracemalloc.Snapshot.load(path)
+    stats = snapshot.statistics("lineno")
+    return "\n".join(str(stat) for stat in stats[:top_n])
+
+@contextmanager
+def profile_block(name: str, request_id: Optional[str] = None) -> Iterator[Optional[str]]:
+    """
+    Профилирует блок кода, если профилирование включено и запрос попал в выборку.
+
+    Профиль CPU сохраняется в {PROFILE_DIR}/{name}-{request_id}.prof, снимок памяти —
+    в .tracemalloc; рядом пишется текстовая сводка .txt с top-N горячих мест.
+
+    Args:
+        name: Имя запроса или этапа (например, 'invoke', 'pipeline.graph').
+        request_id: Идентификатор запроса (по умолчанию генерируется).
+
+    Yields:
+        Базовый путь к файлам профиля или None, если блок не профилируется.
+    """
+    mode = PROFILE_MODE
+    if not mode or random.random() >= PROFILE_RATE or not _active.acquire(blocking=False):
+        yield None
+        return
+
+    try:
+        request_id = request_id or uuid.uuid4().hex[:12]
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, f"{name}-{request_id}")
+        cpu = 'cpu' in mode
+        memory = 'memory' in mode
+
+        profiler = cProfile.Profile() if cpu else None
+        started_tracing = memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if memory:
+            tracemalloc.reset_peak()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield base
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            summary = []
+            if memory:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+                snapshot.dump(f"{base}.tracemalloc")
+                summary.append(f"Peak traced memory: {peak / 2 ** 20:.1f} MiB\n")
+                summary.append(memory_hotspots(f"{base}.tracemalloc"))
+            if profiler is not None:
+                profiler.dump_stats(f"{base}.prof")
+                summary.append(cpu_hotspots(f"{base}.prof"))
+            with open(f"{base}.txt", "w", encoding="utf-8") as f:
+                f.write("\n\n".join(summary))
+            logger.info(f"Profile for {name} saved to {base}.*")
+    finally:
+        _active.release()
+
+def profiled(name: str) -> Callable:
+    """
+    Декоратор, профилирующий каждый вызов функции через profile_block.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not PROFILE_MODE:
+                return fn(*args, **kwargs)
+            with profile_block(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,159 @@
+import time
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from ollama import Client
+from langchain_core.prompts import PromptTemplate
+
+from config.model_loader import MODEL_NAME, SYSTEM_PROMPT, GENERATION_OPTIONS
+from config.metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Размер контекста модели в токенах; при приближении к нему сессия пересобирается
+NUM_CTX = 4096
+# Запас токенов под новый ход и ответ
+CONTEXT_RESERVE = 1024
+
+# Статичная часть промпта: одинакова для всех сессий и идёт первой,
+# чтобы её KV-кэш переиспользовался Ollama
+SESSION_HEADER = """Вы — опытный кулинарный помощник. Ваша цель — давать полезные, креативные и простые в использовании советы по приготовлению пищи.
+У вас есть доступ к большой базе рецептов, хранящейся в ChromaDB, которая позволяет вам извлекать соответствующие рецепты и предлагать
+персонализированные идеи приготовления пищи на основе предпочтений пользователя, доступных ингредиентов, диетических ограничений и стиля приготовления.
+
+Используйте историю чата, чтобы сохранять контекст и избегать повторений. Если пользователь упомянул определенные ингредиенты,
+предпочтения или антипатии ранее в разговоре, учтите это при предоставлении совета.
+
+Используйте выбранные рецепты из ChromaDB в качестве руководства для создания индивидуальных предложений. Вы можете комбинировать элементы из разных рецептов или адаптировать их на основе предпочтений пользователя.
+
+Четко форматируйте ответы, включая:
+1. **Название**: название рецепта или предложения.
+2. **Ингредиенты**: перечислите ингредиенты с количеством.
+3. **Инструкция**: пошаговый процесс.
+4. **Советы/Альтернативы**: предоставьте полезные советы или альтернативы, если определенные ингредиенты недоступны.
+
+Дайте понятный, полезный и дружелюбный ответ на запрос пользователя.
+Отвечайте на русском языке
+"""
+
+# История нужна только при пересборке сессии: в обычном ходе она уже в контексте Ollama
+HISTORY_TEMPLATE = PromptTemplate.from_template("""
+**История чата:**
+{chat_history}
+""")
+
+# Динамическая часть хода: сначала рецепты, в самом конце — запрос
+TURN_TEMPLATE = PromptTemplate.from_template("""
+---
+
+- **Выбранные рецепты из ChromaDB:**
+{retrieved_recipes}
+
+**Запрос:**
+{user_input}
+""")
+
+def build_prompt(user_input: str, retrieved_recipes: str, chat_history: str = "") -> str:
+    """
+    Собирает полный промпт в порядке от статичных секций к динамичным.
+
+    Args:
+        user_input: Запрос пользователя.
+        retrieved_recipes: Отформатированные рецепты (см. formatted_rag).
+        chat_history: Отформатированная история чата.
+
+    Returns:
+        Текст промпта.
+    """
+    res = SESSION_HEADER
+    if chat_history:
+        res += HISTORY_TEMPLATE.format(chat_history=chat_history)
+    res += TURN_TEMPLATE.format(retrieved_recipes=retrieved_recipes, user_input=user_input)
+    return res
+
+class PromptSession:
+    def __init__(self, model: str = MODEL_NAME, client: Optional[Client] = None,
+                 num_ctx: int = NUM_CTX, options: Optional[Dict[str, Any]] = None):
+        """
+        Инициализирует чат-сессию, которая хранит контекст Ollama между ходами.
+
+        Первый ход отправляет статичную шапку и первый запрос. Следующие ходы отправляют
+        только новые рецепты и запрос вместе с контекстом предыдущего ответа, поэтому
+        модель обрабатывает лишь новые токены. Когда контекст приближается к num_ctx,
+        сессия пересобирается: шапка, история чата и новый ход.
+
+        Args:
+            model: Имя модели Ollama.
+            client: Клиент Ollama (по умолчанию локальный сервер).
+            num_ctx: Размер контекста модели в токенах.
+            options: Параметры генерации (по умолчанию GENERATION_OPTIONS).
+        """
+        self.model = model
+        self.client = client if client is not None else Client()
+        self.num_ctx = num_ctx
+        self.options = dict(options if options is not None else GENERATION_OPTIONS)
+        self.options['num_ctx'] = num_ctx
+        self.context = None
+        self.history = []
+        self.turn_stats = []
+
+    def formatted_history(self) -> str:
+        """
+        Возвращает историю сессии в формате formatted_chat_history.
+        """
+        return "\n".join(f"User: {q}\nAssistant: {a}" for q, a in self.history)
+
+    def _make_prompt(self, user_input: str, retrieved_recipes: str) -> Tuple[str, bool]:
+        """
+        Возвращает текст для отправки и признак того, что контекст сброшен.
+        """
+        if self.context is not None and len(self.context) + CONTEXT_RESERVE <= self.num_ctx:
+            return TURN_TEMPLATE.format(retrieved_recipes=retrieved_recipes, user_input=user_input), False
+        if self.context is not None:
+            logger.info(f"Session context is full ({len(self.context)} tokens), rebuilding")
+        return build_prompt(user_input, retrieved_recipes, chat_history=self.formatted_history()), True
+
+    def ask(self, user_input: str, retrieved_recipes: str = "") -> str:
+        """
+        Выполняет ход диалога.
+
+        Args:
+            user_input: Запрос пользователя.
+            retrieved_recipes: Отформатированные рецепты для этого хода.
+
+        Returns:
+            Ответ модели.
+        """
+        prompt, reset = self._make_prompt(user_input, retrieved_recipes)
+        start = time.perf_counter()
+        with span('llm'):
+            response = self.client.generate(
+                model=self.model,
+                prompt=prompt,
+                system=SYSTEM_PROMPT,
+                context=None if reset else self.context,
+                options=self.options,
+                keep_alive=-1,
+            )
+        self.context = response['context']
+        answer = response['response']
+        self.history.append((user_input, answer))
+        stats = {
+            'turn': len(self.history),
+            'reset': reset,
+            'prompt_eval_tokens': response.get('prompt_eval_count') or 0,
+            'eval_tokens': response.get('eval_count') or 0,
+            'context_tokens': len(self.context or []),
+            'latency': time.perf_counter() - start,
+        }
+        self.turn_stats.append(stats)
+        logger.info(f"Session turn {stats['turn']}: {stats['prompt_eval_tokens']} prompt tokens evaluated")
+        return answer
+
+    def reset(self) -> None:
+        """
+        Очищает контекст и историю сессии.
+        """
+        self.context = None
+        self.history = []
+        self.turn_stats = []
@@ -0,0 +1,240 @@
+import re
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Поле ограничения -> атрибут Recipe
+CONSTRAINT_FIELDS = {
+    'time': 'standard_time',
+    'calories': 'calories',
+    'servings': 'recipeYield',
+    'rating': 'ratingValue',
+}
+# Слова, задающие нижнюю границу; остальные операторы задают верхнюю
+LOWER_BOUND_OPS = ('от', 'более', 'больше', 'дольше', 'свыше', 'выше', 'не менее', 'не меньше', 'не ниже', 'минимум')
+_UPPER_OPS = r'за|до|не более|не больше|не дольше|не выше|менее|меньше|быстрее|максимум|в пределах|ниже'
+_LOWER_OPS = '|'.join(LOWER_BOUND_OPS)
+_NUMBER = r'\d+(?:[.,]\d+)?'
+
+_TIME_UNIT = r'минут\w*|мин\b\.?|часов|часа|час\b|ч\b\.?'
+_CALORIES_UNIT = r'ккал|килокалори\w*|калори\w*|кал\b'
+_SERVINGS_UNIT = r'порци\w*|персон\w*|человек\w*|гост\w*'
+
+# 'от 20 до 40 минут', 'от 200 до 400 ккал', 'от 2 до 4 порций' — обе границы с общей единицей;
+# проверяется до одиночных границ, которые внутри диапазона пропускаются
+RANGE_RE = re.compile(
+    rf'\b(?:от|на)\s+(?P<lo>{_NUMBER})\s*(?:-|–|до)\s*(?P<hi>{_NUMBER})\s*'
+    rf'(?:(?P<time>{_TIME_UNIT})|(?P<calories>{_CALORIES_UNIT})|(?P<servings>{_SERVINGS_UNIT}))'
+)
+TIME_RE = re.compile(
+    rf'\b(?P<op>{_UPPER_OPS}|{_LOWER_OPS})\s+'
+    rf'(?:(?P<num>{_NUMBER})\s*(?P<unit>{_TIME_UNIT})|(?P<word>полчаса|полтора часа|часа|час)\b)'
+)
+CALORIES_RE = re.compile(
+    rf'\b(?P<op>{_UPPER_OPS}|{_LOWER_OPS})\s+(?P<num>{_NUMBER})\s*(?:{_CALORIES_UNIT})'
+)
+SERVINGS_RE = re.compile(
+    rf'\b(?P<op>на|{_LOWER_OPS})\s+(?:(?P<num>\d+)\s*(?:{_SERVINGS_UNIT})'
+    r'|(?P<word>двоих|троих|четверых|пятерых|шестерых|большую компанию)\b)'
+)
+RATING_RE = re.compile(
+    rf'\b(?:с\s+)?(?:рейтинг\w*|оценк\w*)\s+(?:(?P<op>{_UPPER_OPS}|{_LOWER_OPS})\s+)?(?P<num>\d(?:[.,]\d+)?)'
+)
+WORD_NUMBERS = {
+    'полчаса': 30, 'полтора часа': 90, 'часа': 60, 'час': 60,
+    'двоих': 2, 'троих': 3, 'четверых': 4, 'пятерых': 5, 'шестерых': 6, 'большую компанию': 8,
+}
+
+def _merge(constraints: Dict[str, Tuple[Optional[float], Optional[float]]], field: str,
+           lo: Optional[float] = None, hi: Optional[float] = None) -> None:
+    old_lo, old_hi = constraints.get(field, (None, None))
+    if old_lo is not None:
+        lo = old_lo if lo is None else max(lo, old_lo)
+    if old_hi is not None:
+        hi = old_hi if hi is None else min(hi, old_hi)
+    constraints[field] = (lo, hi)
+
+def _bound(op: Optional[str], value: float) -> Tuple[Optional[float], Optional[float]]:
+    if op in LOWER_BOUND_OPS:
+        return value, None
+    return None, value
+
+def parse_constraints(query: str) -> Tuple[Dict[str, Tuple[Optional[float], Optional[float]]], str]:
+    """
+    Извлекает из запроса числовые ограничения на время, калорийность, порции и рейтинг.
+
+    Примеры: 'ужин за 30 минут' -> {'time': (None, 30)}, 'до 300 ккал' -> {'calories': (None, 300)},
+    'на 4 порции' -> {'servings': (4, None)}, 'рейтинг от 4.5' -> {'rating': (4.5, None)},
+    'от 20 до 40 минут' -> {'time': (20, 40)}, 'от 200 до 400 ккал' -> {'calories': (200, 400)}.
+
+    Args:
+        query: Текстовый запрос.
+
+    Returns:
+        Кортеж (ограничения {поле: (минимум, максимум)}, запрос без распознанных фраз).
+        Время — в минутах, как Recipe.standard_time.
+    """
+    text = query.lower()
+    constraints = {}
+    spans = []
+
+    for m in RANGE_RE.finditer(text):
+        lo = float(m.group('lo').replace(',', '.'))
+        hi = float(m.group('hi').replace(',', '.'))
+        if m.group('time'):
+            scale = 60 if m.group('time').startswith('ч') else 1
+            _merge(constraints, 'time', lo=lo * scale, hi=hi * scale)
+        else:
+            _merge(constraints, 'calories' if m.group('calories') else 'servings', lo=lo, hi=hi)
+        spans.append(m.span())
+    ranges = list(spans)
+
+    def in_range(m: re.Match) -> bool:
+        return any(start <= m.start() < end for start, end in ranges)
+
+    for m in TIME_RE.finditer(text):
+        if in_range(m):
+            continue
+        if m.group('word'):
+            minutes = WORD_NUMBERS[m.group('word')]
+        else:
+            minutes = float(m.group('num').replace(',', '.'))
+            if m.group('unit').startswith('ч'):
+                minutes *= 60
+        _merge(constraints, 'time', *_bound(m.group('op'), minutes))
+        spans.append(m.span())
+
+    for m in CALORIES_RE.finditer(text):
+        if in_range(m):
+            continue
+        _merge(constraints, 'calories', *_bound(m.group('op'), float(m.group('num').replace(',', '.'))))
+        spans.append(m.span())
+
+    for m in SERVINGS_RE.finditer(text):
+        if in_range(m):
+            continue
+        # 'на 4 порции' — рецепт минимум на 4 порции
+        servings = WORD_NUMBERS[m.group('word')] if m.group('word') else float(m.group('num'))
+        _merge(constraints, 'servings', lo=servings)
+        spans.append(m.span())
+
+    for m in RATING_RE.finditer(text):
+        op = m.group('op') or 'от'
+        _merge(constraints, 'rating', *_bound(op, float(m.group('num').replace(',', '.'))))
+        spans.append(m.span())
+
+    if not spans:
+        return {}, query
+    rest = []
+    pos = 0
+    for start, end in sorted(spans):
+        if start >= pos:
+            rest.append(query[pos:start])
+            pos = end
+    rest.append(query[pos:])
+    rest = re.sub(r'\s+', ' ', ''.join(rest)).strip()
+    logger.debug(f"Parsed constraints {constraints} from query: {query}")
+    return constraints, rest
+
+def recipe_value(recipe: Any, field: str) -> Optional[float]:
+    """
+    Числовое значение поля рецепта для ограничений или None, если оно неизвестно.
+
+    Нулевые время и рейтинг означают, что значение не удалось разобрать
+    (см. Recipe.standardize_time), поэтому тоже считаются неизвестными.
+    """
+    value = getattr(recipe, CONSTRAINT_FIELDS[field], None)
+    if value is None:
+        return None
+    if isinstance(value, str):
+        m = re.search(_NUMBER, value)
+        if m is None:
+            return None
+        value = m.group(0).replace(',', '.')
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if value <= 0 and field in ('time', 'rating', 'servings'):
+        return None
+    return value
+
+class ConstraintIndex:
+    def __init__(self, recipes: Sequence[Any]):
+        """
+        Строит индекс рецептов по числовым полям для фильтрации по ограничениям.
+
+        Для каждого поля хранятся отсортированные значения и позиции рецептов,
+        поэтому диапазон находится двоичным поиском, а не перебором рецептов.
+        Рецепты с неизвестным значением поля не проходят ограничения на это поле.
+
+        Args:
+            recipes: Список объектов Recipe.
+        """
+        self.ids = [recipe.id for recipe in recipes]
+        self.values = {}
+        self.order = {}
+        for field in CONSTRAINT_FIELDS:
+            values = np.full(len(recipes), np.nan, dtype=np.float64)
+            for n, recipe in enumerate(recipes):
+                value = recipe_value(recipe, field)
+                if value is not None:
+                    values[n] = value
+            known = np.flatnonzero(~np.isnan(values))
+            order = known[np.argsort(values[known], kind='stable')]
+            self.order[field] = order
+            self.values[field] = values[order]
+        logger.info(f"ConstraintIndex built for {len(self.ids)} recipes")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def positions(self, field: str, lo: Optional[float] = None, hi: Optional[float] = None) -> np.ndarray:
+        """
+        Позиции рецептов, у которых значение поля в [lo, hi].
+        """
+        values = self.values[field]
+        start = 0 if lo is None else np.searchsorted(values, lo, side='left')
+        end = len(values) if hi is None else np.searchsorted(values, hi, side='right')
+        return self.order[field][start:end]
+
+    def select(self, constraints: Dict[str, Tuple[Optional[float], Optional[float]]]) -> Optional[Set[str]]:
+        """
+        Возвращает идентификаторы рецептов, удовлетворяющих всем ограничениям.
+
+        Args:
+            constraints: Ограничения из parse_constraints.
+
+        Returns:
+            Множество идентификаторов или None, если ограничений нет.
+        """
+        mask = None
+        for field, (lo, hi) in constraints.items():
+            if field not in self.values:
+                logger.warning(f"Unknown constraint field: {field}")
+                continue
+            field_mask = np.zeros(len(self.ids), dtype=bool)
+            field_mask[self.positions(field, lo, hi)] = True
+            mask = field_mask if mask is None else mask & field_mask
+        if mask is None:
+            return None
+        ids = self.ids
+        return {ids[i] for i in np.flatnonzero(mask)}
+
+def describe_constraints(constraints: Dict[str, Tuple[Optional[float], Optional[float]]]) -> List[str]:
+    """
+    Описывает ограничения словами (для verbose-вывода и логов).
+    """
+    units = {'time': 'мин', 'calories': 'ккал', 'servings': 'порц', 'rating': ''}
+    res = []
+    for field, (lo, hi) in constraints.items():
+        parts = []
+        if lo is not None:
+            parts.append(f"от {lo:g}")
+        if hi is not None:
+            parts.append(f"до {hi:g}")
+        res.append(f"{field} {' '.join(parts)} {units.get(field, '')}".strip())
+    return res
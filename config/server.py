@@ -0,0 +1,450 @@
+import os
+import gc
+import json
+import time
+import signal
+import socket
+import asyncio
+import logging
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import metrics
+from config.pantry import PANTRY_RE
+from config.dish import BUNDLE_SECTIONS
+
+logger = logging.getLogger(__name__)
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8000
+SERVER_WORKERS = 2
+# Потоки на воркер для блокирующих обработчиков (поиск, вызов LLM)
+WORKER_THREADS = 4
+# Сколько секунд воркер дожидается текущих запросов при остановке или перезагрузке
+GRACEFUL_TIMEOUT = 30.0
+MAX_BODY_SIZE = 1 << 20
+BACKLOG = 1024
+WARMUP_QUERIES = ["Что можно приготовить из картошки и сыра?", "Как приготовить блинчики?", "Ужин за 30 минут"]
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def memory_usage() -> Dict[str, int]:
+    """
+    Возвращает потребление памяти процессом в байтах.
+
+    rss — резидентная память, private — страницы, принадлежащие только этому
+    процессу (без разделяемых copy-on-write с мастером); доступно в Linux.
+    """
+    res = {}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Private_Clean", "Private_Dirty"):
+                    res[key] = int(value.split()[0]) * 1024
+    except OSError:
+        return res
+    return {'rss': res.get("Rss", 0), 'private': res.get("Private_Clean", 0) + res.get("Private_Dirty", 0)}
+
+def warm_up(project: Any, queries=WARMUP_QUERIES) -> None:
+    """
+    Прогревает проект до форка: строит ленивые индексы графа, числовых ограничений
+    и поиска по продуктам, чтобы воркеры получили их готовыми в общих страницах.
+
+    Прогревается только путь без векторного хранилища: клиент Chroma (SQLite)
+    и модель эмбеддингов не должны переживать форк, их открывает воркер.
+
+    Секции проекта, открытого из бандла, загружаются здесь же: иначе каждый
+    воркер при первом обращении распакует собственную копию.
+    """
+    for name in BUNDLE_SECTIONS:
+        getattr(project, name)
+    # Строит словарь рецептов по id
+    project.get_recipe("")
+    for query in queries:
+        if PANTRY_RE.search(query.lower()):
+            project.search_by_ingredients(query)
+        else:
+            project.invoke(query.lower())
+    logger.info("Project warmed up")
+
+class RecipesServer:
+    def __init__(self, project: Any, model: Any = None, cache: Any = None, sessions: Any = None,
+                 n_recipes: int = 3, threads: int = WORKER_THREADS):
+        """
+        Инициализирует HTTP-обработчик воркера.
+
+        Args:
+            project: Загруженный и прогретый RecipesProject.
+            model: Модель OllamaLLM (None — доступен только поиск).
+            cache: LLMCache для ответов модели.
+            sessions: SessionStore для истории диалогов.
+            n_recipes: Сколько рецептов передавать в промпт.
+            threads: Потоки для блокирующих обработчиков.
+        """
+        self.project = project
+        self.model = model
+        self.cache = cache
+        self.sessions = sessions
+        self.n_recipes = n_recipes
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.routes = {
+            ('GET', '/health'): self.health,
+            ('GET', '/ready'): self.ready,
+            ('GET', '/metrics'): self.metrics_text,
+            ('POST', '/search'): self.search,
+            ('POST', '/pantry'): self.pantry,
+            ('POST', '/chat'): self.chat,
+        }
+        self.draining = False
+        self.inflight = 0
+        self.started_at = time.time()
+
+    def health(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Живость воркера: процесс отвечает на запросы.
+        """
+        return {'status': 'ok', 'pid': os.getpid(), 'uptime': time.time() - self.started_at, **memory_usage()}
+
+    def ready(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Готовность воркера принимать запросы (ложна во время остановки).
+        """
+        if self.draining:
+            raise HTTPError(503, "draining")
+        return {'status': 'ready', 'pid': os.getpid(), 'recipes': len(self.project.recipes)}
+
+    def metrics_text(self, payload: Dict[str, Any]) -> str:
+        """
+        Метрики воркера в формате Prometheus.
+        """
+        return metrics.prometheus_text()
+
+    def _n(self, payload: Dict[str, Any]) -> int:
+        n = payload.get('n', self.n_recipes)
+        # bool — подкласс int, но {"n": true} не количество
+        if not isinstance(n, int) or isinstance(n, bool) or n <= 0:
+            raise HTTPError(400, "n must be a positive integer")
+        return n
+
+    def _recipes(self, query: str, n: int) -> Tuple[list, list]:
+        ids = self.project.search(query, n=n)
+        recipes = [recipe for recipe in (self.project.get_recipe(id_) for id_ in ids) if recipe is not None]
+        return ids, recipes
+
+    def search(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Поиск рецептов: {"query": str, "n": int} -> {"recipes": [{"id", "name"}]}.
+        """
+        query = payload.get('query')
+        if not isinstance(query, str) or not query.strip():
+            raise HTTPError(400, "query is required")
+        _, recipes = self._recipes(query, self._n(payload))
+        return {'recipes': [{'id': recipe.id, 'name': recipe.name} for recipe in recipes]}
+
+    def pantry(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Рецепты из имеющихся продуктов: {"ingredients": [str] или "query": str, "n": int}
+        -> {"recipes": [{"id", "name", "missing", "missing_ingridients"}]}.
+        """
+        ingredients = payload.get('ingredients', payload.get('query'))
+        if isinstance(ingredients, list):
+            if not ingredients or not all(isinstance(item, str) for item in ingredients):
+                raise HTTPError(400, "ingredients must be a non-empty list of strings")
+        elif not isinstance(ingredients, str) or not ingredients.strip():
+            raise HTTPError(400, "ingredients or query is required")
+        found = self.project.search_by_ingredients(ingredients, n=self._n(payload))
+        return {'recipes': [
+            {'id': r['id'], 'name': self.project.get_recipe(r['id']).name, 'missing': r['missing'],
+             'missing_ingridients': r['missing_ingridients']}
+            for r in found
+        ]}
+
+    def chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ответ ассистента: {"query": str, "session_id": str?} -> {"answer", "recipes"}.
+        """
+        from config.model_loader import llm_invoke
+        from config.prompt_builder import build_prompt
+        from config.context_packer import default_packer
+
+        if self.model is None:
+            raise HTTPError(503, "LLM is not configured")
+        query = payload.get('query')
+        if not isinstance(query, str) or not query.strip():
+            raise HTTPError(400, "query is required")
+        session_id = payload.get('session_id')
+        _, recipes = self._recipes(query, self._n(payload))
+        use_session = self.sessions is not None and bool(session_id)
+        # Чтение истории, генерация и запись хода — под блокировкой сессии (между потоками
+        # и воркерами), иначе параллельные ходы видят одну историю и перемешивают сообщения
+        with ExitStack() as stack:
+            if use_session:
+                try:
+                    stack.enter_context(self.sessions.lock(session_id))
+                except TimeoutError:
+                    raise HTTPError(409, "session is busy")
+            messages = self.sessions.messages(session_id) if use_session else []
+            # Рецепты и история укладываются в бюджет токенов промпта
+            packed = default_packer().pack(query, recipes, messages)
+            prompt = build_prompt(query, packed['retrieved_recipes'], packed['chat_history'])
+            answer = llm_invoke(self.model, prompt, cache=self.cache)
+            if use_session:
+                self.sessions.add_user_message(session_id, query)
+                self.sessions.add_ai_message(session_id, answer)
+        return {'answer': answer, 'recipes': [{'id': recipe.id, 'name': recipe.name} for recipe in recipes]}
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise HTTPError(400, "invalid Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(413, "request body is too large")
+        body = await reader.readexactly(length) if length else b''
+        return method, target.split('?', 1)[0], headers, body
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: int, body: Any, keep_alive: bool) -> None:
+        if isinstance(body, str):
+            data, content_type = body.encode('utf-8'), 'text/plain; version=0.0.4'
+        else:
+            data, content_type = json.dumps(body, ensure_ascii=False).encode('utf-8'), 'application/json'
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Обслуживает соединение HTTP/1.1 (с keep-alive) до его закрытия или остановки воркера.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._write_response(writer, e.status, {'error': str(e)}, False)
+                    return
+                if request is None:
+                    return
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close' and not self.draining
+                self.inflight += 1
+                try:
+                    handler = self.routes.get((method, path))
+                    if handler is None:
+                        known = any(p == path for _, p in self.routes)
+                        raise HTTPError(405 if known else 404, f"{method} {path} is not supported")
+                    try:
+                        payload = json.loads(body) if body else {}
+                    except ValueError:
+                        raise HTTPError(400, "body must be JSON")
+                    if not isinstance(payload, dict):
+                        raise HTTPError(400, "body must be a JSON object")
+                    with metrics.span(f"http{path.replace('/', '_')}"):
+                        res = await loop.run_in_executor(self.executor, handler, payload)
+                    status = 200
+                except HTTPError as e:
+                    status, res = e.status, {'error': str(e)}
+                except Exception as e:
+                    logger.error(f"Request {method} {path} failed: {e}")
+                    status, res = 500, {'error': 'internal error'}
+                finally:
+                    self.inflight -= 1
+                await self._write_response(writer, status, res, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, sock: socket.socket, grace: float = GRACEFUL_TIMEOUT) -> None:
+        """
+        Принимает соединения на унаследованном от мастера сокете до сигнала SIGTERM/SIGINT,
+        затем перестаёт принимать новые и дожидается текущих запросов (не дольше grace).
+        """
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        server = await asyncio.start_server(self.handle_connection, sock=sock, backlog=BACKLOG)
+        logger.info(f"Worker {os.getpid()} is serving")
+        await stop.wait()
+
+        self.draining = True
+        server.close()
+        deadline = loop.time() + grace
+        while self.inflight and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self.inflight:
+            logger.warning(f"Worker {os.getpid()} stops with {self.inflight} unfinished requests")
+        self.executor.shutdown(wait=False)
+        logger.info(f"Worker {os.getpid()} stopped")
+
+class PreforkServer:
+    def __init__(self, loader: Callable[[], Any], app_factory: Callable[[Any], RecipesServer],
+                 host: str = SERVER_HOST, port: int = SERVER_PORT, workers: int = SERVER_WORKERS,
+                 grace: float = GRACEFUL_TIMEOUT):
+        """
+        Инициализирует мастер-процесс с предзагрузкой и форком воркеров.
+
+        Мастер один раз загружает проект (рецепты, граф, теги), прогревает его и замораживает GC (gc.freeze), после чего форкает воркеры:
+        страницы с данными остаются общими copy-on-write, а сборщик мусора воркеров
+        не обходит замороженные объекты и не копирует их страницы при обходе.
+
+        SIGHUP — плавная перезагрузка: мастер загружает проект заново, запускает новое
+        поколение воркеров и только затем останавливает старое (оно дообслуживает
+        текущие запросы). SIGTERM/SIGINT — плавная остановка.
+
+        Args:
+            loader: Функция загрузки RecipesProject.
+            app_factory: Создаёт RecipesServer в воркере после форка (соединения
+                с SQLite и Ollama не должны переживать форк).
+            host: Адрес.
+            port: Порт.
+            workers: Число воркеров.
+            grace: Время на завершение текущих запросов при остановке, секунды.
+        """
+        self.loader = loader
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.grace = grace
+        self.project = None
+        self.children = {}
+        self.retiring = set()
+        self._reload = False
+        self._stop = False
+
+    def load(self) -> None:
+        """
+        Загружает и прогревает проект, затем замораживает GC.
+        """
+        start = time.perf_counter()
+        project = self.loader()
+        warm_up(project)
+        # Старый проект остаётся в работающих воркерах; в мастере его можно освободить
+        gc.unfreeze()
+        self.project = project
+        gc.collect()
+        gc.freeze()
+        logger.info(f"Project loaded in {time.perf_counter() - start:.1f} s, {gc.get_freeze_count()} objects frozen")
+
+    def spawn(self, sock: socket.socket) -> int:
+        """
+        Форкает воркер, обслуживающий сокет sock.
+        """
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.time()
+            return pid
+        code = 0
+        try:
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            app = self.app_factory(self.project)
+            asyncio.run(app.serve(sock, self.grace))
+        except Exception as e:
+            logger.error(f"Worker {os.getpid()} crashed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _signal(self, signum: int, frame: Any) -> None:
+        if signum == signal.SIGHUP:
+            self._reload = True
+        else:
+            self._stop = True
+
+    def _reap(self) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.children.pop(pid, None)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+            else:
+                logger.warning(f"Worker {pid} exited with status {status}")
+
+    def _terminate(self, pids) -> None:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        """
+        Запускает мастер-процесс: загрузка, форк воркеров и надзор за ними.
+        """
+        self.load()
+        sock = socket.create_server((self.host, self.port), backlog=BACKLOG)
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._signal)
+        for _ in range(self.workers):
+            self.spawn(sock)
+        logger.info(f"Serving on http://{self.host}:{self.port} with {self.workers} workers")
+
+        while not self._stop:
+            time.sleep(0.2)
+            self._reap()
+            if self._reload:
+                self._reload = False
+                old = set(self.children)
+                try:
+                    self.load()
+                except Exception as e:
+                    logger.error(f"Reload failed, keeping the current workers: {e}")
+                    continue
+                for _ in range(self.workers):
+                    self.spawn(sock)
+                self.retiring |= old
+                self._terminate(old)
+                logger.info("Reloaded: new workers started, old workers are draining")
+                continue
+            # Воркер упал сам — запускаем замену
+            for _ in range(self.workers - (len(self.children) - len(self.retiring))):
+                self.spawn(sock)
+
+        logger.info("Shutting down")
+        self.retiring |= set(self.children)
+        self._terminate(list(self.children))
+        deadline = time.time() + self.grace + 5
+        while self.children and time.time() < deadline:
+            time.sleep(0.1)
+            self._reap()
+        for pid in list(self.children):
+            os.kill(pid, signal.SIGKILL)
+        sock.close()
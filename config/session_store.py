@@ -0,0 +1,292 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_PATH = "./chat_sessions.sqlite"
+SESSION_IDLE_TTL = 24 * 3600  # секунд
+# Время жизни блокировки сессии, если держащий её процесс упал
+SESSION_LOCK_LEASE = 300
+SESSION_LOCK_POLL = 0.05
+# Сколько отформатированных историй сессий держать в памяти процесса
+HISTORY_CACHE_SIZE = 1024
+
+def format_message(role: str, content: str) -> str:
+    """
+    Форматирует сообщение так же, как formatted_chat_history.
+    """
+    return f"User: {content}" if role == 'user' else f"Assistant: {content}"
+
+class SessionStore:
+    def __init__(self, path: str = SESSIONS_PATH, idle_ttl: float = SESSION_IDLE_TTL):
+        """
+        Инициализирует хранилище чат-сессий на SQLite.
+
+        Сообщения дописываются в журнал (одна строка на сообщение), поэтому запись хода
+        не зависит от длины диалога. Отформатированная история поддерживается
+        инкрементально: процесс хранит для сессии (число сообщений, текст) и при чтении
+        форматирует только сообщения, дописанные после этого (в том числе другими процессами).
+        База открывается в режиме WAL и может использоваться несколькими процессами.
+
+        Args:
+            path: Путь к файлу базы SQLite.
+            idle_ttl: Через сколько секунд бездействия сессия считается истёкшей.
+        """
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._history = OrderedDict()
+        self._history_guard = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " n_messages INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at);"
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL,"
+            " content TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (session_id, seq));"
+            "CREATE TABLE IF NOT EXISTS locks ("
+            " session_id TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);"
+        )
+        conn.commit()
+        logger.info(f"Session store opened: {path}")
+
+    def _conn(self) -> sqlite3.Connection:
+        """
+        Возвращает соединение текущего потока.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        """
+        Дописывает сообщение в журнал сессии.
+
+        Args:
+            session_id: Идентификатор сессии.
+            role: 'user' или 'assistant'.
+            content: Текст сообщения.
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT n_messages FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO sessions (session_id, n_messages, created_at, updated_at) VALUES (?, 1, ?, ?)",
+                    (session_id, now, now)
+                )
+                seq = 0
+            else:
+                seq = row[0]
+                conn.execute(
+                    "UPDATE sessions SET n_messages = n_messages + 1, updated_at = ? WHERE session_id = ?",
+                    (now, session_id)
+                )
+            conn.execute(
+                "INSERT INTO messages (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, seq, role, content, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add_user_message(self, session_id: str, content: str) -> None:
+        """
+        Дописывает сообщение пользователя (как ChatMessageHistory.add_user_message).
+        """
+        self.append(session_id, 'user', content)
+
+    def add_ai_message(self, session_id: str, content: str) -> None:
+        """
+        Дописывает ответ ассистента (как ChatMessageHistory.add_ai_message).
+        """
+        self.append(session_id, 'assistant', content)
+
+    def formatted_history(self, session_id: str, last: Optional[int] = None) -> str:
+        """
+        Возвращает отформатированную историю сессии.
+
+        Полная история берётся из кэша процесса и дополняется только новыми сообщениями
+        журнала (seq не меньше закэшированного числа сообщений), так что диалог из n ходов
+        форматируется за O(n), а не за O(n^2). Кэш сбрасывается, если сессия была удалена
+        и создана заново.
+
+        Args:
+            session_id: Идентификатор сессии.
+            last: Включить только последние last сообщений (без кэша).
+
+        Returns:
+            История в формате formatted_chat_history (пустая строка для новой сессии).
+        """
+        if last is not None:
+            return "\n".join(format_message(role, content) for role, content in self.messages(session_id, last))
+
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT created_at, n_messages FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            self._forget_history(session_id)
+            return ""
+        created_at, n_messages = row
+        with self._history_guard:
+            cached = self._history.get(session_id)
+        if cached is None or cached[0] != created_at or cached[1] > n_messages:
+            cached = (created_at, 0, "")
+        _, n_cached, text = cached
+        if n_cached < n_messages:
+            rows = conn.execute(
+                "SELECT seq, role, content FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq",
+                (session_id, n_cached)
+            ).fetchall()
+            if rows:
+                new_text = "\n".join(format_message(role, content) for _, role, content in rows)
+                text = f"{text}\n{new_text}" if text else new_text
+                n_cached = rows[-1][0] + 1
+        with self._history_guard:
+            self._history[session_id] = (created_at, n_cached, text)
+            self._history.move_to_end(session_id)
+            while len(self._history) > HISTORY_CACHE_SIZE:
+                self._history.popitem(last=False)
+        return text
+
+    def _forget_history(self, session_id: str) -> None:
+        with self._history_guard:
+            self._history.pop(session_id, None)
+
+    def messages(self, session_id: str, last: Optional[int] = None) -> List[Tuple[str, str]]:
+        """
+        Возвращает сообщения сессии от старых к новым.
+
+        Args:
+            session_id: Идентификатор сессии.
+            last: Вернуть только последние last сообщений.
+
+        Returns:
+            Список (роль, текст), совместимый с ContextPacker.pack.
+        """
+        if last is None:
+            rows = self._conn().execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        else:
+            rows = self._conn().execute(
+                "SELECT role, content FROM (SELECT seq, role, content FROM messages WHERE session_id = ? "
+                "ORDER BY seq DESC LIMIT ?) ORDER BY seq", (session_id, last)
+            ).fetchall()
+        return [(role, content) for role, content in rows]
+
+    @contextmanager
+    def lock(self, session_id: str, timeout: float = 30.0) -> Iterator[None]:
+        """
+        Блокирует сессию на время хода, в том числе между процессами.
+
+        Внутри процесса используется threading.Lock, между процессами — запись-аренда
+        в таблице locks, которая истекает через SESSION_LOCK_LEASE секунд.
+
+        Args:
+            session_id: Идентификатор сессии.
+            timeout: Сколько секунд ждать блокировку.
+
+        Raises:
+            TimeoutError: Если блокировку не удалось получить.
+        """
+        with self._locks_guard:
+            local_lock = self._locks.setdefault(session_id, threading.Lock())
+        if not local_lock.acquire(timeout=timeout):
+            raise TimeoutError(f"Session {session_id} is locked")
+        try:
+            deadline = time.monotonic() + timeout
+            conn = self._conn()
+            while True:
+                now = time.time()
+                cursor = conn.execute(
+                    "INSERT INTO locks (session_id, owner, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                    "WHERE locks.expires_at < ?",
+                    (session_id, self.owner, now + SESSION_LOCK_LEASE, now)
+                )
+                if cursor.rowcount:
+                    break
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Session {session_id} is locked by another process")
+                time.sleep(SESSION_LOCK_POLL)
+            try:
+                yield
+            finally:
+                conn.execute("DELETE FROM locks WHERE session_id = ? AND owner = ?", (session_id, self.owner))
+        finally:
+            local_lock.release()
+
+    def expire_idle(self, idle_ttl: Optional[float] = None) -> int:
+        """
+        Удаляет сессии, неактивные дольше idle_ttl.
+
+        Args:
+            idle_ttl: Порог бездействия в секундах (по умолчанию из конструктора).
+
+        Returns:
+            Число удалённых сессий.
+        """
+        ttl = self.idle_ttl if idle_ttl is None else idle_ttl
+        threshold = time.time() - ttl
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE updated_at < ?)",
+                (threshold,)
+            )
+            count = conn.execute("DELETE FROM sessions WHERE updated_at < ?", (threshold,)).rowcount
+            conn.execute("DELETE FROM locks WHERE expires_at < ?", (time.time(),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if count:
+            logger.info(f"Expired {count} idle sessions")
+            # Удалённые сессии отсекаются проверкой created_at; освобождаем память сразу
+            with self._history_guard:
+                self._history.clear()
+        with self._locks_guard:
+            for session_id, local_lock in list(self._locks.items()):
+                if not local_lock.locked():
+                    del self._locks[session_id]
+        return count
+
+    def delete(self, session_id: str) -> None:
+        """
+        Удаляет сессию и её сообщения.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._forget_history(session_id)
@@ -0,0 +1,466 @@
+import gc
+import time
+import zlib
+import heapq
+import signal
+import itertools
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.dish import RecipesProject, BUNDLE_SECTIONS
+from config.food_graph import recipe_nodes, query_graph_steps, query_graph_stop
+from config.pantry import PANTRY_RE
+from config.query_constraints import parse_constraints
+from config.llm_scheduler import percentile
+
+logger = logging.getLogger(__name__)
+
+SHARD_COUNT = 4
+SHARD_TOP_K = 3
+# Сколько секунд ждать ответа шарда на запрос и готовности шарда при запуске
+SHARD_TIMEOUT = 30.0
+SHARD_START_TIMEOUT = 600.0
+# Сколько эмбеддингов запрашивать из коллекции за раз при загрузке среза индекса
+VECTOR_BATCH_SIZE = 1000
+# Ярусы ключа слияния: поиск по продуктам, рецепты графа, дополнение векторным поиском по всем рецептам
+TIER_PANTRY, TIER_GRAPH, TIER_PADDING = 0, 1, 2
+
+def shard_of(recipe_id: str, n_shards: int) -> int:
+    """
+    Номер шарда рецепта (стабилен между процессами и запусками).
+    """
+    return zlib.crc32(recipe_id.encode('utf-8')) % n_shards
+
+def make_shard(project: RecipesProject, shard: int, n_shards: int) -> RecipesProject:
+    """
+    Выделяет из проекта шард: его рецепты и подграф знаний с этими рецептами и всеми тегами.
+
+    Теги и однословные теги общие для всех шардов, поэтому запрос во всех шардах
+    разбирается одинаково.
+
+    Args:
+        project: Полный RecipesProject.
+        shard: Номер шарда.
+        n_shards: Число шардов.
+
+    Returns:
+        RecipesProject шарда (без векторного хранилища).
+    """
+    recipes = [recipe for recipe in project.recipes if shard_of(recipe.id, n_shards) == shard]
+    ids = {recipe.id for recipe in recipes}
+    graph = project.knowledgeGraph
+    nodes = [n for n, node_type in graph.nodes(data='node_type') if node_type != 'recipe' or n in ids]
+    subgraph = graph.subgraph(nodes).copy()
+    # Кэш множества рецептов скопирован из полного графа вместе с атрибутами
+    subgraph.graph.pop('recipe_nodes', None)
+    recipe_nodes(subgraph)
+    logger.info(f"Shard {shard}/{n_shards}: {len(recipes)} recipes")
+    return RecipesProject(recipes=recipes, knowledgeGraph=subgraph, tags=project.tags,
+                          oneWordTags=project.oneWordTags)
+
+class ShardVectors:
+    def __init__(self, collection: Any, ids: Sequence[str], batch_size: int = VECTOR_BATCH_SIZE):
+        """
+        Загружает в память срез векторного индекса: эмбеддинги рецептов шарда.
+
+        Args:
+            collection: Коллекция Chroma (или векторное хранилище LangChain) с методом get.
+            ids: Идентификаторы рецептов шарда.
+            batch_size: Сколько эмбеддингов запрашивать за раз.
+        """
+        self.ids = []
+        vectors = []
+        ids = list(ids)
+        for start in range(0, len(ids), batch_size):
+            data = collection.get(where={'id': {'$in': ids[start:start + batch_size]}},
+                                  include=['embeddings', 'metadatas'])
+            if data['embeddings'] is None or len(data['embeddings']) == 0:
+                continue
+            self.ids.extend(metadata['id'] for metadata in data['metadatas'])
+            vectors.append(np.asarray(data['embeddings'], dtype=np.float32))
+        self.vectors = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        self.norms = (self.vectors * self.vectors).sum(axis=1)
+        self.rows = {id_: n for n, id_ in enumerate(self.ids)}
+        logger.info(f"Loaded {len(self.ids)} of {len(ids)} shard vectors")
+
+    def rank(self, query_vector: np.ndarray, candidates: Sequence[str], k: int) -> List[Tuple[float, str]]:
+        """
+        Возвращает k ближайших к запросу кандидатов как (квадрат L2-расстояния, id).
+        """
+        rows = np.fromiter((self.rows[id_] for id_ in candidates if id_ in self.rows), dtype=np.int64)
+        if len(rows) == 0:
+            return []
+        # Квадрат L2-расстояния без |q|^2, как в request_chroma_db_subset
+        distances = self.norms[rows] - 2 * self.vectors[rows] @ query_vector
+        k = min(k, len(rows))
+        top = np.argpartition(distances, k - 1)[:k]
+        return [(float(distances[i]), self.ids[rows[i]]) for i in top]
+
+class ShardSearcher:
+    def __init__(self, project: RecipesProject, vectors: Optional[ShardVectors] = None,
+                 positions: Optional[Dict[str, int]] = None):
+        """
+        Поиск внутри одного шарда; результаты снабжаются ключами для слияния координатором.
+
+        Запрос обрабатывается в две фазы. plan разбирает запрос и либо сразу возвращает
+        результаты поиска по продуктам, либо размеры множеств рецептов шарда после каждого
+        тега графа. Координатор суммирует размеры по шардам и по правилу остановки
+        query_graph выбирает общий шаг; rank ранжирует рецепты шарда на этом шаге.
+        Так шардированный поиск отбирает те же рецепты, что и RecipesProject.search.
+
+        Args:
+            project: RecipesProject шарда (см. make_shard).
+            vectors: Срез векторного индекса шарда.
+            positions: Позиции рецептов шарда в полном каталоге (для равных ключей поиска по продуктам).
+        """
+        self.project = project
+        self.vectors = vectors
+        self.positions = positions or {recipe.id: n for n, recipe in enumerate(project.recipes)}
+        self._plans = {}
+
+    def plan(self, request_id: Any, query: str, n: int = SHARD_TOP_K) -> Dict[str, Any]:
+        """
+        Первая фаза запроса.
+
+        Returns:
+            {'pantry': [(ключ, id), ...]}, если поиск по продуктам нашёл рецепты,
+            иначе {'sizes': [размер множества на каждом шаге query_graph_steps]};
+            шаги запоминаются до rank или drop.
+        """
+        project = self.project
+        constraints, query_text = parse_constraints(query)
+        if PANTRY_RE.search(query_text.lower()):
+            found = project.search_by_ingredients(query_text, n=n, constraints=constraints)
+            if found:
+                return {'pantry': sorted(
+                    ((TIER_PANTRY, r['missing'], -r['used'],
+                      -round(1000 * r['covered'] / max(r['total'], 1)), self.positions[r['id']]), r['id'])
+                    for r in found
+                )}
+
+        query_clean = query_text.lower().replace("рецепт", "").replace("кухня", "")
+        candidates = project.filter_recipes(constraints)
+        enriched_query = project.enrich_query_with_tags(query_clean)
+        steps = list(query_graph_steps(enriched_query, project.knowledgeGraph, project.tags,
+                                       candidates=candidates))
+        self._plans[request_id] = (steps, candidates)
+        return {'sizes': [len(step) for step in steps]}
+
+    def rank(self, request_id: Any, step: int, query_vector: Optional[np.ndarray] = None,
+             n: int = SHARD_TOP_K) -> List[Tuple[Tuple[float, ...], str]]:
+        """
+        Вторая фаза запроса: до n лучших рецептов шарда на шаге step как (ключ, id).
+
+        С векторным индексом к ним добавляются n ближайших рецептов среди прошедших
+        ограничения запроса (ярус TIER_PADDING), как дополнение в RecipesProject.search.
+        """
+        steps, constraint_ids = self._plans.pop(request_id)
+        candidates = steps[step]
+        if self.vectors is None or query_vector is None:
+            return [((TIER_GRAPH, 0.0), id_) for id_ in sorted(candidates)[:n]]
+        res = [((TIER_GRAPH, distance), id_) for distance, id_ in self.vectors.rank(query_vector, candidates, n)]
+        padding = constraint_ids if constraint_ids is not None else self.vectors.ids
+        res.extend(((TIER_PADDING, distance), id_) for distance, id_ in self.vectors.rank(query_vector, padding, n))
+        return sorted(res)
+
+    def drop(self, request_id: Any) -> None:
+        """
+        Забывает шаги запроса, для которого координатор не запросит rank.
+        """
+        self._plans.pop(request_id, None)
+
+    def search(self, query: str, query_vector: Optional[np.ndarray] = None,
+               n: int = SHARD_TOP_K) -> List[Tuple[Tuple[float, ...], str]]:
+        """
+        Обе фазы запроса по одному шарду (решение об остановке — по его собственным размерам).
+        """
+        plan = self.plan(None, query, n)
+        if 'pantry' in plan:
+            return plan['pantry']
+        return self.rank(None, choose_step(plan['sizes']), query_vector, n)
+
+def choose_step(sizes: Sequence[int]) -> int:
+    """
+    Шаг query_graph_steps, рецепты которого ранжирует RecipesProject.search:
+    отобранные графом, а если их нет — запасной набор.
+
+    Args:
+        sizes: Размеры множеств на каждом шаге (суммарные по всем шардам).
+    """
+    selected, fallback = query_graph_stop(sizes)
+    return selected if selected is not None and sizes[selected] > 0 else fallback
+
+def _shard_main(conn: Any, project: RecipesProject, shard: int, n_shards: int,
+                collection_factory: Optional[Callable[[], Any]]) -> None:
+    # Координатор сам останавливает шарды; Ctrl+C в терминале не должен их ронять
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        positions = {recipe.id: n for n, recipe in enumerate(project.recipes)
+                     if shard_of(recipe.id, n_shards) == shard}
+        project = make_shard(project, shard, n_shards)
+        vectors = None
+        if collection_factory is not None:
+            vectors = ShardVectors(collection_factory(), [recipe.id for recipe in project.recipes])
+        searcher = ShardSearcher(project, vectors, positions)
+        # Строим ленивые индексы до первого запроса и отпускаем полный проект
+        searcher.search("Что можно приготовить из картошки и сыра?")
+        searcher.search("Ужин за 30 минут")
+        gc.collect()
+        conn.send(('ready', len(project.recipes)))
+    except Exception as e:
+        conn.send(('error', repr(e)))
+        return
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        kind, request_id, *args = message
+        if kind == 'drop':
+            searcher.drop(request_id)
+            continue
+        try:
+            if kind == 'plan':
+                result = searcher.plan(request_id, *args)
+            else:
+                result = searcher.rank(request_id, *args)
+            conn.send((request_id, result, None))
+        except Exception as e:
+            logger.error(f"Shard {shard} failed on {kind} of request {request_id}: {e}")
+            searcher.drop(request_id)
+            conn.send((request_id, None, repr(e)))
+
+class ShardedSearch:
+    def __init__(self, loader: Callable[[], RecipesProject], n_shards: int = SHARD_COUNT,
+                 embedder_factory: Optional[Callable[[], Callable[[str], np.ndarray]]] = None,
+                 collection_factory: Optional[Callable[[], Any]] = None, timeout: float = SHARD_TIMEOUT):
+        """
+        Координатор шардированного поиска: рецепты разбиты по id между процессами-шардами.
+
+        Каждый шард держит свой срез рецептов, подграф знаний и векторного индекса.
+        Координатор один раз вычисляет эмбеддинг запроса, рассылает запрос всем
+        шардам (scatter), собирает их ответы (gather) и сливает по ключам шардов;
+        правило остановки тегов графа применяется к суммарным по шардам размерам
+        (см. ShardSearcher). Запросы из разных потоков выполняются шардами конвейерно.
+
+        Args:
+            loader: Загружает полный RecipesProject; вызывается один раз в координаторе
+                перед форком, шарды выделяют свою часть из унаследованной копии.
+            n_shards: Число шардов.
+            embedder_factory: Открывает эмбеддер запросов (например, embed_query над хранилищем);
+                вызывается после запуска шардов, чтобы модель не загружалась до форка.
+                Без него шарды ранжируют только по графу.
+            collection_factory: Открывает коллекцию Chroma в шарде для загрузки среза векторов.
+            timeout: Сколько секунд ждать ответа шардов на запрос.
+        """
+        self.loader = loader
+        self.n_shards = n_shards
+        self.embedder_factory = embedder_factory
+        self.embedder = None
+        self.collection_factory = collection_factory
+        self.timeout = timeout
+        self.processes = []
+        self.conns = []
+        self.sizes = []
+        self._send_locks = []
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._receivers = []
+
+    def start(self) -> 'ShardedSearch':
+        """
+        Загружает проект, запускает процессы шардов и ждёт их готовности, затем открывает эмбеддер.
+        """
+        start = time.perf_counter()
+        project = self.loader()
+        # Секции бандла читаются до форка, иначе каждый шард загрузит их целиком сам
+        for name in BUNDLE_SECTIONS:
+            getattr(project, name)
+        context = multiprocessing.get_context('fork')
+        for shard in range(self.n_shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_shard_main, args=(child_conn, project, shard, self.n_shards, self.collection_factory),
+                name=f"shard-{shard}", daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self.processes.append(process)
+            self.conns.append(parent_conn)
+            self._send_locks.append(threading.Lock())
+        del project
+
+        for shard, conn in enumerate(self.conns):
+            if not conn.poll(SHARD_START_TIMEOUT):
+                self.close()
+                raise RuntimeError(f"Shard {shard} did not start in {SHARD_START_TIMEOUT} s")
+            status, value = conn.recv()
+            if status != 'ready':
+                self.close()
+                raise RuntimeError(f"Shard {shard} failed to start: {value}")
+            self.sizes.append(value)
+        for shard in range(self.n_shards):
+            receiver = threading.Thread(target=self._receive, args=(shard,), name=f"shard-{shard}-receiver",
+                                        daemon=True)
+            receiver.start()
+            self._receivers.append(receiver)
+        if self.embedder_factory is not None:
+            self.embedder = self.embedder_factory()
+        logger.info(f"{self.n_shards} shards ready in {time.perf_counter() - start:.1f} s: {self.sizes} recipes")
+        return self
+
+    def _receive(self, shard: int) -> None:
+        conn = self.conns[shard]
+        while True:
+            try:
+                request_id, result, error = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._pending.pop((request_id, shard), None)
+            if future is None:
+                continue
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(f"Shard {shard}: {error}"))
+        # Шард завершился: запросы, ждущие его ответа, не дождутся
+        with self._lock:
+            lost = [key for key in self._pending if key[1] == shard]
+            futures = [self._pending.pop(key) for key in lost]
+        for future in futures:
+            future.set_exception(RuntimeError(f"Shard {shard} is gone"))
+
+    def _send(self, shard: int, message: Tuple[Any, ...]) -> None:
+        with self._send_locks[shard]:
+            self.conns[shard].send(message)
+
+    def _scatter(self, request_id: int, message: Tuple[Any, ...]) -> List[Any]:
+        futures = []
+        try:
+            for shard in range(self.n_shards):
+                future = Future()
+                with self._lock:
+                    self._pending[(request_id, shard)] = future
+                self._send(shard, message)
+                futures.append(future)
+            return [future.result(timeout=self.timeout) for future in futures]
+        except Exception:
+            self._abandon(request_id)
+            raise
+
+    def _abandon(self, request_id: int) -> None:
+        # Запрос не дождался шардов (таймаут или ошибка): забываем его ожидающие ответы
+        # и просим шарды забыть его шаги, иначе медленный шард копит их с обеих сторон
+        with self._lock:
+            for shard in range(self.n_shards):
+                self._pending.pop((request_id, shard), None)
+        for shard in range(self.n_shards):
+            try:
+                self._send(shard, ('drop', request_id))
+            except (OSError, ValueError):
+                pass
+
+    def search_scored(self, query: str, n: int = SHARD_TOP_K) -> List[Tuple[Tuple[float, ...], str]]:
+        """
+        Рассылает запрос шардам и сливает их top-k.
+
+        Returns:
+            До n пар (ключ, id) в порядке слияния.
+        """
+        request_id = next(self._ids)
+        plans = self._scatter(request_id, ('plan', request_id, query, n))
+        pantry = [plan['pantry'] for plan in plans if 'pantry' in plan]
+        if pantry:
+            # Как в RecipesProject.search: найденное по продуктам не дополняется результатами графа
+            for shard in range(self.n_shards):
+                self._send(shard, ('drop', request_id))
+            return list(itertools.islice(heapq.merge(*pantry), n))
+
+        step = choose_step([sum(sizes) for sizes in zip(*(plan['sizes'] for plan in plans))])
+        query_vector = self.embedder(query) if self.embedder is not None else None
+        results = self._scatter(request_id, ('rank', request_id, step, query_vector, n))
+        res = []
+        seen = set()
+        for key, id_ in heapq.merge(*results):
+            if id_ not in seen:
+                seen.add(id_)
+                res.append((key, id_))
+                if len(res) == n:
+                    break
+        return res
+
+    def search(self, query: str, n: int = SHARD_TOP_K) -> List[str]:
+        """
+        Шардированный аналог RecipesProject.search: идентификаторы n лучших рецептов.
+        """
+        return [id_ for _, id_ in self.search_scored(query, n)]
+
+    def close(self) -> None:
+        """
+        Останавливает шарды.
+        """
+        for shard in range(len(self.conns)):
+            try:
+                self._send(shard, None)
+            except (OSError, ValueError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for conn in self.conns:
+            conn.close()
+        logger.info("Shards stopped")
+
+    def __enter__(self) -> 'ShardedSearch':
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+def measure_throughput(search: Callable[[str], Any], queries: Sequence[str], clients: int,
+                       duration: float) -> Dict[str, float]:
+    """
+    Замкнутая нагрузка: clients потоков без пауз отправляют запросы по кругу.
+
+    Returns:
+        {'throughput': запросов/с, 'p50', 'p99': задержки в секундах, 'requests'}.
+    """
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset: int) -> None:
+        n = offset
+        local = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            search(queries[n % len(queries)])
+            local.append(time.perf_counter() - start)
+            n += clients
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        'throughput': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'requests': len(latencies),
+    }
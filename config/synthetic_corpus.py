@@ -0,0 +1,148 @@
+import random
+import logging
+from itertools import accumulate
+from typing import List, Sequence
+
+from config.dish import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Словари тегов в порядке убывания частоты на povar.ru
+INGREDIENTS = [
+    'соль', 'сахар', 'яйцо куриное', 'мука пшеничная', 'масло растительное', 'лук репчатый',
+    'масло сливочное', 'перец черный молотый', 'чеснок', 'молоко', 'морковь', 'вода',
+    'сметана', 'сыр твердый', 'картофель', 'помидоры', 'зелень', 'куриное филе', 'майонез',
+    'разрыхлитель', 'сливки', 'лимон', 'творог', 'петрушка', 'укроп', 'рис', 'фарш мясной',
+    'кефир', 'ванилин', 'огурцы', 'перец болгарский', 'шампиньоны', 'говядина', 'свинина',
+    'капуста белокочанная', 'кабачки', 'баклажаны', 'тыква', 'макароны', 'гречка',
+    'мед', 'корица', 'какао', 'шоколад', 'орехи грецкие', 'изюм', 'яблоки', 'бананы',
+    'креветки', 'кальмары', 'лосось', 'треска', 'авокадо', 'шпинат', 'брокколи', 'фасоль',
+]
+MAIN_INGREDIENTS = [
+    'мясо', 'курица', 'овощи', 'картофель', 'рыба', 'грибы', 'творог', 'сыр', 'яйца',
+    'рис', 'макароны', 'фрукты', 'морепродукты', 'тыква', 'капуста', 'шоколад',
+]
+MEALS = [
+    'выпечка и десерты', 'вторые блюда', 'салаты', 'закуски', 'супы', 'завтраки',
+    'соусы', 'напитки', 'заготовки', 'гарниры',
+]
+DIETS = ['пп', 'вегетарианская', 'постная', 'для детей', 'низкокалорийная', 'безглютеновая']
+OCCASIONS = ['на скорую руку', 'праздничный стол', 'на ужин', 'на обед', 'на пикник', 'новый год']
+GEOGRAPHY = [
+    'русская', 'итальянская', 'украинская', 'французская', 'грузинская', 'японская',
+    'узбекская', 'китайская', 'мексиканская', 'американская',
+]
+DISHES = ['пирог', 'салат', 'суп', 'котлеты', 'запеканка', 'паста', 'каша', 'торт', 'блины', 'рагу']
+ACTIONS = ['Нарезать', 'Обжарить', 'Смешать', 'Отварить', 'Запечь', 'Посолить', 'Взбить', 'Потушить']
+AMOUNTS = ['1 шт.', '2 шт.', '100 г', '200 г', '300 г', '1 ст. л.', '2 ст. л.', '1 ч. л.', 'по вкусу', '250 мл']
+
+# Показатель распределения Ципфа для частот тегов
+ZIPF_S = 1.1
+
+def zipf_weights(n: int, s: float = ZIPF_S) -> List[float]:
+    """
+    Возвращает накопленные веса распределения Ципфа для n значений.
+    """
+    return list(accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+class TagSampler:
+    def __init__(self, values: Sequence[str], s: float = ZIPF_S):
+        """
+        Инициализирует выборку тегов с частотами по закону Ципфа.
+
+        Args:
+            values: Теги в порядке убывания частоты.
+            s: Показатель распределения.
+        """
+        self.values = list(values)
+        self.cum_weights = zipf_weights(len(self.values), s)
+
+    def sample(self, rng: random.Random, k: int) -> List[str]:
+        """
+        Выбирает до k различных тегов.
+        """
+        picked = rng.choices(self.values, cum_weights=self.cum_weights, k=k)
+        return list(dict.fromkeys(picked))
+
+SAMPLERS = {
+    'ingridients': TagSampler(INGREDIENTS),
+    'mainIngridients': TagSampler(MAIN_INGREDIENTS),
+    'meal': TagSampler(MEALS),
+    'diet': TagSampler(DIETS),
+    'occasions': TagSampler(OCCASIONS),
+    'geography': TagSampler(GEOGRAPHY),
+}
+
+def make_synthetic_recipe(idx: int, rng: random.Random) -> Recipe:
+    """
+    Создаёт синтетический рецепт с реалистичными распределениями тегов.
+
+    Args:
+        idx: Порядковый номер рецепта (id будет recipe_{idx}).
+        rng: Генератор случайных чисел.
+
+    Returns:
+        Объект Recipe с заполненными тегами, шагами, рейтингом и документом.
+    """
+    recipe = Recipe()
+    ingridients = SAMPLERS['ingridients'].sample(rng, rng.randint(3, 12))
+    main = SAMPLERS['mainIngridients'].sample(rng, rng.randint(1, 2))
+    recipe.id = f"recipe_{idx}"
+    recipe.name = f"{rng.choice(DISHES).capitalize()} {'с ' + main[0] if main else ''}".strip()
+    recipe.ingridients = [(ing, rng.choice(AMOUNTS), None) for ing in ingridients]
+    recipe.steps = [
+        f"{rng.choice(ACTIONS)} {rng.choice(ingridients)} и {rng.choice(ingridients)}"
+        for _ in range(rng.randint(2, 15))
+    ]
+    recipe.mainIngridients = main
+    recipe.meal = SAMPLERS['meal'].sample(rng, 1)
+    recipe.diet = SAMPLERS['diet'].sample(rng, rng.randint(0, 2)) or None
+    recipe.occasions = SAMPLERS['occasions'].sample(rng, rng.randint(0, 2)) or None
+    recipe.geography = SAMPLERS['geography'].sample(rng, 1) if rng.random() < 0.6 else None
+    recipe.add_tags()
+    recipe.ratingValue = round(rng.uniform(2.5, 5.0), 1)
+    recipe.ratingCount = float(int(rng.paretovariate(1.2)))
+    recipe.recipeYield = float(rng.choice([1, 2, 4, 6, 8]))
+    recipe.calories = str(rng.randint(50, 900))
+    minutes = rng.choice([10, 15, 20, 30, 40, 45, 60, 90, 120, 180, 300])
+    recipe.time = f"{minutes // 60} ч {minutes % 60} мин" if minutes >= 60 else f"{minutes} мин"
+    recipe.standardize_time()
+    recipe.make_document()
+    return recipe
+
+def make_synthetic_corpus(size: int, seed: int = 0) -> List[Recipe]:
+    """
+    Создаёт синтетический корпус рецептов заданного размера.
+
+    Args:
+        size: Количество рецептов.
+        seed: Зерно генератора случайных чисел.
+
+    Returns:
+        Список объектов Recipe.
+    """
+    rng = random.Random(seed)
+    recipes = [make_synthetic_recipe(idx, rng) for idx in range(size)]
+    logger.info(f"Generated synthetic corpus of {size} recipes")
+    return recipes
+
+def make_synthetic_queries(size: int, seed: int = 0) -> List[str]:
+    """
+    Создаёт синтетические запросы пользователей в стиле запросов из ai_chef_chat.
+
+    Args:
+        size: Количество запросов.
+        seed: Зерно генератора случайных чисел.
+
+    Returns:
+        Список запросов.
+    """
+    rng = random.Random(seed)
+    templates = [
+        lambda: f"Что можно приготовить из {rng.choice(INGREDIENTS)} и {rng.choice(INGREDIENTS)}?",
+        lambda: f"Как приготовить {rng.choice(DISHES)} с {SAMPLERS['mainIngridients'].sample(rng, 1)[0]}?",
+        lambda: f"Что приготовить {rng.choice(OCCASIONS)} за {rng.choice([15, 20, 30, 40])} минут?",
+        lambda: f"{rng.choice(GEOGRAPHY).capitalize()} кухня: {rng.choice(MEALS)}",
+        lambda: f"{rng.choice(DIETS).capitalize()} {rng.choice(DISHES)} до {rng.choice([200, 300, 400])} ккал",
+    ]
+    return [rng.choice(templates)() for _ in range(size)]
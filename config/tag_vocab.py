@@ -0,0 +1,344 @@
+import re
+import sys
+import threading
+import logging
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Слова, которые Recipe.clean_tags вырезает из тегов ('итальянская кухня' -> 'итальянская')
+TAG_STOP_WORDS = ('кухня', 'рецепты', 'питание', 'для', 'блюда')
+_TAG_STOP_RE = re.compile('|'.join(TAG_STOP_WORDS))
+# Дополнительные теги, которые Recipe.add_tags добавляет к существующим
+EXTRA_TAGS = {
+    'для детей': ('детский',),
+    'пп': ('полезный', 'здоровый'),
+    'на скорую руку': ('быстрый',),
+}
+# Группа тега, не попавшего в таблицу (редкий тег)
+NO_GROUP = -1
+
+def normalize_tag(tag: str) -> str:
+    """
+    Очищает тег за один проход скомпилированным выражением.
+    """
+    return _TAG_STOP_RE.sub('', tag).strip()
+
+class TagVocabulary:
+    def __init__(self):
+        """
+        Инициализирует словарь тегов: каждой строке тега один раз присваивается целый id.
+
+        Строки хранятся в словаре в одном экземпляре, а рецепты, таблица тегов и граф
+        ссылаются на них по id.
+        """
+        self.tags = []
+        self.ids = {}
+        self._normalized = {}
+        self._lowered = {}
+        self._extra = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def __getitem__(self, tag_id: int) -> str:
+        return self.tags[tag_id]
+
+    def get(self, tag: str) -> Optional[int]:
+        """
+        Возвращает id тега или None, если тега нет в словаре.
+        """
+        return self.ids.get(tag)
+
+    def intern(self, tag: str) -> int:
+        """
+        Возвращает id тега, добавляя его в словарь при первой встрече.
+        """
+        tag_id = self.ids.get(tag)
+        if tag_id is None:
+            with self._lock:
+                tag_id = self.ids.get(tag)
+                if tag_id is None:
+                    tag_id = len(self.tags)
+                    self.tags.append(tag)
+                    self.ids[tag] = tag_id
+        return tag_id
+
+    def encode(self, tags: Iterable[str]) -> List[int]:
+        return [self.intern(tag) for tag in tags]
+
+    def decode(self, ids: Iterable[int]) -> List[str]:
+        tags = self.tags
+        return [tags[tag_id] for tag_id in ids]
+
+    def normalized(self, tag_id: int) -> int:
+        """
+        Возвращает id очищенного тега (normalize_tag); очистка выполняется один раз на тег.
+        """
+        res = self._normalized.get(tag_id)
+        if res is None:
+            res = self._normalized[tag_id] = self.intern(normalize_tag(self.tags[tag_id]))
+        return res
+
+    def lowered(self, tag_id: int) -> int:
+        """
+        Возвращает id тега в нижнем регистре.
+        """
+        res = self._lowered.get(tag_id)
+        if res is None:
+            res = self._lowered[tag_id] = self.intern(self.tags[tag_id].lower())
+        return res
+
+    def extra(self) -> Dict[int, Tuple[int, ...]]:
+        """
+        EXTRA_TAGS в виде id.
+        """
+        if self._extra is None:
+            self._extra = {self.intern(tag): tuple(self.encode(extra)) for tag, extra in EXTRA_TAGS.items()}
+        return self._extra
+
+# Общий словарь процесса: рецепты и таблицы тегов при загрузке из pickle переводят теги в его id
+VOCAB = TagVocabulary()
+
+class TagListAttribute:
+    """
+    Атрибут Recipe со списком тегов, хранящийся как массив id словаря VOCAB.
+
+    Чтение возвращает новый список строк (изменения этого списка не сохраняются,
+    атрибут нужно присвоить заново), None хранится как None.
+    """
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+        self.key = f"_{name}_ids"
+
+    def __get__(self, obj: Any, owner: type = None) -> Any:
+        if obj is None:
+            return self
+        ids = obj.__dict__.get(self.key)
+        return None if ids is None else VOCAB.decode(ids)
+
+    def __set__(self, obj: Any, value: Optional[Iterable[str]]) -> None:
+        obj.__dict__[self.key] = None if value is None else array('I', VOCAB.encode(value))
+
+class IngredientsAttribute(TagListAttribute):
+    """
+    Атрибут Recipe со списком ингредиентов (название, количество, ...).
+
+    Названия хранятся как id словаря VOCAB (это теги графа), остальные поля —
+    кортежами интернированных строк: одинаковые количества ('по вкусу', '1 шт.')
+    разделяются всеми рецептами.
+    """
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        super().__set_name__(owner, name)
+        self.rest_key = f"_{name}_rest"
+
+    def __get__(self, obj: Any, owner: type = None) -> Any:
+        if obj is None:
+            return self
+        ids = obj.__dict__.get(self.key)
+        if ids is None:
+            return None
+        tags = VOCAB.tags
+        return [(tags[tag_id],) + rest for tag_id, rest in zip(ids, obj.__dict__[self.rest_key])]
+
+    def __set__(self, obj: Any, value: Optional[Iterable[Sequence[Optional[str]]]]) -> None:
+        if value is None:
+            obj.__dict__[self.key] = obj.__dict__[self.rest_key] = None
+            return
+        value = list(value)
+        obj.__dict__[self.key] = array('I', [VOCAB.intern(ing[0]) for ing in value])
+        obj.__dict__[self.rest_key] = tuple(
+            tuple(sys.intern(x) if isinstance(x, str) else x for x in ing[1:]) for ing in value
+        )
+
+def tag_ids(obj: Any, attr: str) -> Optional[array]:
+    """
+    Возвращает id тегов атрибута рецепта без перевода в строки.
+
+    Args:
+        obj: Объект Recipe (или объект с обычными списками тегов).
+        attr: Имя атрибута из ATTRIBUTES_ORDER.
+
+    Returns:
+        Массив id или None, если атрибут не задан.
+    """
+    key = f"_{attr}_ids"
+    if key in obj.__dict__:
+        return obj.__dict__[key]
+    value = getattr(obj, attr, None)
+    if value is None:
+        return None
+    if attr == 'ingridients':
+        value = [ing[0] for ing in value]
+    return array('I', VOCAB.encode(value))
+
+class TagTable:
+    def __init__(self, vocab: TagVocabulary = VOCAB):
+        """
+        Инициализирует таблицу отобранных тегов корпуса (замена словаря tags).
+
+        Для каждого отобранного тега хранятся частота и группа лемм: теги с одинаковой
+        леммой ('картофель', 'картофеля') попадают в одну группу, а id группы служит
+        ключом узла тега в графе знаний. Индекс слово леммы -> группы позволяет найти
+        подходящие запросу теги без перебора всех тегов.
+
+        Для совместимости таблица ведёт себя как словарь
+        {тег: {'stat': частота, 'lemma': лемма, 'node': id группы}}.
+
+        Args:
+            vocab: Словарь тегов.
+        """
+        self.vocab = vocab
+        self.order = []          # id тегов в порядке отбора (порядок применения в query_graph)
+        self.stat = {}           # id тега -> частота
+        self.group = {}          # id тега -> id группы
+        self.groups = []         # id группы -> лемма (кортеж слов)
+        self.group_rank = []     # id группы -> позиция первого тега группы в order
+        self.word_index = {}     # слово леммы -> список групп
+        self.empty_groups = []   # группы с пустой леммой: подходят к любому запросу
+
+    @classmethod
+    def from_counts(cls, counts: Dict[int, int], min_count: int = 10, vocab: TagVocabulary = VOCAB) -> 'TagTable':
+        """
+        Отбирает теги с частотой не ниже min_count.
+
+        Args:
+            counts: Частоты {id тега: число рецептов}, в порядке первой встречи.
+            min_count: Минимальная частота.
+            vocab: Словарь тегов.
+        """
+        table = cls(vocab)
+        for tag_id, count in counts.items():
+            if count >= min_count:
+                table.order.append(tag_id)
+                table.stat[tag_id] = count
+        return table
+
+    @classmethod
+    def from_dict(cls, tags: Dict[str, Any], vocab: TagVocabulary = VOCAB) -> 'TagTable':
+        """
+        Строит таблицу из словаря {тег: {'stat': частота, 'lemma': лемма}} старого формата.
+        """
+        table = cls(vocab)
+        group_of_lemma = {}
+        for rank, (tag, info) in enumerate(tags.items()):
+            tag_id = vocab.intern(tag)
+            table.order.append(tag_id)
+            table.stat[tag_id] = info['stat']
+            lemma = tuple(info['lemma'])
+            group = group_of_lemma.get(lemma)
+            if group is None:
+                group = group_of_lemma[lemma] = len(table.groups)
+                table.groups.append(lemma)
+                table.group_rank.append(rank)
+            table.group[tag_id] = group
+        table._index_words()
+        return table
+
+    def lemmatize(self, lemmatize_fn: Any) -> None:
+        """
+        Лемматизирует отобранные теги и группирует их по лемме.
+
+        Args:
+            lemmatize_fn: Функция строка -> список лемм.
+        """
+        group_of_lemma = {}
+        self.group = {}
+        self.groups = []
+        self.group_rank = []
+        for rank, tag_id in enumerate(self.order):
+            tag = self.vocab[tag_id]
+            if "(" in tag:
+                tag = re.sub(r'\([^)]*\)', '', tag).strip()
+            lemma = tuple(lemmatize_fn(tag))
+            group = group_of_lemma.get(lemma)
+            if group is None:
+                group = group_of_lemma[lemma] = len(self.groups)
+                self.groups.append(lemma)
+                self.group_rank.append(rank)
+            self.group[tag_id] = group
+        self._index_words()
+
+    def _index_words(self) -> None:
+        self.word_index = {}
+        self.empty_groups = []
+        for group, lemma in enumerate(self.groups):
+            if not lemma:
+                self.empty_groups.append(group)
+            for word in set(lemma):
+                self.word_index.setdefault(word, []).append(group)
+
+    def group_of(self, tag_id: int) -> int:
+        """
+        Возвращает группу тега или NO_GROUP, если тег не отобран.
+        """
+        return self.group.get(tag_id, NO_GROUP)
+
+    def match(self, lemmas: Iterable[str]) -> List[int]:
+        """
+        Возвращает группы, все слова леммы которых есть в запросе, в порядке применения.
+
+        Args:
+            lemmas: Леммы запроса.
+        """
+        words = set(lemmas)
+        candidates = set(self.empty_groups)
+        for word in words:
+            candidates.update(self.word_index.get(word, ()))
+        res = [group for group in candidates if words.issuperset(self.groups[group])]
+        res.sort(key=self.group_rank.__getitem__)
+        return res
+
+    def tags_of_group(self, group: int) -> List[str]:
+        return [self.vocab[tag_id] for tag_id in self.order if self.group.get(tag_id) == group]
+
+    # Интерфейс словаря {тег: {'stat', 'lemma', 'node'}}
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.vocab[tag_id] for tag_id in self.order)
+
+    def keys(self) -> List[str]:
+        return list(self)
+
+    def __contains__(self, tag: str) -> bool:
+        tag_id = self.vocab.get(tag)
+        return tag_id is not None and tag_id in self.stat
+
+    def __getitem__(self, tag: str) -> Dict[str, Any]:
+        tag_id = self.vocab.get(tag)
+        if tag_id is None or tag_id not in self.stat:
+            raise KeyError(tag)
+        group = self.group.get(tag_id, NO_GROUP)
+        return {
+            'stat': self.stat[tag_id],
+            'lemma': self.groups[group] if group != NO_GROUP else None,
+            'node': group,
+        }
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        return ((tag, self[tag]) for tag in self)
+
+    # При сохранении id заменяются строками: в другом процессе у тех же тегов другие id
+    def __getstate__(self) -> Dict[str, Any]:
+        return {
+            'order': self.vocab.decode(self.order),
+            'stat': [self.stat[tag_id] for tag_id in self.order],
+            'group': [self.group.get(tag_id, NO_GROUP) for tag_id in self.order],
+            'groups': self.groups,
+            'group_rank': self.group_rank,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.vocab = VOCAB
+        self.order = VOCAB.encode(state['order'])
+        self.stat = dict(zip(self.order, state['stat']))
+        self.group = {tag_id: group for tag_id, group in zip(self.order, state['group']) if group != NO_GROUP}
+        self.groups = state['groups']
+        self.group_rank = state['group_rank']
+        self._index_words()
@@ -1,20 +1,103 @@
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Iterable, Dict, Any
+import hashlib
+import uuid
+import numpy as np
+import chromadb
 from langchain_core.documents import Document
 from langchain_community.vectorstores import Chroma
-from sentence_transformers import SentenceTransformer
+from langchain_community.embeddings import HuggingFaceEmbeddings
 from transformers import AutoTokenizer
 import logging
 import os
+from config.metrics import span
 
 logger = logging.getLogger(__name__)
 
-def build_chroma_db(recipes_list: List['Recipe'], model_name: str = "all-MiniLM-L6-v2") -> Tuple[Optional[Chroma], Optional[AutoTokenizer]]:
+# До этого числа кандидатов дешевле достать их векторы и посчитать расстояния
+# одним матричным умножением; для больших множеств используем фильтр Chroma.
+SUBSET_MATMUL_MAX = 2000
+
+COLLECTION_NAME = "recipes_collection"
+PERSIST_DIRECTORY = "./chroma_db"
+# Файл в persist_directory с именем коллекции, которую сейчас читают клиенты
+ACTIVE_COLLECTION_FILE = "active_collection"
+SYNC_BATCH_SIZE = 1000
+
+def load_embedding_function(model_name: str) -> HuggingFaceEmbeddings:
+    """
+    Загружает модель эмбеддингов в обёртке LangChain.
+
+    Args:
+        model_name: Название модели SentenceTransformer.
+
+    Returns:
+        Объект эмбеддингов с методами embed_documents/embed_query.
+    """
+    logger.info(f"Loading SentenceTransformer: {model_name}")
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+def content_hash(document: Document) -> str:
+    """
+    Считает хэш содержимого документа для инкрементальной синхронизации.
+
+    Args:
+        document: Документ рецепта.
+
+    Returns:
+        Шестнадцатеричный SHA-1 от текста и метаданных документа.
+    """
+    h = hashlib.sha1(document.page_content.encode('utf-8'))
+    for key in sorted(document.metadata):
+        if key != 'content_hash':
+            h.update(f"\x00{key}={document.metadata[key]}".encode('utf-8'))
+    return h.hexdigest()
+
+def with_content_hash(document: Document) -> Document:
+    """
+    Возвращает копию документа с хэшем содержимого в метаданных.
+
+    Args:
+        document: Документ рецепта.
+
+    Returns:
+        Документ с полем metadata['content_hash'].
+    """
+    metadata = dict(document.metadata)
+    metadata['content_hash'] = content_hash(document)
+    return Document(page_content=document.page_content, metadata=metadata)
+
+def make_documents(recipes_list: List['Recipe'], tokenizer: Optional[AutoTokenizer] = None,
+                   max_tokens: Optional[int] = None) -> List[Document]:
+    """
+    Собирает документы рецептов для векторного хранилища.
+
+    Args:
+        recipes_list: Список объектов Recipe.
+        tokenizer: Токенизатор эмбеддера; если задан, документы пересобираются в пределах бюджета токенов.
+        max_tokens: Бюджет токенов документа (по умолчанию из токенизатора).
+
+    Returns:
+        Список документов с хэшем содержимого в метаданных.
+    """
+    documents = []
+    for recipe in recipes_list:
+        if tokenizer is not None and getattr(recipe, 'id', None) is not None:
+            recipe.make_document(tokenizer=tokenizer, max_tokens=max_tokens)
+        if hasattr(recipe, 'document') and recipe.document is not None:
+            documents.append(with_content_hash(recipe.document))
+    return documents
+
+def build_chroma_db(recipes_list: List['Recipe'], model_name: str = "all-MiniLM-L6-v2",
+                    persist_directory: str = PERSIST_DIRECTORY,
+                    budgeted: bool = False) -> Tuple[Optional[Chroma], Optional[AutoTokenizer]]:
     """
     Создаёт векторное хранилище для списка рецептов.
 
     Args:
         recipes_list: Список объектов Recipe.
         model_name: Название модели для эмбеддингов (например, 'all-MiniLM-L6-v2' или 'ai-forever/sbert_large_nlu_ru').
+        persist_directory: Папка для хранения ChromaDB.
+        budgeted: Собирать ли документы в пределах бюджета токенов эмбеддера (см. Recipe.make_str_recipe_db).
 
     Returns:
         Кортеж (vector_store, tokenizer) или (None, None) в случае ошибки.
@@ -25,30 +108,31 @@ def build_chroma_db(recipes_list: List['Recipe'], model_name: str = "all-MiniLM-
 
     try:
         # Инициализируем модель SentenceTransformer
-        logger.info(f"Loading SentenceTransformer: {model_name}")
-        embedding_function = SentenceTransformer(model_name)
+        embedding_function = load_embedding_function(model_name)
         logger.info(f"Loaded embedding function: {model_name}")
 
+        # Загружаем токенизатор
+        logger.info(f"Loading tokenizer for {model_name}")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        logger.info(f"Loaded tokenizer for {model_name}")
+
         # Создаём документы для ChromaDB
-        documents = [recipe.document for recipe in recipes_list if hasattr(recipe, 'document') and recipe.document is not None]
+        documents = make_documents(recipes_list, tokenizer=tokenizer if budgeted else None)
         if not documents:
             logger.error("No valid documents found in recipes")
             return None, None
 
         # Инициализируем ChromaDB
-        logger.info("Creating ChromaDB collection: recipes_collection")
+        logger.info(f"Creating ChromaDB collection: {COLLECTION_NAME}")
         vector_store = Chroma.from_documents(
             documents=documents,
             embedding=embedding_function,
-            collection_name="recipes_collection",
-            persist_directory="./chroma_db"
+            ids=[document.metadata['id'] for document in documents],
+            collection_name=COLLECTION_NAME,
+            persist_directory=persist_directory
         )
-        logger.info(f"Created ChromaDB collection: recipes_collection")
-
-        # Загружаем токенизатор
-        logger.info(f"Loading tokenizer for {model_name}")
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        logger.info(f"Loaded tokenizer for {model_name}")
+        set_active_collection_name(persist_directory, COLLECTION_NAME)
+        logger.info(f"Created ChromaDB collection: {COLLECTION_NAME}")
 
         # Сохраняем векторное хранилище
         vector_store.persist()
@@ -59,23 +143,303 @@ def build_chroma_db(recipes_list: List['Recipe'], model_name: str = "all-MiniLM-
         logger.error(f"Error creating vector store: {e}")
         return None, None
 
-def request_chroma_db(vector_store: Chroma, query: str, tokenizer: AutoTokenizer, top_k: int = 5) -> List[Document]:
+def get_active_collection_name(persist_directory: str = PERSIST_DIRECTORY) -> str:
+    """
+    Возвращает имя коллекции, которую сейчас должны читать клиенты.
+
+    Args:
+        persist_directory: Папка ChromaDB.
+
+    Returns:
+        Имя активной коллекции (COLLECTION_NAME, если указатель ещё не создан).
+    """
+    path = os.path.join(persist_directory, ACTIVE_COLLECTION_FILE)
+    if not os.path.exists(path):
+        return COLLECTION_NAME
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip() or COLLECTION_NAME
+
+def set_active_collection_name(persist_directory: str, collection_name: str) -> None:
+    """
+    Атомарно переключает указатель активной коллекции.
+
+    Args:
+        persist_directory: Папка ChromaDB.
+        collection_name: Имя новой активной коллекции.
+    """
+    os.makedirs(persist_directory, exist_ok=True)
+    path = os.path.join(persist_directory, ACTIVE_COLLECTION_FILE)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(collection_name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def open_chroma_db(model_name: str = "all-MiniLM-L6-v2", persist_directory: str = PERSIST_DIRECTORY,
+                   embedding_function: Optional[Any] = None, collection_name: Optional[str] = None) -> Chroma:
+    """
+    Открывает активную коллекцию рецептов для чтения.
+
+    Args:
+        model_name: Название модели для эмбеддингов.
+        persist_directory: Папка ChromaDB.
+        embedding_function: Уже загруженная модель эмбеддингов (иначе загружается по model_name).
+        collection_name: Конкретная коллекция (по умолчанию активная).
+
+    Returns:
+        Векторное хранилище Chroma.
+    """
+    if embedding_function is None:
+        embedding_function = load_embedding_function(model_name)
+    return Chroma(
+        client=chromadb.PersistentClient(path=persist_directory),
+        collection_name=collection_name or get_active_collection_name(persist_directory),
+        embedding_function=embedding_function
+    )
+
+def _collection_hashes(client: Any, collection_name: str) -> Optional[Dict[str, str]]:
+    """
+    Читает идентификаторы и хэши содержимого из коллекции.
+
+    Returns:
+        Словарь {id: content_hash} или None, если коллекции нет.
+    """
+    try:
+        collection = client.get_collection(collection_name)
+    except Exception:
+        return None
+    data = collection.get(include=['metadatas'])
+    return {
+        id_: (metadata or {}).get('content_hash', '')
+        for id_, metadata in zip(data['ids'], data['metadatas'])
+    }
+
+def drop_stale_collections(client: Any, keep: Iterable[Optional[str]]) -> List[str]:
+    """
+    Удаляет коллекции рецептов (COLLECTION_NAME и теневые COLLECTION_NAME_*), кроме keep.
+
+    Args:
+        client: Клиент ChromaDB.
+        keep: Имена коллекций, которые нужно сохранить (активная и предыдущая).
+
+    Returns:
+        Имена удалённых коллекций.
+    """
+    keep = {name for name in keep if name}
+    dropped = []
+    for collection in client.list_collections():
+        # chromadb < 0.6 возвращает объекты коллекций, новые версии — имена
+        name = getattr(collection, 'name', collection)
+        if name in keep or not (name == COLLECTION_NAME or name.startswith(f"{COLLECTION_NAME}_")):
+            continue
+        try:
+            client.delete_collection(name)
+            dropped.append(name)
+            logger.info(f"Dropped stale collection: {name}")
+        except Exception as e:
+            logger.warning(f"Could not drop stale collection {name}: {e}")
+    return dropped
+
+def sync_chroma_db(recipes_list: List['Recipe'], model_name: str = "all-MiniLM-L6-v2",
+                   persist_directory: str = PERSIST_DIRECTORY, drop_stale: bool = True,
+                   batch_size: int = SYNC_BATCH_SIZE, budgeted: bool = False) -> Tuple[Optional[Chroma], Dict[str, int]]:
+    """
+    Инкрементально синхронизирует векторное хранилище со списком рецептов.
+
+    Сравнивает id и хэши содержимого рецептов с активной коллекцией. Неизменённые
+    векторы копируются в теневую коллекцию без пересчёта эмбеддингов, изменённые
+    и новые рецепты кодируются заново, удалённые не переносятся. После заполнения
+    теневая коллекция становится активной атомарной заменой указателя, так что
+    читатели видят либо старое, либо новое состояние целиком. Предыдущая коллекция
+    сохраняется до следующей синхронизации, чтобы уже открывшие её читатели не падали.
+
+    Args:
+        recipes_list: Список объектов Recipe.
+        model_name: Название модели для эмбеддингов.
+        persist_directory: Папка ChromaDB.
+        drop_stale: Удалять ли устаревшие коллекции после переключения. Предыдущая активная
+            коллекция не удаляется до следующей синхронизации: читатели (воркеры сервера),
+            открывшие её до переключения, дочитывают запросы; удаляются только коллекции
+            рецептов старше неё.
+        batch_size: Размер пакета при копировании и добавлении документов.
+        budgeted: Собирать ли документы в пределах бюджета токенов эмбеддера.
+
+    Returns:
+        Кортеж (vector_store, stats), где stats содержит число добавленных/обновлённых,
+        удалённых и неизменённых рецептов. При ошибке vector_store равен None.
+    """
+    stats = {'upserted': 0, 'deleted': 0, 'unchanged': 0}
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(model_name) if budgeted else None
+        documents = {
+            document.metadata['id']: document
+            for document in make_documents(recipes_list, tokenizer=tokenizer)
+        }
+        client = chromadb.PersistentClient(path=persist_directory)
+        embedding_function = load_embedding_function(model_name)
+        active_name = get_active_collection_name(persist_directory)
+        existing = _collection_hashes(client, active_name)
+        if existing is None:
+            existing = {}
+            active_name = None
+
+        to_upsert = [id_ for id_, doc in documents.items() if existing.get(id_) != doc.metadata['content_hash']]
+        to_delete = [id_ for id_ in existing if id_ not in documents]
+        upsert_set = set(to_upsert)
+        unchanged = [id_ for id_ in documents if id_ in existing and id_ not in upsert_set]
+        stats = {'upserted': len(to_upsert), 'deleted': len(to_delete), 'unchanged': len(unchanged)}
+        logger.info(f"Vector store diff: {stats}")
+
+        if active_name is not None and not to_upsert and not to_delete:
+            logger.info("Vector store is up to date")
+            return open_chroma_db(persist_directory=persist_directory, embedding_function=embedding_function), stats
+
+        # Заполняем теневую коллекцию
+        shadow_name = f"{COLLECTION_NAME}_{uuid.uuid4().hex[:8]}"
+        logger.info(f"Filling shadow collection: {shadow_name}")
+        shadow = Chroma(client=client, collection_name=shadow_name, embedding_function=embedding_function)
+
+        if unchanged:
+            source = client.get_collection(active_name)
+            for i in range(0, len(unchanged), batch_size):
+                batch = source.get(ids=unchanged[i:i + batch_size], include=['embeddings', 'documents', 'metadatas'])
+                shadow._collection.add(
+                    ids=batch['ids'],
+                    embeddings=batch['embeddings'],
+                    documents=batch['documents'],
+                    metadatas=batch['metadatas']
+                )
+        for i in range(0, len(to_upsert), batch_size):
+            batch_ids = to_upsert[i:i + batch_size]
+            shadow.add_documents([documents[id_] for id_ in batch_ids], ids=batch_ids)
+
+        # Переключаем читателей на новую коллекцию
+        set_active_collection_name(persist_directory, shadow_name)
+        logger.info(f"Active collection switched: {active_name} -> {shadow_name}")
+        if drop_stale:
+            drop_stale_collections(client, keep=(shadow_name, active_name))
+        return shadow, stats
+
+    except Exception as e:
+        logger.error(f"Error syncing vector store: {e}")
+        return None, stats
+
+def embed_query(vector_store: Chroma, query: str) -> np.ndarray:
+    """
+    Вычисляет эмбеддинг запроса той же моделью, что использует хранилище.
+
+    Args:
+        vector_store: Векторное хранилище Chroma.
+        query: Текстовый запрос.
+
+    Returns:
+        Вектор запроса.
+    """
+    embedding = vector_store.embeddings
+    if hasattr(embedding, 'embed_query'):
+        return np.asarray(embedding.embed_query(query), dtype=np.float32)
+    return np.asarray(embedding.encode(query), dtype=np.float32)
+
+def request_chroma_db_subset(vector_store: Chroma, query: str, allowed_ids: List[str], top_k: int = 5) -> List[Document]:
+    """
+    Ранжирует только векторы рецептов-кандидатов одним матричным умножением.
+
+    Args:
+        vector_store: Векторное хранилище Chroma.
+        query: Текстовый запрос.
+        allowed_ids: Идентификаторы рецептов-кандидатов.
+        top_k: Количество возвращаемых результатов.
+
+    Returns:
+        Список документов, отсортированных по L2-расстоянию до запроса.
+    """
+    data = vector_store.get(
+        where={'id': {'$in': allowed_ids}},
+        include=['embeddings', 'metadatas', 'documents']
+    )
+    if data['embeddings'] is None or len(data['embeddings']) == 0:
+        return []
+
+    vectors = np.asarray(data['embeddings'], dtype=np.float32)
+    query_vector = embed_query(vector_store, query)
+    # Квадрат L2-расстояния, как в пространстве коллекции Chroma по умолчанию
+    distances = (vectors * vectors).sum(axis=1) - 2 * vectors @ query_vector
+    k = min(top_k, len(distances))
+    top = np.argpartition(distances, k - 1)[:k]
+    top = top[np.argsort(distances[top])]
+    return [
+        Document(page_content=data['documents'][i], metadata=data['metadatas'][i])
+        for i in top
+    ]
+
+def request_chroma_db(vector_store: Chroma, query: str, tokenizer: AutoTokenizer, top_k: int = 5,
+                      allowed_ids: Optional[Iterable[str]] = None) -> List[Document]:
     """
     Выполняет запрос к векторному хранилищу.
 
+    Если передан allowed_ids (например, ответ графа знаний из RecipesProject.invoke),
+    ранжируются только эти рецепты: небольшое множество считается напрямую
+    матричным умножением, большое — через фильтр по метаданным Chroma.
+
     Args:
         vector_store: Векторное хранилище Chroma.
         query: Текстовый запрос.
         tokenizer: Токенизатор для обработки запроса.
         top_k: Количество возвращаемых результатов.
+        allowed_ids: Идентификаторы рецептов, среди которых ведётся поиск (по умолчанию вся коллекция).
 
     Returns:
         Список документов, наиболее релевантных запросу.
     """
     try:
-        results = vector_store.similarity_search(query, k=top_k)
+        if allowed_ids is not None:
+            allowed_ids = list(allowed_ids)
+            if not allowed_ids:
+                return []
+            with span('vector_search'):
+                if len(allowed_ids) <= SUBSET_MATMUL_MAX:
+                    results = request_chroma_db_subset(vector_store, query, allowed_ids, top_k=top_k)
+                else:
+                    results = vector_store.similarity_search(query, k=top_k, filter={'id': {'$in': allowed_ids}})
+            logger.info(f"Retrieved {len(results)} results among {len(allowed_ids)} candidates for query: {query}")
+            return results
+        with span('vector_search'):
+            results = vector_store.similarity_search(query, k=top_k)
         logger.info(f"Retrieved {len(results)} results for query: {query}")
         return results
     except Exception as e:
         logger.error(f"Error querying vector store: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def evaluate_retrieval(vector_store: Chroma, tokenizer: AutoTokenizer, queries: Dict[str, List[str]],
+                       top_k: int = 5) -> Dict[str, float]:
+    """
+    Оценивает качество поиска на фиксированном наборе запросов.
+
+    Позволяет сравнить режимы сборки документов (полный текст и бюджет токенов)
+    на одних и тех же запросах.
+
+    Args:
+        vector_store: Векторное хранилище Chroma.
+        tokenizer: Токенизатор для обработки запроса.
+        queries: Словарь {запрос: список id релевантных рецептов}.
+        top_k: Глубина поиска.
+
+    Returns:
+        Словарь со средними recall@k и MRR по запросам.
+    """
+    recall = mrr = 0.0
+    for query, relevant in queries.items():
+        relevant = set(relevant)
+        found = [doc.metadata['id'] for doc in request_chroma_db(vector_store, query, tokenizer, top_k=top_k)]
+        if relevant:
+            recall += len(relevant.intersection(found)) / len(relevant)
+        for rank, id_ in enumerate(found, start=1):
+            if id_ in relevant:
+                mrr += 1 / rank
+                break
+    n = max(len(queries), 1)
+    res = {f'recall@{top_k}': recall / n, 'mrr': mrr / n}
+    logger.info(f"Retrieval quality on {len(queries)} queries: {res}")
+    return res
@@ -0,0 +1,193 @@
+import sys
+import os
+import json
+import time
+import argparse
+import platform
+import statistics
+import random
+import tempfile
+import logging
+from pathlib import Path
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Добавляем корень проекта в Python path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.append(str(project_root))
+
+from config.helpers import read_pkl, save_pkl, filter_recipe
+from config.food_graph import (
+    make_tags_list, lemmatize_tags, build_knowledge_graph, lemmatize,
+    make_one_word_tags_list, enreach_query_with_relative_tags, query_graph
+)
+from config.synthetic_corpus import make_synthetic_corpus, make_synthetic_queries
+
+BASELINE_FILE = os.path.join(project_root, "benchmarks", "baseline.json")
+DEFAULT_SIZES = [1000, 10000]
+# Допустимое замедление относительно базовой линии (0.2 = +20%)
+DEFAULT_TOLERANCE = 0.2
+N_QUERIES = 20
+# Кандидатов в поиске с фильтром по id (ответ графа знаний)
+N_CANDIDATES = 500
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+def time_call(fn, repeat=3):
+    """
+    Замеряет время вызова функции.
+
+    Args:
+        fn: Функция без аргументов.
+        repeat: Количество повторов.
+
+    Returns:
+        Словарь с медианой и минимумом в секундах.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {'median': statistics.median(times), 'min': min(times), 'repeat': repeat}
+
+def run_benchmarks(size, repeat=3, seed=0, model_name=DEFAULT_MODEL_NAME):
+    """
+    Замеряет этапы пайплайна на синтетическом корпусе заданного размера.
+
+    Args:
+        size: Количество рецептов.
+        repeat: Количество повторов каждого замера.
+        seed: Зерно генератора.
+        model_name: Модель эмбеддингов временной коллекции Chroma; None — без векторного поиска.
+
+    Returns:
+        Словарь {этап: результат time_call}.
+    """
+    logger.info(f"Benchmarking corpus of {size} recipes")
+    recipes = make_synthetic_corpus(size, seed=seed)
+    queries = make_synthetic_queries(N_QUERIES, seed=seed)
+    res = {}
+
+    res['lemmatize'] = time_call(lambda: [lemmatize(q) for q in queries], repeat)
+
+    tags = make_tags_list(recipes)
+    lemmatize_tags(tags)
+    one_word_tags = make_one_word_tags_list(tags)
+    res['enreach_query_with_relative_tags'] = time_call(
+        lambda: [enreach_query_with_relative_tags(q, one_word_tags) for q in queries], repeat
+    )
+
+    res['build_knowledge_graph'] = time_call(lambda: build_knowledge_graph(recipes, tags), repeat)
+    graph = build_knowledge_graph(recipes, tags)
+    res['query_graph'] = time_call(lambda: [query_graph(q, graph, tags) for q in queries], repeat)
+
+    res['filter_recipe'] = time_call(
+        lambda: filter_recipe(recipes, max_steps=20, max_min=240, min_rating=3, min_votes=1), repeat
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "recipes.pickle")
+        res['pickle_save'] = time_call(lambda: save_pkl(recipes, path), repeat)
+        res['pickle_load'] = time_call(lambda: read_pkl(path), repeat)
+
+        # Векторный поиск: временная коллекция Chroma из синтетического корпуса,
+        # запросы через request_chroma_db — по всей коллекции и среди кандидатов
+        if model_name:
+            from config.vector_db import sync_chroma_db, request_chroma_db
+            chroma_dir = os.path.join(tmp_dir, "chroma_db")
+            start = time.perf_counter()
+            vector_store, _ = sync_chroma_db(recipes, model_name=model_name, persist_directory=chroma_dir)
+            if vector_store is None:
+                raise RuntimeError(f"Could not build Chroma collection with {model_name}")
+            logger.info(f"Built Chroma collection of {size} recipes in {time.perf_counter() - start:.1f} s")
+            candidates = [recipe.id for recipe in random.Random(seed).sample(recipes, min(size, N_CANDIDATES))]
+            res['vector_search'] = time_call(
+                lambda: [request_chroma_db(vector_store, q, None, top_k=5) for q in queries], repeat
+            )
+            res['vector_search_candidates'] = time_call(
+                lambda: [request_chroma_db(vector_store, q, None, top_k=5, allowed_ids=candidates) for q in queries],
+                repeat
+            )
+    return res
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Сравнивает результаты с базовой линией.
+
+    Args:
+        results: Текущие результаты {размер: {этап: замер}}.
+        baseline: Результаты базовой линии в том же формате.
+        tolerance: Допустимое относительное замедление.
+
+    Returns:
+        Список регрессий: (размер, этап, базовое время, текущее время).
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, measurement in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if base is None:
+                continue
+            if measurement['median'] > base['median'] * (1 + tolerance):
+                regressions.append((size, stage, base['median'], measurement['median']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки пайплайна на синтетическом корпусе")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Размеры корпусов (1000 - 1000000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Количество повторов замера")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+    parser.add_argument("--model-name", default=DEFAULT_MODEL_NAME, help="Модель эмбеддингов для векторного поиска")
+    parser.add_argument("--no-vector-search", action="store_true", help="Не замерять векторный поиск (без Chroma)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Файл базовой линии")
+    parser.add_argument("--output", default=None, help="Куда записать результаты (по умолчанию не записывать)")
+    parser.add_argument("--update-baseline", action="store_true", help="Перезаписать базовую линию результатами")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Допустимое замедление")
+    args = parser.parse_args()
+
+    model_name = None if args.no_vector_search else args.model_name
+    results = {
+        str(size): run_benchmarks(size, repeat=args.repeat, seed=args.seed, model_name=model_name)
+        for size in args.sizes
+    }
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'model_name': model_name,
+        },
+        'results': results,
+    }
+    for size, stages in results.items():
+        for stage, measurement in stages.items():
+            logger.info(f"{size:>8} {stage:<35} {measurement['median'] * 1000:10.2f} ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logger.info(f"Results saved to {args.output}")
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logger.info(f"Baseline saved to {args.baseline}")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, tolerance=args.tolerance)
+    for size, stage, base, current in regressions:
+        logger.error(f"Regression: {stage} on {size} recipes: {base * 1000:.2f} ms -> {current * 1000:.2f} ms")
+    if regressions:
+        return 1
+    logger.info("No regressions against baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
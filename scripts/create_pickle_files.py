@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 from pathlib import Path
 import logging
 from typing import List
@@ -10,6 +11,7 @@ project_root = Path(__file__).resolve().parents[2]  # На два уровня 
 sys.path.append("/content/drive/MyDrive/llm_kaggle/llm_kaggle")
 
 from config.helpers import make_data_set, make_recipes, save_pkl
+from config.dedup import dedup_recipes
 from config.dish import Recipe
 
 # Настройка логирования
@@ -69,6 +71,12 @@ def create_pickle_files(html_dir: str, output_dir: str, file_prefix: str, chunk_
             logger.error("No Recipe objects created")
             return
 
+        # Удаляем почти одинаковые рецепты, группы дубликатов сохраняем рядом с .pickle
+        recipes_list, clusters = dedup_recipes(recipes_list)
+        with open(os.path.join(output_dir, "duplicates.json"), 'w', encoding='utf-8') as f:
+            json.dump(clusters, f, ensure_ascii=False, indent=1)
+        logger.info(f"{len(recipes_list)} recipes left after removing {len(clusters)} duplicate groups")
+
         # Разбиваем рецепты на части и сохраняем в .pickle файлы
         logger.info(f"Saving recipes to .pickle files with chunk size {chunk_size}...")
         for i in range(0, len(recipes_list), chunk_size):
@@ -0,0 +1,70 @@
+import sys
+import os
+import json
+import argparse
+import logging
+from pathlib import Path
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Добавляем корень проекта в Python path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.append(str(project_root))
+
+from config.helpers import read_pkl
+from config.dish import RecipesProject
+from config.vector_db import open_chroma_db, PERSIST_DIRECTORY
+from config.model_loader import build_model, MODEL_NAME
+from config.evaluation import (
+    EvaluationRunner, load_eval_set, EVAL_CACHE_PATH, EVAL_CONCURRENCY, METRICS_BATCH_SIZE
+)
+
+DATA_DIR = "/content/drive/MyDrive/llm_kaggle/llm_kaggle/dataset"
+
+def load_project(data_dir, persist_directory):
+    """
+    Собирает RecipesProject из сохранённых пайплайном файлов.
+    """
+    return RecipesProject(
+        recipes=read_pkl(os.path.join(data_dir, "recipes.pickle")),
+        knowledgeGraph=read_pkl(os.path.join(data_dir, "knowledgeGraph.pickle")),
+        tags=read_pkl(os.path.join(data_dir, "tags.pickle")),
+        vectorStore=open_chroma_db(persist_directory=persist_directory),
+        oneWordTags=read_pkl(os.path.join(data_dir, "oneWordTags.pickle"))
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-оценка качества и задержек ассистента")
+    parser.add_argument("eval_set", help="JSON/JSONL с полями query и reference")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Папка с файлами проекта")
+    parser.add_argument("--persist-directory", default=PERSIST_DIRECTORY, help="Папка ChromaDB")
+    parser.add_argument("--model", default=MODEL_NAME, help="Модель Ollama")
+    parser.add_argument("--cache", default=EVAL_CACHE_PATH, help="Файл кэша оценки")
+    parser.add_argument("--concurrency", type=int, default=EVAL_CONCURRENCY, help="Число одновременных поисков и генераций")
+    parser.add_argument("--batch-size", type=int, default=METRICS_BATCH_SIZE, help="Размер пакета метрик")
+    parser.add_argument("--retrieval-version", default="v1", help="Метка версии кода поиска (смена данных учитывается автоматически)")
+    parser.add_argument("--output", default="eval_report.json", help="Куда записать отчёт")
+    args = parser.parse_args()
+
+    items = load_eval_set(args.eval_set)
+    runner = EvaluationRunner(
+        load_project(args.data_dir, args.persist_directory),
+        build_model(args.model),
+        cache_path=args.cache,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        retrieval_version=args.retrieval_version
+    )
+    report = runner.run(items)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    for system, summary in report['summary'].items():
+        logger.info(f"{system}: " + ", ".join(f"{key}={value:.4f}" for key, value in summary.items()))
+    logger.info(f"Report saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
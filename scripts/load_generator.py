@@ -0,0 +1,121 @@
+import sys
+import os
+import json
+import argparse
+import logging
+from pathlib import Path
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Добавляем корень проекта в Python path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.append(str(project_root))
+
+from config import metrics
+from config.helpers import read_pkl
+from config.dish import RecipesProject
+from config.food_graph import make_tags_list, lemmatize_tags, build_knowledge_graph, make_one_word_tags_list
+from config.synthetic_corpus import make_synthetic_corpus, make_synthetic_queries
+from config.load_generator import (
+    LoadGenerator, MockLLM, load_sessions, saturation_point, MOCK_LLM_LATENCY, MOCK_LLM_SLOTS
+)
+
+def synthetic_project(size, seed=0):
+    """
+    Собирает RecipesProject на синтетическом корпусе (без векторного хранилища).
+    """
+    recipes = make_synthetic_corpus(size, seed=seed)
+    tags = make_tags_list(recipes)
+    lemmatize_tags(tags)
+    return RecipesProject(
+        recipes=recipes,
+        knowledgeGraph=build_knowledge_graph(recipes, tags),
+        tags=tags,
+        oneWordTags=make_one_word_tags_list(tags)
+    )
+
+def saved_project(data_dir, persist_directory=None):
+    """
+    Собирает RecipesProject из файлов пайплайна; векторное хранилище подключается, если задано.
+    """
+    vector_store = None
+    if persist_directory:
+        from config.vector_db import open_chroma_db
+        vector_store = open_chroma_db(persist_directory=persist_directory)
+    return RecipesProject(
+        recipes=read_pkl(os.path.join(data_dir, "recipes.pickle")),
+        knowledgeGraph=read_pkl(os.path.join(data_dir, "knowledgeGraph.pickle")),
+        tags=read_pkl(os.path.join(data_dir, "tags.pickle")),
+        vectorStore=vector_store,
+        oneWordTags=read_pkl(os.path.join(data_dir, "oneWordTags.pickle"))
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочное тестирование ассистента с заглушкой LLM")
+    parser.add_argument("--mode", choices=["open", "closed"], default="closed", help="Модель нагрузки")
+    parser.add_argument("--rates", type=float, nargs="+", default=[0.5, 1, 2, 4, 8], help="Интенсивности для open, запросов/с")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Числа пользователей для closed")
+    parser.add_argument("--duration", type=float, default=30, help="Длительность уровня, секунды")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Пауза пользователя в closed, секунды")
+    parser.add_argument("--sessions", default=None, help="JSON/JSONL с диалогами или log.pickle")
+    parser.add_argument("--requests", default=None, help="JSON со списком диалогов для log.pickle")
+    parser.add_argument("--data-dir", default=None, help="Папка с файлами проекта (иначе синтетический корпус)")
+    parser.add_argument("--persist-directory", default=None, help="Папка ChromaDB для векторного поиска")
+    parser.add_argument("--synthetic", type=int, default=10000, help="Размер синтетического корпуса")
+    parser.add_argument("--llm-latency", type=float, default=MOCK_LLM_LATENCY, help="Задержка заглушки LLM, секунды")
+    parser.add_argument("--llm-slots", type=int, default=MOCK_LLM_SLOTS, help="Параллельность заглушки LLM")
+    parser.add_argument("--time-scale", type=float, default=0.01, help="Множитель задержек LLM")
+    parser.add_argument("--slo", type=float, default=None, help="Допустимый p99 полной задержки, секунды")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+    parser.add_argument("--output", default=None, help="Куда записать отчёт")
+    args = parser.parse_args()
+
+    if args.data_dir:
+        project = saved_project(args.data_dir, args.persist_directory)
+    else:
+        project = synthetic_project(args.synthetic, seed=args.seed)
+
+    if args.sessions:
+        requests = None
+        if args.requests:
+            with open(args.requests, 'r', encoding='utf-8') as f:
+                requests = json.load(f)
+        sessions = load_sessions(args.sessions, requests)
+    else:
+        sessions = [[{'query': q, 'llm_latency': None}] for q in make_synthetic_queries(200, seed=args.seed)]
+
+    metrics.enable()
+    generator = LoadGenerator(
+        project,
+        MockLLM(latency=args.llm_latency, slots=args.llm_slots, time_scale=args.time_scale, seed=args.seed)
+    )
+    if args.mode == "open":
+        queries = [item for session in sessions for item in session]
+        levels = [generator.run_open_loop(queries, rate, args.duration, seed=args.seed) for rate in args.rates]
+    else:
+        levels = [generator.run_closed_loop(sessions, users, args.duration, args.think_time) for users in args.users]
+
+    saturation = saturation_point(levels, slo=args.slo)
+    for level in levels:
+        load = f"{level['rate']} rps" if level['mode'] == 'open' else f"{level['users']} users"
+        stages = ", ".join(
+            f"{stage} {value['p50'] * 1000:.1f}/{value['p99'] * 1000:.1f} ms"
+            for stage, value in level['stages'].items()
+        )
+        logger.info(f"{load:>12}: {level['throughput']:.2f} rps, p50/p99: {stages}")
+    if saturation is None:
+        logger.info("Saturation point not reached")
+    else:
+        logger.info(f"Saturation point: {saturation.get('rate', saturation.get('users'))} "
+                    f"({saturation['throughput']:.2f} rps)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'levels': levels, 'saturation': saturation}, f, indent=2, ensure_ascii=False)
+        logger.info(f"Report saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,9 @@
 import sys
 from pathlib import Path
 import os
+import json
+import uuid
+import argparse
 import torch
 import logging
 
@@ -16,12 +19,17 @@ sys.path.append(str(project_root))
 try:
     from config.helpers import make_data_set, read_pkl, save_pkl, make_recipes, filter_recipe
     from config.dish import Recipe, RecipesProject
-    from config.vector_db import build_chroma_db, request_chroma_db
+    from config.vector_db import (
+        sync_chroma_db, request_chroma_db, open_chroma_db, get_active_collection_name, PERSIST_DIRECTORY
+    )
     from config.food_graph import (
         make_tags_list, lemmatize_tags, build_knowledge_graph,
         lemmatize, lemmatize_sentance, make_one_word_tags_list,
         enreach_query_with_relative_tags, save_graph
     )
+    from config.profiling import profile_block
+    from config.pipeline_dag import PipelineDAG, Stage, file_fingerprint, DAG_CACHE_DIR, DAG_WORKERS
+    from config.dedup import dedup_recipes, DEDUP_THRESHOLD
 except ImportError as e:
     logger.error(f"Failed to import modules: {e}")
     sys.exit(1)
@@ -55,145 +63,190 @@ def load_pickle():
         logger.error(f"Unexpected error in load_pickle: {e}")
     return povar_recipes
 
-def create_db(recipes_list):
+def create_db(recipes_list, budgeted=True):
     """
-    Создаёт векторное хранилище для списка рецептов.
-    Возвращает vector_store и tokenizer или (None, None) в случае ошибки.
+    Инкрементально синхронизирует векторное хранилище со списком рецептов:
+    эмбеддинги считаются только для новых и изменённых рецептов, читатели
+    переключаются на новую коллекцию атомарно. С budgeted=True документы
+    собираются в пределах бюджета токенов эмбеддера (см. Recipe.make_str_recipe_db),
+    поэтому текст, который модель всё равно обрезала бы, не кодируется.
+    Возвращает vector_store или None в случае ошибки.
     """
     if not recipes_list:
         logger.error("No recipes provided - cannot create vector store")
-        return None, None
+        return None
 
     try:
         # Определяем устройство (GPU/CPU)
         device = "cuda" if torch.cuda.is_available() else "cpu"
         logger.info(f"Using device: {device}")
 
-        # Создаём векторное хранилище
-        vector_store, tokenizer = build_chroma_db(recipes_list)
-        logger.info("Vector store and tokenizer created successfully")
-        return vector_store, tokenizer
+        # Синхронизируем векторное хранилище с рецептами
+        vector_store, stats = sync_chroma_db(recipes_list, persist_directory=PERSIST_DIRECTORY, budgeted=budgeted)
+        logger.info(f"Vector store synced: {stats}")
+        return vector_store
     except Exception as e:
         logger.error(f"Error creating vector store: {e}")
-        return None, None
+        return None
 
-def main():
+def stage_load(sources):
     """
-    Основная функция для обработки рецептов, создания векторного хранилища и графа знаний.
+    Этап загрузки: sources — отпечаток входных файлов, по нему этап перезапускается при их изменении.
     """
-    # Создаём выходную папку
-    output_dir = "/content/drive/MyDrive/llm_kaggle/llm_kaggle/dataset"
-    try:
-        os.makedirs(output_dir, exist_ok=True)
-        logger.info(f"Output directory {output_dir} created or already exists")
-    except Exception as e:
-        logger.error(f"Error creating output directory: {e}")
-        return
+    recipes = load_pickle()
+    if not recipes:
+        raise ValueError("No recipes loaded! Check your pickle files and paths.")
+    for recipe in recipes[:5]:
+        logger.info(f"Recipe {recipe.id}: steps={len(recipe.steps)}, time={recipe.standard_time}, rating={recipe.ratingValue}, votes={recipe.ratingCount}")
+    return recipes
 
-    # Загружаем рецепты
-    logger.info("Loading recipes...")
-    povar_recipes = load_pickle()
+def stage_dedup(recipes, path, threshold):
+    """
+    Удаляет почти одинаковые рецепты; группы дубликатов сохраняются в JSON.
+    """
+    if threshold is None:
+        return recipes
+    recipes, clusters = dedup_recipes(recipes, threshold=threshold)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(clusters, f, ensure_ascii=False, indent=1)
+    logger.info(f"Saved {len(clusters)} duplicate groups to {path}")
+    return recipes
 
-    if not povar_recipes:
-        logger.error("No recipes loaded! Check your pickle files and paths.")
-        return
+def stage_filter(recipes, **thresholds):
+    recipes = filter_recipe(recipes, **thresholds)
+    if not recipes:
+        raise ValueError("No recipes after filtering! Adjust filter parameters.")
+    if getattr(recipes[0], 'document', None) is not None:
+        logger.info(f"First recipe page_content: {recipes[0].document.page_content}")
+    return recipes
 
-    # Присваиваем povar_recipes напрямую, так как они уже объекты Recipe
-    logger.info("Using loaded recipes...")
-    recipes_list = povar_recipes
-    logger.info(f"Loaded {len(recipes_list)} recipes")
+def stage_save_filtered(recipes, path):
+    save_pkl(recipes, path)
+    logger.info(f"Saved filtered recipes to {path}")
 
-    # Выводим статистику для первых 5 рецептов
-    for recipe in recipes_list[:5]:
-        logger.info(f"Recipe {recipe.id}: steps={len(recipe.steps)}, time={recipe.standard_time}, rating={recipe.ratingValue}, votes={recipe.ratingCount}")
+def stage_vector_store(recipes, budgeted=True):
+    vector_store = create_db(recipes, budgeted=budgeted)
+    if vector_store is None:
+        raise ValueError("Failed to sync vector store")
+    return vector_store
 
-    # Фильтруем рецепты
-    try:
-        recipes_list = filter_recipe(
-            recipes_list,
-            max_steps=20,  # Смягчено
-            max_min=240,   # Смягчено
-            min_rating=3,  # Смягчено
-            min_votes=1    # Смягчено
-        )
-        logger.info(f"Filtered to {len(recipes_list)} recipes")
-    except Exception as e:
-        logger.error(f"Error filtering recipes: {e}")
-        return
+def stage_tags(recipes):
+    tags = make_tags_list(recipes)
+    lemmatize_tags(tags)
+    one_word_tags = make_one_word_tags_list(tags)
+    logger.info(f"Created {len(tags)} tags and {len(one_word_tags)} one-word tags")
+    return tags, one_word_tags
 
-    if not recipes_list:
-        logger.error("No recipes after filtering! Adjust filter parameters.")
-        return
+def stage_graph(recipes, tags):
+    return build_knowledge_graph(recipes, tags[0])
 
-    # Сохраняем отфильтрованные рецепты
-    try:
-        output_path = os.path.join(output_dir, "Recipe_final.pickle")
-        save_pkl(recipes_list, output_path)
-        logger.info(f"Saved filtered recipes to {output_path}")
-    except Exception as e:
-        logger.error(f"Error saving filtered recipes: {e}")
-        return
+def stage_project(recipes, graph, tags, vector_store, output_dir):
+    rp = RecipesProject(
+        recipes=recipes,
+        knowledgeGraph=graph,
+        tags=tags[0],
+        vectorStore=vector_store,
+        oneWordTags=tags[1]
+    )
+    save_pkl(rp.recipes, os.path.join(output_dir, "recipes.pickle"))
+    save_pkl(rp.knowledgeGraph, os.path.join(output_dir, "knowledgeGraph.pickle"))
+    save_pkl(rp.tags, os.path.join(output_dir, "tags.pickle"))
+    save_pkl(rp.oneWordTags, os.path.join(output_dir, "oneWordTags.pickle"))
+    rp.save(os.path.join(output_dir, "project.bundle"))
+    logger.info("All project components saved successfully")
 
-    # Проверяем и выводим page_content первого рецепта
-    if recipes_list:
-        if hasattr(recipes_list[0], 'document') and recipes_list[0].document is not None:
-            logger.info(f"First recipe page_content: {recipes_list[0].document.page_content}")
-        else:
-            logger.error("First recipe has no document")
-    else:
-        logger.error("recipes_list is empty after filtering")
-
-    # Создаём векторное хранилище
-    logger.info("Creating vector store...")
-    vector_store, tokenizer = create_db(recipes_list)
-    if vector_store is None or tokenizer is None:
-        logger.error("Failed to create vector store or tokenizer. Exiting.")
-        return
+def skip_dump(value, path):
+    # Выход этапа хранится в его артефактах, в кэш пишется только маркер
+    pass
 
-    # Создаём теги
-    logger.info("Creating tags...")
-    try:
-        tags = make_tags_list(recipes_list)
-        lemmatize_tags(tags)
-        one_word_tags = make_one_word_tags_list(tags)
-        logger.info(f"Created {len(tags)} tags and {len(one_word_tags)} one-word tags")
-    except Exception as e:
-        logger.error(f"Error creating tags: {e}")
-        return
+# Код, выполняющий работу этапов (см. Stage.code): его правка перезапускает этапы.
+# Логику вне перечисленных модулей учитывает только Stage.version — её нужно увеличить вручную.
+GRAPH_CODE = ["config.food_graph", "config.tag_vocab"]
 
-    # Создаём граф знаний
-    logger.info("Creating knowledge graph...")
-    try:
-        graph = build_knowledge_graph(recipes_list, tags)
-        logger.info("Knowledge graph created successfully")
-    except Exception as e:
-        logger.error(f"Error creating knowledge graph: {e}")
-        return
+def build_dag(output_dir, thresholds, cache_dir=DAG_CACHE_DIR, workers=DAG_WORKERS, run_id=None,
+              dedup_threshold=DEDUP_THRESHOLD, budgeted=True):
+    """
+    Описывает пайплайн как DAG этапов:
+
+        load -> dedup -> filter -> save_filtered
+                                -> vector_store ------------\
+                                -> tags -> graph -> project <-/
+
+    Векторное хранилище синхронизируется инкрементально (sync_chroma_db) параллельно с тегами и графом.
+    """
+    dag = PipelineDAG(cache_dir=cache_dir, workers=workers,
+                      wrap=lambda name: profile_block(f"pipeline.{name}", run_id))
+    sources = [f"{FILE_NAME}{i}.pickle" for i in range(1, 4)]
+    dag.add(Stage("load", stage_load, params={'sources': file_fingerprint(sources)},
+                  code=[load_pickle, "config.helpers", "config.dish"]))
+    duplicates_path = os.path.join(output_dir, "duplicates.json")
+    dag.add(Stage("dedup", stage_dedup, inputs=["load"], code=["config.dedup", "config.dish"],
+                  params={'path': duplicates_path, 'threshold': dedup_threshold},
+                  artifacts=[duplicates_path] if dedup_threshold is not None else []))
+    dag.add(Stage("filter", stage_filter, inputs=["dedup"], params=thresholds, code=["config.helpers"]))
+    filtered_path = os.path.join(output_dir, "Recipe_final.pickle")
+    dag.add(Stage("save_filtered", stage_save_filtered, inputs=["filter"], params={'path': filtered_path},
+                  artifacts=[filtered_path], dump=skip_dump, load=lambda path: None))
+    dag.add(Stage("vector_store", stage_vector_store, inputs=["filter"], params={'budgeted': budgeted},
+                  code=[create_db, "config.vector_db", "config.dish"],
+                  artifacts=[PERSIST_DIRECTORY],
+                  dump=skip_dump, load=lambda path: open_chroma_db(
+                      persist_directory=PERSIST_DIRECTORY,
+                      collection_name=get_active_collection_name(PERSIST_DIRECTORY))))
+    dag.add(Stage("tags", stage_tags, inputs=["filter"], code=GRAPH_CODE))
+    dag.add(Stage("graph", stage_graph, inputs=["filter", "tags"], code=GRAPH_CODE))
+    dag.add(Stage("project", stage_project, inputs=["filter", "graph", "tags", "vector_store"],
+                  code=["config.dish", "config.bundle"],
+                  params={'output_dir': output_dir},
+                  artifacts=[os.path.join(output_dir, "project.bundle")], dump=skip_dump, load=lambda path: None))
+    return dag
+
+def main():
+    """
+    Основная функция для обработки рецептов, создания векторного хранилища и графа знаний.
+    """
+    parser = argparse.ArgumentParser(description="Сборка рецептов, векторного хранилища и графа знаний")
+    parser.add_argument("--output-dir", default="/content/drive/MyDrive/llm_kaggle/llm_kaggle/dataset", help="Выходная папка")
+    parser.add_argument("--cache-dir", default=DAG_CACHE_DIR, help="Папка кэша этапов")
+    parser.add_argument("--workers", type=int, default=DAG_WORKERS, help="Сколько этапов выполнять одновременно")
+    parser.add_argument("--force", nargs="*", default=[], help="Этапы, которые нужно пересобрать")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                        help="Порог сходства для удаления почти одинаковых рецептов")
+    parser.add_argument("--no-dedup", action="store_true", help="Не удалять почти одинаковые рецепты")
+    parser.add_argument("--full-documents", action="store_true",
+                        help="Кодировать полный текст рецептов, без бюджета токенов эмбеддера")
+    # Пороги фильтрации смягчены относительно значений по умолчанию filter_recipe
+    parser.add_argument("--max-steps", type=int, default=20)
+    parser.add_argument("--max-min", type=int, default=240)
+    parser.add_argument("--min-rating", type=float, default=3)
+    parser.add_argument("--min-votes", type=int, default=1)
+    args = parser.parse_args()
 
-    # Создаём проект
-    logger.info("Creating RecipesProject...")
+    # Идентификатор запуска для файлов профилей этапов (RECIPES_PROFILE=cpu|memory)
+    run_id = uuid.uuid4().hex[:12]
+
+    # Создаём выходную папку
+    output_dir = args.output_dir
     try:
-        rp = RecipesProject(
-            recipes=recipes_list,
-            knowledgeGraph=graph,
-            tags=tags,
-            vectorStore=vector_store,
-            oneWordTags=one_word_tags
-        )
-        logger.info("RecipesProject created successfully")
+        os.makedirs(output_dir, exist_ok=True)
+        logger.info(f"Output directory {output_dir} created or already exists")
     except Exception as e:
-        logger.error(f"Error creating RecipesProject: {e}")
+        logger.error(f"Error creating output directory: {e}")
         return
 
-    # Сохраняем компоненты проекта
+    thresholds = {
+        'max_steps': args.max_steps,
+        'max_min': args.max_min,
+        'min_rating': args.min_rating,
+        'min_votes': args.min_votes,
+    }
+    dag = build_dag(output_dir, thresholds, cache_dir=args.cache_dir, workers=args.workers, run_id=run_id,
+                    dedup_threshold=None if args.no_dedup else args.dedup_threshold,
+                    budgeted=not args.full_documents)
     try:
-        save_pkl(rp.recipes, os.path.join(output_dir, "recipes.pickle"))
-        save_pkl(rp.knowledgeGraph, os.path.join(output_dir, "knowledgeGraph.pickle"))
-        save_pkl(rp.tags, os.path.join(output_dir, "tags.pickle"))
-        save_pkl(rp.oneWordTags, os.path.join(output_dir, "oneWordTags.pickle"))
-        logger.info("All project components saved successfully")
+        dag.run(force=args.force)
     except Exception as e:
-        logger.error(f"Error saving project components: {e}")
+        logger.error(f"Pipeline failed: {e}")
         return
 
     logger.info("Project successfully created!")
@@ -1,6 +1,7 @@
 from langchain_core.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain.memory import ChatMessageHistory
+from config.context_packer import default_packer, history_messages
 
 # Initialize chat history
 def create_chat_history():
@@ -18,6 +19,18 @@ def formatted_chat_history(chat_history):
 def formatted_rag(rag):
     res = "\n".join(rag)
     return res
+
+# Build the prompt inputs within the token budget: recipes are packed field by
+# field (names and ingredients first), old turns are folded into a summary
+def packed_question_input(question, recipes, chat_history, context_packer=None):
+    # Token budget shared by the recipes and the chat history, measured with the model's tokenizer
+    context_packer = context_packer or default_packer()
+    packed = context_packer.pack(question, recipes, history_messages(chat_history))
+    return {
+        "chat_history": packed["chat_history"],
+        "user_input": question,
+        "retrieved_recipes": packed["retrieved_recipes"] or "Рецепты не найдены",
+    }
     
 # Define the prompt template
 TEMPLATE = """
@@ -0,0 +1,76 @@
+import sys
+import os
+import argparse
+import logging
+from pathlib import Path
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(process)d - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Добавляем корень проекта в Python path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.append(str(project_root))
+
+from config.helpers import read_pkl
+from config.dish import RecipesProject
+from config.server import (
+    PreforkServer, RecipesServer, SERVER_HOST, SERVER_PORT, SERVER_WORKERS, WORKER_THREADS, GRACEFUL_TIMEOUT
+)
+
+DATA_DIR = "/content/drive/MyDrive/llm_kaggle/llm_kaggle/dataset"
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP-сервер ассистента с предзагрузкой и несколькими воркерами")
+    parser.add_argument("--bundle", default=None, help="Бандл проекта (RecipesProject.save) вместо отдельных pickle")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Папка с файлами проекта")
+    parser.add_argument("--persist-directory", default=None, help="Папка ChromaDB (без неё поиск только по графу)")
+    parser.add_argument("--host", default=SERVER_HOST, help="Адрес")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Порт")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Число воркеров")
+    parser.add_argument("--threads", type=int, default=WORKER_THREADS, help="Потоков на воркер")
+    parser.add_argument("--grace", type=float, default=GRACEFUL_TIMEOUT, help="Время на завершение запросов, секунды")
+    parser.add_argument("--model", default=None, help="Модель Ollama для /chat (без неё доступен только /search)")
+    parser.add_argument("--ollama-url", default=None, help="Адрес сервера Ollama")
+    parser.add_argument("--cache", default=None, help="Файл кэша ответов LLM")
+    parser.add_argument("--sessions", default=None, help="Файл истории диалогов")
+    args = parser.parse_args()
+
+    def loader():
+        # В мастере только данные Python; векторное хранилище открывает воркер
+        if args.bundle:
+            return RecipesProject.open(args.bundle, persist_directory=args.persist_directory)
+        return RecipesProject(
+            recipes=read_pkl(os.path.join(args.data_dir, "recipes.pickle")),
+            knowledgeGraph=read_pkl(os.path.join(args.data_dir, "knowledgeGraph.pickle")),
+            tags=read_pkl(os.path.join(args.data_dir, "tags.pickle")),
+            oneWordTags=read_pkl(os.path.join(args.data_dir, "oneWordTags.pickle"))
+        )
+
+    def app_factory(project):
+        # Соединения открываются в воркере: они не должны разделяться между процессами
+        model = cache = sessions = None
+        if args.persist_directory and not args.bundle:
+            from config.vector_db import open_chroma_db
+            project.add_vector_store(open_chroma_db(persist_directory=args.persist_directory))
+        if args.model:
+            from config.model_loader import build_model
+            model = build_model(args.model, base_url=args.ollama_url)
+            # Токенизатор для бюджета промпта загружается до первого запроса к /chat
+            from config.context_packer import default_packer
+            default_packer()
+        if args.cache:
+            from config.llm_cache import LLMCache
+            cache = LLMCache(args.cache)
+        if args.sessions:
+            from config.session_store import SessionStore
+            sessions = SessionStore(args.sessions)
+        return RecipesServer(project, model=model, cache=cache, sessions=sessions, threads=args.threads)
+
+    PreforkServer(
+        loader, app_factory, host=args.host, port=args.port, workers=args.workers, grace=args.grace
+    ).run()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import sys
+import os
+import json
+import argparse
+import logging
+import multiprocessing
+from pathlib import Path
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(process)d - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Добавляем корень проекта в Python path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.append(str(project_root))
+
+from config.helpers import read_pkl
+from config.dish import RecipesProject
+from config.food_graph import make_tags_list, lemmatize_tags, build_knowledge_graph, make_one_word_tags_list
+from config.synthetic_corpus import make_synthetic_corpus, make_synthetic_queries
+from config.sharding import ShardedSearch, measure_throughput, SHARD_TOP_K
+
+def synthetic_project(size, seed=0):
+    """
+    Собирает RecipesProject на синтетическом корпусе (без векторного хранилища).
+    """
+    recipes = make_synthetic_corpus(size, seed=seed)
+    tags = make_tags_list(recipes)
+    lemmatize_tags(tags)
+    return RecipesProject(
+        recipes=recipes,
+        knowledgeGraph=build_knowledge_graph(recipes, tags),
+        tags=tags,
+        oneWordTags=make_one_word_tags_list(tags)
+    )
+
+def open_collection(persist_directory):
+    """
+    Открывает активную коллекцию Chroma без модели эмбеддингов (шардам нужны только сохранённые векторы).
+    """
+    import chromadb
+    from config.vector_db import get_active_collection_name
+
+    collection_name = get_active_collection_name(persist_directory)
+    return chromadb.PersistentClient(path=persist_directory).get_collection(collection_name)
+
+def open_embedder(model_name, persist_directory):
+    """
+    Открывает хранилище с моделью эмбеддингов и возвращает эмбеддер запросов координатора.
+    """
+    from config.vector_db import open_chroma_db, embed_query, get_active_collection_name
+
+    vector_store = open_chroma_db(model_name=model_name, persist_directory=persist_directory,
+                                  collection_name=get_active_collection_name(persist_directory))
+    return lambda query: embed_query(vector_store, query)
+
+def run_level(conn, project, n_shards, queries, args):
+    """
+    Запускает n_shards шардов, замеряет пропускную способность и отправляет результат в conn.
+    """
+    embedder_factory = collection_factory = None
+    if args.persist_directory:
+        collection_factory = lambda: open_collection(args.persist_directory)
+        embedder_factory = lambda: open_embedder(args.model_name, args.persist_directory)
+    with ShardedSearch(lambda: project, n_shards=n_shards, embedder_factory=embedder_factory,
+                       collection_factory=collection_factory) as search:
+        level = measure_throughput(lambda q: search.search(q, n=args.top_k), queries, args.clients, args.duration)
+    level['shards'] = n_shards
+    conn.send(level)
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Шардированный поиск: масштабирование пропускной способности по числу шардов")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4], help="Числа шардов для замера")
+    parser.add_argument("--clients", type=int, default=16, help="Параллельных клиентов")
+    parser.add_argument("--duration", type=float, default=20, help="Длительность замера, секунды")
+    parser.add_argument("--top-k", type=int, default=SHARD_TOP_K, help="Сколько рецептов возвращать")
+    parser.add_argument("--bundle", default=None, help="Бандл проекта (RecipesProject.save)")
+    parser.add_argument("--data-dir", default=None, help="Папка с файлами проекта (иначе синтетический корпус)")
+    parser.add_argument("--persist-directory", default=None, help="Папка ChromaDB для векторного поиска")
+    parser.add_argument("--model-name", default="all-MiniLM-L6-v2", help="Модель эмбеддингов хранилища")
+    parser.add_argument("--synthetic", type=int, default=50000, help="Размер синтетического корпуса")
+    parser.add_argument("--queries", type=int, default=200, help="Число синтетических запросов")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+    parser.add_argument("--output", default=None, help="Куда записать отчёт")
+    args = parser.parse_args()
+
+    # Проект загружается один раз; шарды каждого уровня наследуют его при форке
+    if args.bundle:
+        project = RecipesProject.open(args.bundle)
+    elif args.data_dir:
+        project = RecipesProject(
+            recipes=read_pkl(os.path.join(args.data_dir, "recipes.pickle")),
+            knowledgeGraph=read_pkl(os.path.join(args.data_dir, "knowledgeGraph.pickle")),
+            tags=read_pkl(os.path.join(args.data_dir, "tags.pickle")),
+            oneWordTags=read_pkl(os.path.join(args.data_dir, "oneWordTags.pickle"))
+        )
+    else:
+        project = synthetic_project(args.synthetic, seed=args.seed)
+
+    queries = make_synthetic_queries(args.queries, seed=args.seed)
+    # Каждый уровень замеряется в отдельном процессе: эмбеддер координатора загружается
+    # после запуска шардов, и следующий уровень не форкается из процесса с моделью
+    context = multiprocessing.get_context('fork')
+    levels = []
+    for n_shards in args.shards:
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        process = context.Process(target=run_level, args=(child_conn, project, n_shards, queries, args))
+        process.start()
+        child_conn.close()
+        try:
+            level = parent_conn.recv()
+        except EOFError:
+            logger.error(f"Level with {n_shards} shards failed")
+            return 1
+        finally:
+            process.join()
+        level['speedup'] = level['throughput'] / levels[0]['throughput'] if levels else 1.0
+        levels.append(level)
+        logger.info(f"{n_shards} shards: {level['throughput']:.1f} rps (x{level['speedup']:.2f}), "
+                    f"p50 {level['p50'] * 1000:.1f} ms, p99 {level['p99'] * 1000:.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'levels': levels}, f, indent=2, ensure_ascii=False)
+        logger.info(f"Report saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
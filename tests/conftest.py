@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Добавляем корень проекта в Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,88 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server.requests.append((self.path, body))
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": f"{self.path} is not supported"})
+            return
+        if server.error is not None:
+            self._send_json(500, {"error": server.error})
+            return
+
+        # Контекст ответа: контекст запроса плюс «токены» нового хода
+        context = list(body.get("context") or []) + list(range(len(body.get("prompt", "").split()) + len(server.tokens)))
+        final = {
+            "model": body.get("model"), "created_at": "2024-01-01T00:00:00Z", "done": True, "done_reason": "stop",
+            "context": context, "prompt_eval_count": len(body.get("prompt", "").split()),
+            "eval_count": len(server.tokens),
+        }
+        if not body.get("stream", True):
+            self._send_json(200, {**final, "response": "".join(server.tokens)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for token in server.tokens:
+                chunk = {"model": body.get("model"), "created_at": "2024-01-01T00:00:00Z", "response": token,
+                         "done": False}
+                self.wfile.write(json.dumps(chunk).encode("utf-8") + b"\n")
+                self.wfile.flush()
+                server.sent += 1
+                time.sleep(server.delay)
+            self.wfile.write(json.dumps({**final, "response": ""}).encode("utf-8") + b"\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            server.disconnected = True
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """
+    Локальная замена сервера Ollama: /api/generate отдаёт ответ из tokens потоком
+    NDJSON (по чанку на токен с паузой delay) или одним JSON при stream=false.
+
+    Все запросы сохраняются в requests; error включает ответ 500 с этим текстом.
+    """
+    daemon_threads = True
+
+    def __init__(self, tokens: List[str], delay: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.tokens = tokens
+        self.delay = delay
+        self.error = None
+        self.requests = []
+        self.sent = 0
+        self.disconnected = False
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self) -> "FakeOllamaServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,129 @@
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_ollama")
+
+from config.llm_scheduler import LLMScheduler, QueueFullError, DeadlineExceededError, percentile
+
+class FakeOllama:
+    """
+    Локальная замена модели Ollama: отвечает текстом запроса, пока не закрыт шлагбаум gate.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+        self.calls = []
+
+    def invoke(self, messages):
+        request = messages[-1].content
+        self.calls.append(request)
+        self.started.set()
+        self.gate.wait(5)
+        time.sleep(self.delay)
+        return f"ответ: {request}"
+
+def blocked_scheduler(**kwargs):
+    """
+    Планировщик с одним воркером, занятым запросом 'busy' до открытия model.gate.
+    """
+    model = FakeOllama()
+    model.gate.clear()
+    scheduler = LLMScheduler(model, workers=1, **kwargs)
+    busy = scheduler.submit("busy")
+    assert model.started.wait(5)
+    return scheduler, model, busy
+
+def test_answers_through_llm_invoke():
+    scheduler = LLMScheduler(FakeOllama(), workers=2)
+    try:
+        assert scheduler.invoke("борщ") == "ответ: борщ"
+    finally:
+        scheduler.shutdown()
+
+def test_priority_order():
+    scheduler, model, busy = blocked_scheduler()
+    try:
+        futures = [scheduler.submit(f"p{priority}", priority=priority) for priority in (5, 1, 3, 1)]
+        model.gate.set()
+        for future in futures:
+            future.result(5)
+        assert model.calls == ["busy", "p1", "p1", "p3", "p5"]
+    finally:
+        scheduler.shutdown()
+
+def test_queue_full_sheds_load():
+    scheduler, model, busy = blocked_scheduler(max_queue=2)
+    try:
+        queued = [scheduler.submit("a"), scheduler.submit("b")]
+        with pytest.raises(QueueFullError):
+            scheduler.submit("c")
+        assert scheduler.metrics()['rejected'] == 1
+        model.gate.set()
+        assert [future.result(5) for future in queued] == ["ответ: a", "ответ: b"]
+    finally:
+        scheduler.shutdown()
+
+def test_deadline_expires_in_queue():
+    scheduler, model, busy = blocked_scheduler()
+    try:
+        future = scheduler.submit("late", deadline=0.05)
+        time.sleep(0.1)
+        model.gate.set()
+        with pytest.raises(DeadlineExceededError):
+            future.result(5)
+        busy.result(5)
+        assert "late" not in model.calls
+        assert scheduler.metrics()['expired'] == 1
+    finally:
+        scheduler.shutdown()
+
+def test_expired_requests_do_not_fill_queue():
+    scheduler, model, busy = blocked_scheduler(max_queue=1)
+    try:
+        expired = scheduler.submit("late", deadline=0.01)
+        time.sleep(0.05)
+        fresh = scheduler.submit("fresh")
+        with pytest.raises(DeadlineExceededError):
+            expired.result(1)
+        model.gate.set()
+        assert fresh.result(5) == "ответ: fresh"
+        assert scheduler.metrics()['rejected'] == 0
+    finally:
+        scheduler.shutdown()
+
+def test_invoke_does_not_wait_past_deadline():
+    scheduler, model, busy = blocked_scheduler()
+    try:
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceededError):
+            scheduler.invoke("slow", deadline=0.1)
+        assert time.monotonic() - start < 1
+    finally:
+        model.gate.set()
+        scheduler.shutdown()
+
+def test_latency_stats():
+    scheduler = LLMScheduler(FakeOllama(delay=0.01), workers=1)
+    try:
+        futures = [scheduler.submit(str(i)) for i in range(10)]
+        for future in futures:
+            future.result(5)
+        metrics = scheduler.metrics()
+        assert metrics['submitted'] == metrics['completed'] == 10
+        assert metrics['queue_depth'] == 0 and metrics['active'] == 0
+        assert metrics['max_queue_depth'] >= 1
+        assert 0 <= metrics['wait_p50'] <= metrics['wait_p95'] <= metrics['wait_p99']
+        # Последний запрос ждал, пока выполнятся девять предыдущих
+        assert metrics['wait_p99'] >= 0.05
+    finally:
+        scheduler.shutdown()
+
+def test_percentile():
+    assert percentile([], 50) == 0.0
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(list(range(1, 101)), 99) == 99
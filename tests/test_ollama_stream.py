@@ -0,0 +1,93 @@
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_ollama")
+pytest.importorskip("ollama")
+
+from ollama import Client
+
+from config.model_loader import build_model, llm_stream, llm_invoke
+from config.prompt_builder import PromptSession, SESSION_HEADER
+from fake_ollama import FakeOllamaServer
+
+TOKENS = ["Борщ", " варят", " на", " говяжьем", " бульоне", "."]
+
+@pytest.fixture
+def server():
+    with FakeOllamaServer(TOKENS, delay=0.05) as server:
+        yield server
+
+def test_stream_yields_incrementally(server):
+    model = build_model("mistral", base_url=server.url)
+    metrics = {}
+    start = time.perf_counter()
+    chunks = []
+    first_at = None
+    for chunk in llm_stream(model, "Как сварить борщ?", metrics=metrics):
+        if first_at is None:
+            first_at = time.perf_counter() - start
+        chunks.append(chunk)
+    assert chunks == TOKENS
+    # Первый чанк приходит до того, как сервер допишет ответ
+    assert first_at < metrics['total_latency'] - 0.1
+    assert metrics['tokens'] == len(TOKENS)
+    assert 0 < metrics['time_to_first_token'] < metrics['total_latency']
+    assert metrics['tokens_per_sec'] > 0
+    assert metrics['cancelled'] is False
+    path, body = server.requests[-1]
+    assert path == "/api/generate" and body['stream'] is True
+    assert "Как сварить борщ?" in body['prompt']
+
+def test_stream_cancel_stops_generation(server):
+    server.delay = 0.2
+    model = build_model("mistral", base_url=server.url)
+    cancel = threading.Event()
+    metrics = {}
+    chunks = []
+    for chunk in llm_stream(model, "Как сварить борщ?", cancel_event=cancel, metrics=metrics):
+        chunks.append(chunk)
+        cancel.set()
+    assert chunks == TOKENS[:1]
+    assert metrics['cancelled'] is True
+    # Соединение закрыто: сервер не дописывает ответ до конца
+    time.sleep(0.5)
+    assert server.sent < len(TOKENS)
+
+def test_stream_close_by_caller(server):
+    model = build_model("mistral", base_url=server.url)
+    metrics = {}
+    stream = llm_stream(model, "Как сварить борщ?", metrics=metrics)
+    assert next(stream) == TOKENS[0]
+    stream.close()
+    assert metrics['cancelled'] is True
+    assert metrics['total_latency'] is not None
+
+def test_stream_server_error(server):
+    server.error = "model 'mistral' not found"
+    model = build_model("mistral", base_url=server.url)
+    metrics = {}
+    with pytest.raises(Exception, match="not found"):
+        list(llm_stream(model, "Как сварить борщ?", metrics=metrics))
+    assert metrics['tokens'] == 0
+    assert metrics['time_to_first_token'] is None
+    assert metrics['total_latency'] is not None
+
+def test_invoke_returns_full_answer(server):
+    model = build_model("mistral", base_url=server.url)
+    assert llm_invoke(model, "Как сварить борщ?") == "".join(TOKENS)
+
+def test_session_reuses_context(server):
+    session = PromptSession(client=Client(host=server.url))
+    session.ask("Как сварить борщ?", "Борщ: свёкла, капуста")
+    first_context = session.context
+    session.ask("А без мяса?", "Постный борщ: свёкла, фасоль")
+
+    (_, first), (_, second) = server.requests
+    assert first.get('context') is None and first['prompt'].startswith(SESSION_HEADER)
+    # Второй ход отправляет только новый ход и контекст первого ответа
+    assert second['context'] == first_context
+    assert SESSION_HEADER not in second['prompt'] and "А без мяса?" in second['prompt']
+    assert session.turn_stats[1]['reset'] is False
+    assert len(session.context) > len(first_context)
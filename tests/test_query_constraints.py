@@ -0,0 +1,23 @@
+import pytest
+
+from config.query_constraints import parse_constraints
+
+@pytest.mark.parametrize("query, constraints, rest", [
+    ("Ужин за 30 минут", {'time': (None, 30.0)}, "Ужин"),
+    ("Суп за полчаса", {'time': (None, 30)}, "Суп"),
+    ("Ужин от 20 до 40 минут", {'time': (20.0, 40.0)}, "Ужин"),
+    ("Жаркое от 1 до 2 часов", {'time': (60.0, 120.0)}, "Жаркое"),
+    ("Салат до 300 ккал", {'calories': (None, 300.0)}, "Салат"),
+    ("Салат от 200 до 400 ккал", {'calories': (200.0, 400.0)}, "Салат"),
+    ("Пирог на 4 порции", {'servings': (4.0, None)}, "Пирог"),
+    ("Пирог от 2 до 4 порций", {'servings': (2.0, 4.0)}, "Пирог"),
+    ("Суп на 2-4 персоны", {'servings': (2.0, 4.0)}, "Суп"),
+    ("Торт рейтинг от 4.5", {'rating': (4.5, None)}, "Торт"),
+    ("Ужин от 20 до 40 минут от 200 до 400 ккал",
+     {'time': (20.0, 40.0), 'calories': (200.0, 400.0)}, "Ужин"),
+])
+def test_parse_constraints(query, constraints, rest):
+    assert parse_constraints(query) == (constraints, rest)
+
+def test_query_without_constraints_is_unchanged():
+    assert parse_constraints("Как приготовить блинчики?") == ({}, "Как приготовить блинчики?")
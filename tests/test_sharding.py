@@ -0,0 +1,86 @@
+import zlib
+
+import numpy as np
+import pytest
+
+# config.food_graph загружает модель spaCy и словари pymorphy3 при импорте
+pytest.importorskip("ru_core_news_sm")
+pytest.importorskip("pymorphy3")
+
+from config.dish import RecipesProject
+from config.food_graph import make_tags_list, lemmatize_tags, build_knowledge_graph, make_one_word_tags_list
+from config.synthetic_corpus import make_synthetic_corpus, make_synthetic_queries
+from config.sharding import ShardedSearch, ShardSearcher, ShardVectors, shard_of, TIER_PADDING
+
+CORPUS_SIZE = 3000
+TOP_K = 5
+EMBEDDING_DIM = 16
+
+def fake_vector(text):
+    return np.random.default_rng(zlib.crc32(text.encode('utf-8'))).standard_normal(EMBEDDING_DIM).astype(np.float32)
+
+class FakeCollection:
+    """
+    Коллекция Chroma в памяти: эмбеддинги рецептов по id, поддерживает get(where={'id': {'$in': ids}}).
+    """
+
+    def __init__(self, ids):
+        self.vectors = {id_: fake_vector(id_) for id_ in ids}
+
+    def get(self, where, include):
+        ids = [id_ for id_ in where['id']['$in'] if id_ in self.vectors]
+        return {
+            'ids': ids,
+            'embeddings': [self.vectors[id_] for id_ in ids],
+            'metadatas': [{'id': id_} for id_ in ids],
+        }
+
+@pytest.fixture(scope="module")
+def project():
+    recipes = make_synthetic_corpus(CORPUS_SIZE, seed=0)
+    tags = make_tags_list(recipes)
+    lemmatize_tags(tags)
+    return RecipesProject(
+        recipes=recipes,
+        knowledgeGraph=build_knowledge_graph(recipes, tags),
+        tags=tags,
+        oneWordTags=make_one_word_tags_list(tags)
+    )
+
+@pytest.fixture(scope="module")
+def queries():
+    return make_synthetic_queries(100, seed=1) + [
+        "Что можно приготовить из картофеля и сыра?",
+        "Что приготовить из шоколада до 200 ккал",
+        "Суп салат пирог рис итальянская кухня",
+        "Ужин от 20 до 40 минут",
+    ]
+
+def test_shard_of_is_stable():
+    assert shard_of("recipe_42", 4) == shard_of("recipe_42", 4)
+    assert {shard_of(f"recipe_{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+@pytest.mark.parametrize("n_shards", [1, 2, 3])
+def test_sharded_top_k_matches_unsharded(project, queries, n_shards):
+    with ShardedSearch(lambda: project, n_shards=n_shards) as search:
+        assert sum(search.sizes) == len(project.recipes)
+        for query in queries:
+            assert search.search(query, n=TOP_K) == project.search(query, n=TOP_K), query
+
+def test_sharded_vector_ranking_matches_single_searcher(project, queries):
+    collection = FakeCollection([recipe.id for recipe in project.recipes])
+    # Эталон: тот же поиск одним процессом по всему каталогу и всем векторам
+    reference = ShardSearcher(project, ShardVectors(collection, [recipe.id for recipe in project.recipes]))
+    n = 10
+    padded = 0
+    with ShardedSearch(lambda: project, n_shards=3, embedder_factory=lambda: fake_vector,
+                       collection_factory=lambda: collection) as search:
+        for query in queries:
+            expected = []
+            for key, id_ in reference.search(query, fake_vector(query), n):
+                if id_ not in expected:
+                    expected.append(id_)
+                    padded += key[0] == TIER_PADDING and len(expected) <= n
+            assert search.search(query, n=n) == expected[:n], query
+    # Запросы, где графу не хватило кандидатов, проверяют слияние с дополнением векторным поиском
+    assert padded